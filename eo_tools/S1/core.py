@@ -4,6 +4,8 @@ import xmltodict
 import numpy as np
 import rasterio
 import hashlib
+import json
+import geopandas as gpd
 from scipy.interpolate import CubicHermiteSpline, RegularGridInterpolator
 from numpy.polynomial import Polynomial
 from dateutil.parser import isoparse
@@ -14,8 +16,9 @@ from shapely.geometry import box
 from rasterio.enums import Resampling
 from numba import njit, prange
 from rasterio.windows import Window
-from pyproj import Transformer
-from joblib import Parallel, delayed
+from pyproj import CRS, Transformer
+from pyproj.transformer import TransformerGroup
+from functools import lru_cache
 
 from pyroSAR import identify
 from xmltodict import parse
@@ -26,6 +29,12 @@ import logging
 
 log = logging.getLogger(__name__)
 
+# approximate size of the intermediate arrays used to geocode one DEM pixel
+_GEOCODING_BYTES_PER_PIXEL = 160
+
+# height of the radar row bands owned by each thread when accumulating rasterized DEM facets
+_RASTER_BAND_ROWS = 16
+
 
 class S1IWSwath:
     """Class that contains metadata & orbit related to a Sentinel-1 subswath for a IW product. Member functions allow to pre-process individual bursts for further TOPS-InSAR processing. It includes:
@@ -38,7 +47,7 @@ class S1IWSwath:
     - Computing the topographic phase from slant range values
     """
 
-    def __init__(self, safe_path, iw=1, pol="vv", orb_dir="/tmp"):
+    def __init__(self, safe_path, iw=1, pol="vv", orb_dir="/tmp", cache_dir=None):
         """Object intialization
 
         Args:
@@ -46,6 +55,7 @@ class S1IWSwath:
             iw (int, optional): Subswath index (1 to 3). Defaults to 1.
             pol (str, optional): Polarization ("vv" or "vh"). Defaults to "vv".
             orb_dir (str, optional): Directory containing orbits. Defaults to "/tmp".
+            cache_dir (str, optional): Directory where parsed metadata is cached. The cache is identified by the product name, subswath, polarization and the checksum of the product manifest. It holds arrays and text only and is read without unpickling. Use a directory that other users cannot write to. If None, metadata is always parsed from the product. Defaults to None.
         """
         if not os.path.exists(safe_path):
             raise ValueError("Product not found.")
@@ -66,93 +76,60 @@ class S1IWSwath:
                 "Unexpected product name. Should start with S1{A,B}_IW_SLC."
             )
 
-        # raster path
-        try:
-            str_tiff = f"**/measurement/*iw{iw}*{pol}*.tiff"
-            pth_tiff = list(self.product.glob(str_tiff))[0]
-        except IndexError:
-            raise FileNotFoundError("Tiff file is missing.")
-        self.pth_tiff = f"zip://{pth_tiff}" if self.is_zip else pth_tiff
-
-        # metadata path
-        try:
-            str_xml = f"**/annotation/*iw{iw}*{pol}*.xml"
-            pth_xml = list(self.product.glob(str_xml))[0]
-        except IndexError:
-            raise FileNotFoundError("Metadata file is missing.")
-
-        # calibration path
-        try:
-            str_cal = f"**/annotation/calibration/calibration*iw{iw}*{pol}*.xml"
-            pth_cal = list(self.product.glob(str_cal))[0]
-        except IndexError:
-            raise FileNotFoundError("Calibration file is missing.")
-
-        # read annotation data
-        self.meta = read_metadata(pth_xml)
-        self.start_time = self.meta["product"]["adsHeader"]["startTime"]
-        burst_info = self.meta["product"]["swathTiming"]
-        self.lines_per_burst = int(burst_info["linesPerBurst"])
-        self.samples_per_burst = int(burst_info["samplesPerBurst"])
-        self.burst_count = int(burst_info["burstList"]["@count"])
-
-        # extract calibration LUT to rescale data
-        calinfo = read_metadata(pth_cal)
-        self.calvec = calinfo["calibration"]["calibrationVectorList"][
-            "calibrationVector"
-        ]
-        BN_str = self.calvec[0]["betaNought"]["#text"]
-        self.beta_nought = float(BN_str.split(" ")[0])
+        cache_file = None
+        swath_meta = None
+        if cache_dir is not None:
+            cache_file = _metadata_cache_file(self.product, iw, pol, cache_dir)
+            swath_meta = _read_metadata_cache(cache_file)
+
+        if swath_meta is not None:
+            log.info(f"S1IWSwath Initialization:")
+            log.info(f"- Read cached metadata {cache_file}")
+            # restituted orbits may have been superseded by precise orbits
+            if swath_meta["orbit_type"] != "POEORB":
+                log.info(f"- Look for available OSV (Orbit State Vectors)")
+                state_vectors, orbit_type = _read_orbit(safe_path, orb_dir)
+                if orbit_type != swath_meta["orbit_type"]:
+                    swath_meta["model"].state_vectors = state_vectors
+                    swath_meta["orbit_type"] = orbit_type
+                    _write_metadata_cache(cache_file, swath_meta)
+        else:
+            swath_meta = _parse_swath_metadata(
+                safe_path, self.product, iw, pol, orb_dir
+            )
+            if cache_file is not None:
+                _write_metadata_cache(cache_file, swath_meta)
 
-        # read burst geometries
-        self.gdf_burst_geom = get_burst_geometry(
-            path=safe_path, target_subswaths=f"IW{iw}", polarization=pol.upper()
+        # raster path
+        pth_tiff = swath_meta["pth_tiff"]
+        if self.is_zip:
+            self.pth_tiff = f"zip://{zipfile.Path(safe_path, at=pth_tiff)}"
+        else:
+            self.pth_tiff = self.product / pth_tiff
+
+        # annotation, calibration and orbit data
+        self.model = swath_meta["model"]
+        self.start_time = self.model.start_time
+        self.lines_per_burst = self.model.lines_per_burst
+        self.samples_per_burst = self.model.samples_per_burst
+        self.burst_count = self.model.burst_count
+        self.beta_nought = self.model.beta_nought
+
+        # burst geometries
+        burst_geom = swath_meta["burst_geom"]
+        self.gdf_burst_geom = gpd.GeoDataFrame(
+            {
+                "subswath": burst_geom["subswath"],
+                "burst": burst_geom["burst"],
+                "geometry": gpd.GeoSeries.from_wkt(burst_geom["geometry"]),
+            },
+            crs="EPSG:4326",
         )
         if self.gdf_burst_geom.empty:
             raise RuntimeError("Invalid product: no burst geometry was found.")
 
-        log.info(f"S1IWSwath Initialization:")
-        log.info(f"- Read metadata file {pth_xml}")
-        log.info(f"- Read calibration file {pth_cal}")
-        log.info(f"- Set up raster path {self.pth_tiff}")
-        log.info(f"- Look for available OSV (Orbit State Vectors)")
-
-        # read state vectors (orbit)
-        product = identify(safe_path)
-        zip_orb = product.getOSV(orb_dir, osvType=["POE", "RES"], returnMatch=True)
-        if not zip_orb:
-            raise RuntimeError("No orbit file available for this product")
-
-        if "POEORB" in zip_orb:
-            log.info("-- Precise orbit found")
-        elif "RESORB" in zip_orb:
-            log.info("-- Restituted orbit found")
-        else:
-            raise RuntimeError("Unknown orbit file")
-
-        with zipfile.ZipFile(zip_orb) as zf:
-            orb_file = zf.namelist()[0]
-            with zf.open(orb_file) as f:
-                orbdict = parse(f.read())
-        orbdata = orbdict["Earth_Explorer_File"]["Data_Block"]["List_of_OSVs"]["OSV"]
-        self.state_vectors = {}
-        t0 = isoparse(orbdata[0]["UTC"][4:])
-        self.state_vectors["t0"] = t0
-        self.state_vectors["t"] = np.array(
-            [(isoparse(it["UTC"][4:]) - t0).total_seconds() for it in orbdata]
-        )
-        self.state_vectors["x"] = np.array([float(it["X"]["#text"]) for it in orbdata])
-        self.state_vectors["y"] = np.array([float(it["Y"]["#text"]) for it in orbdata])
-        self.state_vectors["z"] = np.array([float(it["Z"]["#text"]) for it in orbdata])
-        self.state_vectors["vx"] = np.array(
-            [float(it["VX"]["#text"]) for it in orbdata]
-        )
-        self.state_vectors["vy"] = np.array(
-            [float(it["VY"]["#text"]) for it in orbdata]
-        )
-        self.state_vectors["vz"] = np.array(
-            [float(it["VZ"]["#text"]) for it in orbdata]
-        )
+        # state vectors (orbit)
+        self.state_vectors = self.model.state_vectors
 
     def fetch_dem(
         self,
@@ -269,7 +246,15 @@ class S1IWSwath:
         )
 
     def geocode_burst(
-        self, dem_file, burst_idx=1, dem_upsampling=1, simulate_terrain=False
+        self,
+        dem_file,
+        burst_idx=1,
+        dem_upsampling=1,
+        simulate_terrain=False,
+        solver="newton",
+        tie_point_step=None,
+        tie_point_tol=0.05,
+        mem_budget=None,
     ):
         """Computes azimuth-range lookup tables for each pixel of the DEM by solving the Range Doppler equations.
 
@@ -278,6 +263,10 @@ class S1IWSwath:
             burst_idx (int, optional): Burst index. Defaults to 1.
             dem_upsampling (int, optional): DEM upsampling to increase the resolution of the geocoded image. Defaults to 2.
             simulate_terrain (bool): terrain backscatter simulation in the SAR geometry which can be used for terrain flattening.
+            solver (str, optional): Zero-Doppler solver. "newton" uses Newton iterations seeded with the solution of the neighbouring DEM pixel and falls back to bisection when needed, "bisection" uses bisection only. Defaults to "newton".
+            tie_point_step (int, optional): If set, the equations are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are bilinearly interpolated in between. Tiles where the interpolation error at the tile center or edge midpoints exceeds `tie_point_tol` are recursively split until the error is below tolerance or the pixels are solved exactly. Defaults to None (all pixels are solved).
+            tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels allowed at the check points of a tile. Only used when `tie_point_step` is set. Defaults to 0.05.
+            mem_budget (float, optional): Approximate memory in MB used by intermediate arrays. If set, the DEM is processed in blocks of rows that fit in this budget. Not used with simulate_terrain which needs the full DEM. Defaults to None (the DEM is processed at once).
 
         Returns:
             (array, array, dict, optional array): azimuth and slant range indices. Arrays have the shape of the DEM. Also returns the rasterio profile of the DEM as a dict. If simulate_terrain is set to True, returns gamma_t, the simulated terrain backscatter of the burst in the SAR geometry.
@@ -291,40 +280,39 @@ class S1IWSwath:
         if dem_upsampling < 0:
             raise ValueError("dem_upsampling must be > 0")
 
-        meta = self.meta
+        if solver not in ["newton", "bisection"]:
+            raise ValueError(
+                "Unknown solver. Possible values are 'newton' and 'bisection'."
+            )
+
+        if tie_point_step is not None and tie_point_step < 1:
+            raise ValueError("tie_point_step must be >= 1")
+
+        if tie_point_tol <= 0:
+            raise ValueError("tie_point_tol must be > 0")
+
+        if mem_budget is not None and mem_budget <= 0:
+            raise ValueError("mem_budget must be > 0")
+
+        model = self.model
 
         # general info
-        image_info = meta["product"]["imageAnnotation"]["imageInformation"]
-        azimuth_time_interval = image_info["azimuthTimeInterval"]
-        slant_range_time = image_info["slantRangeTime"]
-        product_info = meta["product"]["generalAnnotation"]["productInformation"]
-        range_sampling_rate = product_info["rangeSamplingRate"]
-
-        # look for burst info
-        burst_info = meta["product"]["swathTiming"]
-        if burst_idx > self.burst_count or burst_idx < 1:
-            raise ValueError(f"Burst index must be between 1 and {self.burst_count}")
-        burst = burst_info["burstList"]["burst"][burst_idx - 1]
-        az_time = burst["azimuthTime"]
-
-        # state vectors
-        # orbit_list = meta["product"]["generalAnnotation"]["orbitList"]
-        # state_vectors = orbit_list["orbit"]
+        azimuth_time_interval = model.azimuth_time_interval
+        slant_range_time = model.slant_range_time
+        range_sampling_rate = model.range_sampling_rate
 
         if dem_upsampling != 1:
-            log.info("Resample DEM and extract coordinates")
+            log.info("Resample DEM")
         else:
-            log.info("Extract DEM coordinates")
-        lat, lon, alt, dem_prof, composite_crs = load_dem_coords(
-            dem_file, dem_upsampling
-        )
-
-        log.info("Convert latitude, longitude & altitude to ECEF x, y & z")
-        dem_x, dem_y, dem_z = lla_to_ecef(lat, lon, alt, composite_crs)
+            log.info("Read DEM")
+        alt, dem_prof, composite_crs = load_dem(dem_file, dem_upsampling)
+        dem_trans = dem_prof["transform"]
+        # geoid grids are cached next to the DEM
+        geoid_dir = os.path.dirname(os.path.abspath(dem_file))
 
         tt0 = self.state_vectors["t0"]
-        t0_az = (isoparse(az_time) - tt0).total_seconds()
-        dt_az = float(azimuth_time_interval)
+        t0_az = model.burst_times[burst_idx - 1] + model.time_offset(tt0)
+        dt_az = azimuth_time_interval
         naz = self.lines_per_burst
         nrg = self.samples_per_burst
 
@@ -347,57 +335,109 @@ class S1IWSwath:
         pos = interp_pos(t_arr)
         vel = interp_vel(t_arr)
 
-        log.info("Range-Doppler terrain correction (LUT computation)")
-        if simulate_terrain:
-            az_geo, dist_geo, dx, dy, dz = range_doppler(
-                # Removing first pos to get more precision. Is this useful?
-                dem_x.ravel() - pos[0, 0],
-                dem_y.ravel() - pos[0, 1],
-                dem_z.ravel() - pos[0, 2],
-                pos - pos[0],
-                vel,
-                tol=1e-8,
-                maxiter=10000,
-            )
-        else:
-            az_geo, dist_geo, _, _, _ = range_doppler(
-                # Removing first pos to get more precision. Is this useful?
-                dem_x.ravel() - pos[0, 0],
-                dem_y.ravel() - pos[0, 1],
-                dem_z.ravel() - pos[0, 2],
-                pos - pos[0],
-                vel,
-                tol=1e-8,
-                maxiter=10000,
-            )
-
-        # convert range - azimuth to pixel indices
+        # range pixel spacing
         c0 = 299792458.0
-        r0 = float(slant_range_time) * c0 / 2
-        dr = c0 / (2 * float(range_sampling_rate))
-        rg_geo = (dist_geo - r0) / dr
-
-        # masking points with invalid radar coordinates
-        cnd1 = (rg_geo >= 0) & (rg_geo < nrg)
-        cnd2 = (az_geo >= 0) & (az_geo < naz)
-        valid = cnd1 & cnd2
-        rg_geo[~valid] = np.nan
-        az_geo[~valid] = np.nan
-
-        # reshape to DEM dimensions
-        rg_geo = rg_geo.reshape(alt.shape)
-        az_geo = az_geo.reshape(alt.shape)
-
-        if simulate_terrain:
-            dx[~valid] = np.nan
-            dy[~valid] = np.nan
-            dz[~valid] = np.nan
+        r0 = slant_range_time * c0 / 2
+        dr = c0 / (2 * range_sampling_rate)
+
+        def geocode_rows(row_start, row_stop, look_vectors=False):
+            # LUTs of a block of DEM rows, coordinates are computed on the fly
+            lat, lon = dem_coords(dem_trans, row_start, row_stop, alt.shape[1])
+            alt_rows = alt[row_start:row_stop]
+            if tie_point_step is not None and tie_point_step > 1:
+                az_rows, rg_rows = range_doppler_tie_points(
+                    lat,
+                    lon,
+                    alt_rows,
+                    composite_crs,
+                    pos,
+                    vel,
+                    r0,
+                    dr,
+                    step=tie_point_step,
+                    tol=tie_point_tol,
+                    solver=solver,
+                    geoid_dir=geoid_dir,
+                )
+                az_rows = az_rows.ravel()
+                rg_rows = rg_rows.ravel()
+                if look_vectors:
+                    dem_x, dem_y, dem_z = lla_to_ecef(
+                        lat, lon, alt_rows, composite_crs, geoid_dir
+                    )
+                    dx, dy, dz = _look_vectors(
+                        az_rows,
+                        dem_x.ravel() - pos[0, 0],
+                        dem_y.ravel() - pos[0, 1],
+                        dem_z.ravel() - pos[0, 2],
+                        pos - pos[0],
+                    )
+            else:
+                dem_x, dem_y, dem_z = lla_to_ecef(
+                    lat, lon, alt_rows, composite_crs, geoid_dir
+                )
+                az_rows, dist_rows, dx, dy, dz = _solve_range_doppler(
+                    # Removing first pos to get more precision. Is this useful?
+                    dem_x.ravel() - pos[0, 0],
+                    dem_y.ravel() - pos[0, 1],
+                    dem_z.ravel() - pos[0, 2],
+                    pos - pos[0],
+                    vel,
+                    alt.shape[1],
+                    solver,
+                )
+                # convert range to pixel indices
+                rg_rows = (dist_rows - r0) / dr
+
+            # masking points with invalid radar coordinates
+            cnd1 = (rg_rows >= 0) & (rg_rows < nrg)
+            cnd2 = (az_rows >= 0) & (az_rows < naz)
+            valid = cnd1 & cnd2
+            rg_rows[~valid] = np.nan
+            az_rows[~valid] = np.nan
 
             # reshape to DEM dimensions
-            dx = dx.reshape(alt.shape)
-            dy = dy.reshape(alt.shape)
-            dz = dz.reshape(alt.shape)
+            shape = alt_rows.shape
+            if look_vectors:
+                dx[~valid] = np.nan
+                dy[~valid] = np.nan
+                dz[~valid] = np.nan
+                return (
+                    az_rows.reshape(shape),
+                    rg_rows.reshape(shape),
+                    (lat, lon, dem_x, dem_y, dem_z),
+                    (dx.reshape(shape), dy.reshape(shape), dz.reshape(shape)),
+                )
+            return az_rows.reshape(shape), rg_rows.reshape(shape)
+
+        if tie_point_step is not None and tie_point_step > 1:
+            log.info("Range-Doppler terrain correction on tie points (LUT computation)")
+        else:
+            log.info("Range-Doppler terrain correction (LUT computation)")
+        if simulate_terrain:
+            if mem_budget is not None:
+                log.info("Terrain simulation uses the full DEM: mem_budget is ignored")
+            az_geo, rg_geo, coords, look = geocode_rows(0, alt.shape[0], True)
+            lat, lon, dem_x, dem_y, dem_z = coords
+            dx, dy, dz = look
+        else:
+            if mem_budget is not None:
+                row_bytes = alt.shape[1] * _GEOCODING_BYTES_PER_PIXEL
+                block_rows = max(1, int(mem_budget * 2**20 // row_bytes))
+            else:
+                block_rows = alt.shape[0]
+            az_geo = np.full(alt.shape, np.nan)
+            rg_geo = np.full(alt.shape, np.nan)
+            for row_start in range(0, alt.shape[0], block_rows):
+                row_stop = min(row_start + block_rows, alt.shape[0])
+                if block_rows < alt.shape[0]:
+                    log.info(f"Geocode DEM rows {row_start} to {row_stop}")
+                (
+                    az_geo[row_start:row_stop],
+                    rg_geo[row_start:row_stop],
+                ) = geocode_rows(row_start, row_stop)
 
+        if simulate_terrain:
             # finding occluded shadow pixels
             log.info("Shadow detection")
             # compute ero altitude coordinates (use DEM reference height)
@@ -406,6 +446,7 @@ class S1IWSwath:
                 lon,
                 np.zeros_like(lat),
                 composite_crs,
+                geoid_dir,
             )
 
             shadow_mask = detect_active_shadow(
@@ -437,34 +478,25 @@ class S1IWSwath:
                 f"Invalid burst index (must be between 1 and {self.burst_count})"
             )
 
-        meta = self.meta
-        meta_image = meta["product"]["imageAnnotation"]
-        meta_general = meta["product"]["generalAnnotation"]
-        meta_burst = meta["product"]["swathTiming"]["burstList"]["burst"][burst_idx - 1]
+        model = self.model
 
         log.info("Compute TOPS deramping phase")
 
         c0 = 299792458.0
-        # lines_per_burst = int(meta["product"]["swathTiming"]["linesPerBurst"])
-        az_time = meta_burst["azimuthTime"]
-        az_dt = float(meta_image["imageInformation"]["azimuthTimeInterval"])
-        range_sampling_rate = float(
-            meta_general["productInformation"]["rangeSamplingRate"]
-        )
-        slant_range_time = float(meta_image["imageInformation"]["slantRangeTime"])
-        nrg = int(meta_image["imageInformation"]["numberOfSamples"])
-        kp = float(meta_general["productInformation"]["azimuthSteeringRate"])
-        fc = float(meta_general["productInformation"]["radarFrequency"])
+        az_dt = model.azimuth_time_interval
+        range_sampling_rate = model.range_sampling_rate
+        slant_range_time = model.slant_range_time
+        nrg = model.number_of_samples
+        kp = model.azimuth_steering_rate
+        fc = model.radar_frequency
         rg_dt = 1 / range_sampling_rate
 
         # keeping a few points before and after burst
-        image_info = meta["product"]["imageAnnotation"]["imageInformation"]
-        azimuth_time_interval = float(image_info["azimuthTimeInterval"])
-        dt_az = float(azimuth_time_interval)
-        # naz = int(lines_per_burst)
+        dt_az = az_dt
         naz = self.lines_per_burst
         tt0 = self.state_vectors["t0"]
-        t0_az = (isoparse(az_time) - tt0).total_seconds()
+        t_burst = model.burst_times[burst_idx - 1]
+        t0_az = t_burst + model.time_offset(tt0)
         t_end_burst = t0_az + dt_az * naz
         t_sv_burst = self.state_vectors["t"]
         cnd = (t_sv_burst > t0_az - 360) & (t_sv_burst < t_end_burst + 360)
@@ -477,13 +509,10 @@ class S1IWSwath:
         v_mid = orb_v(t_mid)
         ks = (2 * np.sqrt((v_mid**2).sum()) / c0) * fc * np.radians(kp)
 
-        fm_rate_list = meta_general["azimuthFmRateList"]["azimuthFmRate"]
-        fm_rate_times = [
-            (isoparse(it["azimuthTime"]) - tt0).total_seconds() for it in fm_rate_list
-        ]
-        poly_fm_idx = np.argmin(np.abs(np.array(fm_rate_times) - t_mid))
-        poly_fm_str = fm_rate_list[poly_fm_idx]["azimuthFmRatePolynomial"]["#text"]
-        poly_fm_coeffs = np.array((poly_fm_str).split(" "), dtype="float64")
+        # polynomial times are relative to the product start time
+        t_mid_ref = t_burst + az_dt * self.lines_per_burst / 2.0
+        poly_fm_idx = np.argmin(np.abs(model.fm_rate_times - t_mid_ref))
+        poly_fm_coeffs = model.fm_rate_coeffs[poly_fm_idx]
 
         rg_tau = slant_range_time + np.arange(nrg) * rg_dt
 
@@ -496,13 +525,8 @@ class S1IWSwath:
 
         ka = ka_fun(rg_tau)
 
-        dc_list = meta["product"]["dopplerCentroid"]["dcEstimateList"]["dcEstimate"]
-        dc_times = [
-            (isoparse(it["azimuthTime"]) - tt0).total_seconds() for it in dc_list
-        ]
-        poly_dc_idx = np.argmin(np.abs(np.array(dc_times) - t_mid))
-        poly_dc_str = dc_list[poly_dc_idx]["dataDcPolynomial"]["#text"]
-        poly_dc_coeffs = np.array((poly_dc_str).split(" "), dtype="float64")
+        poly_dc_idx = np.argmin(np.abs(model.dc_times - t_mid_ref))
+        poly_dc_coeffs = model.dc_coeffs[poly_dc_idx]
 
         def fdc_fun(tau):
             return (
@@ -540,20 +564,14 @@ class S1IWSwath:
         nrg = self.samples_per_burst
         first_line = (burst_idx - 1) * self.lines_per_burst
 
-        str_cols = self.calvec[0]["pixel"]["#text"]
-        cols = np.array(list(map(int, str_cols.split(" "))), dtype=int)
-        grid_sigma = np.zeros((len(self.calvec), len(cols)), dtype="float64")
-        list_lines = []
+        model = self.model
 
         log.info(f"Compute {cal_type} nought calibration factor.")
         # interpolate values on image grid
         if cal_type == "sigma":
-            for i, it in enumerate(self.calvec):
-                list_lines.append(int(it["line"]))
-                str_sigma = it["sigmaNought"]["#text"]
-                line_sigma = list(map(float, str_sigma.split(" ")))
-                grid_sigma[i] = line_sigma
-            rows = np.array(list_lines, dtype=int)
+            rows = model.cal_lines
+            cols = model.cal_pixels
+            grid_sigma = model.cal_sigma
             grid_arr_rg, grid_arr_az = np.meshgrid(
                 np.arange(nrg), np.arange(first_line, first_line + naz)
             )
@@ -585,10 +603,6 @@ class S1IWSwath:
                 f"Invalid burst index (must be between 1 and {self.burst_count})"
             )
 
-        meta = self.meta
-        burst_info = meta["product"]["swathTiming"]
-        burst_data = burst_info["burstList"]["burst"][burst_idx - 1]
-
         first_line = (burst_idx - 1) * self.lines_per_burst
 
         nodataval = np.nan + 1j * np.nan
@@ -601,10 +615,8 @@ class S1IWSwath:
         # arr[arr == 0 + 1j * 0] = nodataval
 
         if remove_invalid:
-            fs_str = burst_data["firstValidSample"]["#text"]
-            ls_str = burst_data["lastValidSample"]["#text"]
-            first_sample_arr = np.array((fs_str).split(" "), dtype="int")
-            last_sample_arr = np.array((ls_str).split(" "), dtype="int")
+            first_sample_arr = self.model.first_valid_sample[burst_idx - 1]
+            last_sample_arr = self.model.last_valid_sample[burst_idx - 1]
             for i in range(self.lines_per_burst):
                 if first_sample_arr[i] > -1:
                     arr[i, : first_sample_arr[i]] = nodataval
@@ -626,19 +638,14 @@ class S1IWSwath:
             For the primary burst, range is simply the pixel slant range index. For a secondary burst, it is the range index of the burst reprojected in the primary grid thanks to the coregistration function.
 
         """
-        meta = self.meta
-        image_info = meta["product"]["imageAnnotation"]["imageInformation"]
-        slant_range_time = image_info["slantRangeTime"]
-        product_info = meta["product"]["generalAnnotation"]["productInformation"]
-        range_sampling_rate = product_info["rangeSamplingRate"]
+        model = self.model
 
         log.info("Compute topographic phase")
 
-        freq = float(product_info["radarFrequency"])
         c0 = 299792458.0
-        lam = c0 / freq
-        r0 = float(slant_range_time) * c0 / 2
-        dr = c0 / (2 * float(range_sampling_rate))
+        lam = c0 / model.radar_frequency
+        r0 = model.slant_range_time * c0 / 2
+        dr = c0 / (2 * model.range_sampling_rate)
         dist = rg * dr + r0
 
         return (4 * np.pi / lam) * dist
@@ -660,21 +667,160 @@ class S1IWSwath:
             raise ValueError(
                 f"Invalid burst index (must be between 2 and {self.burst_count})"
             )
-        meta = self.meta
-        image_info = meta["product"]["imageAnnotation"]["imageInformation"]
-        azimuth_time_interval = float(image_info["azimuthTimeInterval"])
-        burst_info = meta["product"]["swathTiming"]
-        burst_1 = burst_info["burstList"]["burst"][burst_idx - 1]
-        az_time_1 = isoparse(burst_1["azimuthTime"])
-        burst_2 = burst_info["burstList"]["burst"][burst_idx]
-        az_time_2 = isoparse(burst_2["azimuthTime"])
+        azimuth_time_interval = self.model.azimuth_time_interval
+        az_time_1 = self.model.burst_times[burst_idx - 1]
+        az_time_2 = self.model.burst_times[burst_idx]
 
         diff_az_time = (
             az_time_1 - az_time_2
-        ).total_seconds() + self.lines_per_burst * azimuth_time_interval
+        ) + self.lines_per_burst * azimuth_time_interval
         return diff_az_time / azimuth_time_interval
 
 
+class SwathMetadata:
+    """Array-backed metadata of a Sentinel-1 IW subswath. It is built once from the annotation, calibration and orbit files so that per-burst processing does not need to parse strings or dates. Instances can be pickled, e.g. to be sent to worker processes.
+
+    Times (`burst_times`, `fm_rate_times`, `dc_times`) are in seconds relative to the product start time `t_ref`. Use `time_offset` to express them relative to another reference such as the first orbit state vector.
+    """
+
+    def __init__(
+        self,
+        start_time,
+        lines_per_burst,
+        samples_per_burst,
+        number_of_samples,
+        azimuth_time_interval,
+        slant_range_time,
+        range_sampling_rate,
+        radar_frequency,
+        azimuth_steering_rate,
+        burst_times,
+        first_valid_sample,
+        last_valid_sample,
+        fm_rate_times,
+        fm_rate_coeffs,
+        dc_times,
+        dc_coeffs,
+        cal_lines,
+        cal_pixels,
+        cal_beta,
+        cal_sigma,
+        state_vectors,
+    ):
+        self.start_time = start_time
+        self.t_ref = isoparse(start_time)
+        self.lines_per_burst = int(lines_per_burst)
+        self.samples_per_burst = int(samples_per_burst)
+        self.number_of_samples = int(number_of_samples)
+        self.azimuth_time_interval = float(azimuth_time_interval)
+        self.slant_range_time = float(slant_range_time)
+        self.range_sampling_rate = float(range_sampling_rate)
+        self.radar_frequency = float(radar_frequency)
+        self.azimuth_steering_rate = float(azimuth_steering_rate)
+        self.burst_times = np.asarray(burst_times, dtype="float64")
+        self.first_valid_sample = np.asarray(first_valid_sample, dtype="int32")
+        self.last_valid_sample = np.asarray(last_valid_sample, dtype="int32")
+        self.fm_rate_times = np.asarray(fm_rate_times, dtype="float64")
+        self.fm_rate_coeffs = np.asarray(fm_rate_coeffs, dtype="float64")
+        self.dc_times = np.asarray(dc_times, dtype="float64")
+        self.dc_coeffs = np.asarray(dc_coeffs, dtype="float64")
+        self.cal_lines = np.asarray(cal_lines, dtype="int64")
+        self.cal_pixels = np.asarray(cal_pixels, dtype="int64")
+        self.cal_beta = np.asarray(cal_beta, dtype="float64")
+        self.cal_sigma = np.asarray(cal_sigma, dtype="float64")
+        self.state_vectors = state_vectors
+
+    @property
+    def burst_count(self):
+        return len(self.burst_times)
+
+    @property
+    def beta_nought(self):
+        return float(self.cal_beta[0, 0])
+
+    def time_offset(self, t0):
+        """Seconds between a reference date and the product start time.
+
+        Args:
+            t0 (datetime): reference date
+
+        Returns:
+            float: offset to add to the times of the model to make them relative to t0.
+        """
+        return (self.t_ref - t0).total_seconds()
+
+    @classmethod
+    def from_annotation(cls, meta, calvec, state_vectors):
+        """Builds the model from parsed XML files.
+
+        Args:
+            meta (dict): annotation file parsed with `read_metadata`
+            calvec (list): calibration vectors of the calibration file parsed with `read_metadata`
+            state_vectors (dict): orbit state vectors
+
+        Returns:
+            SwathMetadata: metadata model
+        """
+
+        def as_list(it):
+            # single elements are not parsed as lists
+            return it if isinstance(it, list) else [it]
+
+        def as_array(text, dtype="float64"):
+            return np.array(text.split(), dtype=dtype)
+
+        product = meta["product"]
+        start_time = product["adsHeader"]["startTime"]
+        t_ref = isoparse(start_time)
+
+        def rel_time(t):
+            return (isoparse(t) - t_ref).total_seconds()
+
+        image_info = product["imageAnnotation"]["imageInformation"]
+        product_info = product["generalAnnotation"]["productInformation"]
+        swath_timing = product["swathTiming"]
+        bursts = as_list(swath_timing["burstList"]["burst"])
+        fm_rates = as_list(
+            product["generalAnnotation"]["azimuthFmRateList"]["azimuthFmRate"]
+        )
+        dc_estimates = as_list(
+            product["dopplerCentroid"]["dcEstimateList"]["dcEstimate"]
+        )
+        calvec = as_list(calvec)
+
+        return cls(
+            start_time=start_time,
+            lines_per_burst=swath_timing["linesPerBurst"],
+            samples_per_burst=swath_timing["samplesPerBurst"],
+            number_of_samples=image_info["numberOfSamples"],
+            azimuth_time_interval=image_info["azimuthTimeInterval"],
+            slant_range_time=image_info["slantRangeTime"],
+            range_sampling_rate=product_info["rangeSamplingRate"],
+            radar_frequency=product_info["radarFrequency"],
+            azimuth_steering_rate=product_info["azimuthSteeringRate"],
+            burst_times=[rel_time(it["azimuthTime"]) for it in bursts],
+            first_valid_sample=[
+                as_array(it["firstValidSample"]["#text"], "int32") for it in bursts
+            ],
+            last_valid_sample=[
+                as_array(it["lastValidSample"]["#text"], "int32") for it in bursts
+            ],
+            fm_rate_times=[rel_time(it["azimuthTime"]) for it in fm_rates],
+            fm_rate_coeffs=[
+                as_array(it["azimuthFmRatePolynomial"]["#text"]) for it in fm_rates
+            ],
+            dc_times=[rel_time(it["azimuthTime"]) for it in dc_estimates],
+            dc_coeffs=[
+                as_array(it["dataDcPolynomial"]["#text"]) for it in dc_estimates
+            ],
+            cal_lines=[int(it["line"]) for it in calvec],
+            cal_pixels=as_array(calvec[0]["pixel"]["#text"], "int64"),
+            cal_beta=[as_array(it["betaNought"]["#text"]) for it in calvec],
+            cal_sigma=[as_array(it["sigmaNought"]["#text"]) for it in calvec],
+            state_vectors=state_vectors,
+        )
+
+
 def coregister(arr_p, az_p2g, rg_p2g, az_s2g, rg_s2g):
     """Fast parallel coregistration based on lookup-tables in a DEM geometry.
 
@@ -692,68 +838,184 @@ def coregister(arr_p, az_p2g, rg_p2g, az_s2g, rg_s2g):
     return coreg_fast(arr_p, az_p2g, rg_p2g, az_s2g, rg_s2g)
 
 
-@njit(nogil=True, parallel=True, cache=True)
-def coreg_fast(arr_p, azp, rgp, azs, rgs):
+@njit(nogil=True, cache=True)
+def _quad_has_nan(arr, i, j):
+    return (
+        np.isnan(arr[i, j])
+        or np.isnan(arr[i, j + 1])
+        or np.isnan(arr[i + 1, j])
+        or np.isnan(arr[i + 1, j + 1])
+    )
+
+
+@njit(nogil=True, cache=True)
+def _triangle_setup(a0, r0, a1, r1, a2, r2, naz, nrg):
+    """Prepare a triangle for scanline rasterization on an integer (azimuth, range) grid.
+
+    Args:
+        a0 (float): azimuth of the first vertex
+        r0 (float): range of the first vertex
+        a1 (float): azimuth of the second vertex
+        r1 (float): range of the second vertex
+        a2 (float): azimuth of the third vertex
+        r2 (float): range of the third vertex
+        naz (int): grid azimuth size
+        nrg (int): grid range size
+
+    Returns:
+        (tuple, int, int): triangle coefficients and the range of rows to scan. The row range is empty for degenerate triangles or triangles outside the grid.
+    """
+    det = (r1 - r2) * (a0 - a2) + (a2 - a1) * (r0 - r2)
+    rmin = max(np.floor(min(r0, r1, r2)), 0.0)
+    rmax = min(np.ceil(max(r0, r1, r2)), nrg - 1.0)
+    tri = (a0, r0, a1, r1, a2, r2, det, rmin, rmax)
+    if det == 0 or rmax < rmin:
+        return tri, 0, 0
+    amin = max(np.floor(min(a0, a1, a2)), 0.0)
+    amax = min(np.ceil(max(a0, a1, a2)), naz - 1.0)
+    if amax < amin:
+        return tri, 0, 0
+    return tri, int(amin), int(amax) + 1
+
+
+@njit(nogil=True, cache=True)
+def _triangle_span(tri, a):
+    """Range span of a triangle on a grid row.
+
+    Solves the three edge equations for the row and pads the result by one pixel on both sides, so that the exact inclusion test in `_triangle_weights` decides on boundary pixels.
+
+    Args:
+        tri (tuple): triangle coefficients from `_triangle_setup`
+        a (int): row index
+
+    Returns:
+        (int, int, float, float): start and stop range indices, and the row terms of the first two edge functions.
+    """
+    a0, r0, a1, r1, a2, r2, det, rmin, rmax = tri
+    # edge functions at (a, r2), divided by det, and their slope along range
+    e1 = (r1 - r2) * (a - a2)
+    e2 = (r2 - r0) * (a - a2)
+    l1 = e1 / det
+    l2 = e2 / det
+    s1 = (a2 - a1) / det
+    s2 = (a0 - a2) / det
+    lo = rmin
+    hi = rmax
+    for l0, s in ((l1, s1), (l2, s2), (1.0 - l1 - l2, -s1 - s2)):
+        if s > 0:
+            lo = max(lo, r2 - l0 / s)
+        elif s < 0:
+            hi = min(hi, r2 - l0 / s)
+        elif l0 < 0:
+            return 0, 0, e1, e2
+    if hi < lo:
+        return 0, 0, e1, e2
+    r_start = int(max(np.floor(lo) - 1.0, rmin))
+    r_stop = int(min(np.ceil(hi) + 1.0, rmax)) + 1
+    return r_start, r_stop, e1, e2
+
+
+@njit(nogil=True, cache=True)
+def _triangle_weights(tri, r, e1, e2):
+    """Barycentric weights of a grid pixel and its inclusion in the triangle.
+
+    Args:
+        tri (tuple): triangle coefficients from `_triangle_setup`
+        r (int): range index
+        e1 (float): row term of the first edge function from `_triangle_span`
+        e2 (float): row term of the second edge function from `_triangle_span`
+
+    Returns:
+        (bool, float, float, float): inclusion flag and barycentric weights of the three vertices.
+    """
+    a0, r0, a1, r1, a2, r2, det, rmin, rmax = tri
+    l1 = (e1 + (a2 - a1) * (r - r2)) / det
+    l2 = (e2 + (a0 - a2) * (r - r2)) / det
+    return (l1 >= 0) and (l2 >= 0) and (l1 + l2 < 1), l1, l2, 1 - l1 - l2
+
+
+@njit(nogil=True, cache=True)
+def _band_index(first_row, last_row, band_rows, nbands):
+    """Group items by the output row bands they overlap (CSR layout).
+
+    Items are listed in increasing order within each band, so that looping over a band reproduces the serial order of the items.
+
+    Args:
+        first_row (array): first output row of each item
+        last_row (array): last output row of each item, items with last_row < first_row are ignored
+        band_rows (int): number of rows in a band
+        nbands (int): number of bands
 
-    # barycentric coordinates in a triangle
-    def bary(p, a, b, c):
-        det = (b[1] - c[1]) * (a[0] - c[0]) + (c[0] - b[0]) * (a[1] - c[1])
-        l1 = ((b[1] - c[1]) * (p[0] - c[0]) + (c[0] - b[0]) * (p[1] - c[1])) / det
-        l2 = ((c[1] - a[1]) * (p[0] - c[0]) + (a[0] - c[0]) * (p[1] - c[1])) / det
-        l3 = 1 - l1 - l2
-        return l1, l2, l3
+    Returns:
+        (array, array): offsets of each band in the item list and flat item indices
+    """
+    first = first_row.ravel()
+    last = last_row.ravel()
+    offsets = np.zeros(nbands + 1, dtype=np.int64)
+    for k in range(first.size):
+        if last[k] >= first[k]:
+            for b in range(first[k] // band_rows, last[k] // band_rows + 1):
+                offsets[b + 1] += 1
+    for b in range(nbands):
+        offsets[b + 1] += offsets[b]
+    items = np.empty(offsets[-1], dtype=np.int64)
+    pos = offsets[:-1].copy()
+    for k in range(first.size):
+        if last[k] >= first[k]:
+            for b in range(first[k] // band_rows, last[k] // band_rows + 1):
+                items[pos[b]] = k
+                pos[b] += 1
+    return offsets, items
 
-    # test if point is in triangle
-    def is_in_tri(l1, l2):
-        return (l1 >= 0) and (l2 >= 0) and (l1 + l2 < 1)
 
-    # linear barycentric interpolation
-    def interp(v1, v2, v3, l1, l2, l3):
-        return l1 * v1 + l2 * v2 + l3 * v3
+@njit(nogil=True, parallel=True, cache=True)
+def coreg_fast(arr_p, azp, rgp, azs, rgs):
 
     naz, nrg = arr_p.shape
 
     az_s2p = np.full((naz, nrg), np.nan)
     rg_s2p = np.full((naz, nrg), np.nan)
-    p = np.zeros(2)
     nl, nc = azp.shape
     # - loop on DEM
     for i in prange(0, nl - 1):
         for j in range(0, nc - 1):
             # - for each 4 neighborhood
-            aa = azp[i : i + 2, j : j + 2].flatten()  # .ravel()
-            rr = rgp[i : i + 2, j : j + 2].flatten()  # .ravel()
-            aas = azs[i : i + 2, j : j + 2].flatten()  # .ravel()
-            rrs = rgs[i : i + 2, j : j + 2].flatten()  # .ravel()
-            # - collect triangle vertices
-            xx = np.vstack((aa, rr)).T
-            yy = np.vstack((aas, rrs)).T
-            if np.isnan(xx).any() or np.isnan(yy).any():
+            if (
+                _quad_has_nan(azp, i, j)
+                or _quad_has_nan(rgp, i, j)
+                or _quad_has_nan(azs, i, j)
+                or _quad_has_nan(rgs, i, j)
+            ):
                 continue
-            # - compute bounding box in the primary grid
-            amin, amax = np.floor(aa.min()), np.ceil(aa.max())
-            rmin, rmax = np.floor(rr.min()), np.ceil(rr.max())
-            amin = np.maximum(amin, 0)
-            rmin = np.maximum(rmin, 0)
-            amax = np.minimum(amax, naz - 1)
-            rmax = np.minimum(rmax, nrg - 1)
-            # - loop on integer positions based on box
-            for a in range(int(amin), int(amax) + 1):
-                for r in range(int(rmin), int(rmax) + 1):
-                    # - separate into 2 triangles
-                    # - test if each point falls into triangle 1 or 2
-                    # - interpolate the secondary range and azimuth using triangle vertices
-                    # p = np.array([a, r])
-                    p[0] = a
-                    p[1] = r
-                    l1, l2, l3 = bary(p, xx[0], xx[1], xx[2])
-                    if is_in_tri(l1, l2):
-                        az_s2p[a, r] = interp(aas[0], aas[1], aas[2], l1, l2, l3)
-                        rg_s2p[a, r] = interp(rrs[0], rrs[1], rrs[2], l1, l2, l3)
-                    l1, l2, l3 = bary(p, xx[3], xx[1], xx[2])
-                    if is_in_tri(l1, l2):
-                        az_s2p[a, r] = interp(aas[3], aas[1], aas[2], l1, l2, l3)
-                        rg_s2p[a, r] = interp(rrs[3], rrs[1], rrs[2], l1, l2, l3)
+            # - separate into 2 triangles sharing the (i, j + 1), (i + 1, j) edge
+            # - interpolate the secondary range and azimuth using triangle vertices
+            for k in range(2):
+                i0, j0 = i + k, j + k
+                tri, a_start, a_stop = _triangle_setup(
+                    azp[i0, j0],
+                    rgp[i0, j0],
+                    azp[i, j + 1],
+                    rgp[i, j + 1],
+                    azp[i + 1, j],
+                    rgp[i + 1, j],
+                    naz,
+                    nrg,
+                )
+                for a in range(a_start, a_stop):
+                    r_start, r_stop, e1, e2 = _triangle_span(tri, a)
+                    for r in range(r_start, r_stop):
+                        inside, l1, l2, l3 = _triangle_weights(tri, r, e1, e2)
+                        if inside:
+                            az_s2p[a, r] = (
+                                l1 * azs[i0, j0]
+                                + l2 * azs[i, j + 1]
+                                + l3 * azs[i + 1, j]
+                            )
+                            rg_s2p[a, r] = (
+                                l1 * rgs[i0, j0]
+                                + l2 * rgs[i, j + 1]
+                                + l3 * rgs[i + 1, j]
+                            )
 
     return az_s2p, rg_s2p
 
@@ -765,13 +1027,13 @@ def align(arr_s, az_s2p, rg_s2p, kernel="bicubic"):
         arr_s (array): image in the secondary geometry
         az_s2p (array): azimuth lookup table to project secondary to primary
         rg_s2p (array): range lookup table project secondary to primary
-        kernel (str, optional): Type of kernel (values are "nearest", "bilinear", "bicubic" -- 4 point bicubic, "bicubic6" -- six point bicubic). Defaults to "bicubic".
+        kernel (str, optional): Type of kernel (values are "nearest", "bilinear", "bicubic" -- 4 point bicubic, "bicubic6" -- six point bicubic, "sinc" -- eight point truncated sinc). Defaults to "bicubic".
 
     Returns:
         array: projected image
     """
     log.info("Warp secondary to primary geometry.")
-    return remap(arr_s, az_s2p, rg_s2p, kernel)
+    return remap(arr_s, az_s2p, rg_s2p, kernel, single_precision=True)
 
 
 def resample(
@@ -785,7 +1047,7 @@ def resample(
         out_file (str): output file
         az_p2g (array): azimuth coordinates of the lookup table
         rg_p2g (array): range coordinates of the lookup table
-        kernel (str): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic" and "bicubic6".Defaults to "bilinear".
+        kernel (str): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc".Defaults to "bilinear".
         write_phase (bool): writes the array's phase . Defaults to False.
     """
     # retrieve dem profile
@@ -803,7 +1065,7 @@ def resample(
     out_prof.update({"width": dst_width, "height": dst_height, "transform": dst_trans})
 
     log.info("Warp to match DEM geometry")
-    wped = remap(arr, az_p2g, rg_p2g, kernel=kernel)
+    wped = remap(arr, az_p2g, rg_p2g, kernel=kernel, single_precision=True)
 
     # TODO: enforce COG
     log.info("Write output GeoTIFF")
@@ -923,6 +1185,207 @@ def read_metadata(pth_xml):
     return meta
 
 
+# increment when the content of the metadata cache changes
+_METADATA_CACHE_VERSION = 3
+
+# fields of SwathMetadata stored in the cache
+_METADATA_SCALARS = [
+    "start_time",
+    "lines_per_burst",
+    "samples_per_burst",
+    "number_of_samples",
+    "azimuth_time_interval",
+    "slant_range_time",
+    "range_sampling_rate",
+    "radar_frequency",
+    "azimuth_steering_rate",
+]
+_METADATA_ARRAYS = [
+    "burst_times",
+    "first_valid_sample",
+    "last_valid_sample",
+    "fm_rate_times",
+    "fm_rate_coeffs",
+    "dc_times",
+    "dc_coeffs",
+    "cal_lines",
+    "cal_pixels",
+    "cal_beta",
+    "cal_sigma",
+]
+
+
+def _metadata_cache_file(product, iw, pol, cache_dir):
+    # the manifest contains checksums of all the files of the product
+    manifest = product / "manifest.safe"
+    if not manifest.exists():
+        manifest = product / f"{product.stem}.SAFE" / "manifest.safe"
+    if not manifest.exists():
+        manifest = next(iter(product.glob("**/manifest.safe")), None)
+    if manifest is None:
+        return None
+    checksum = hashlib.md5(manifest.read_bytes()).hexdigest()
+    hash_input = f"{product.stem}_{iw}_{pol}_{checksum}_{_METADATA_CACHE_VERSION}"
+    hash_str = hashlib.md5(hash_input.encode("utf-8")).hexdigest()
+    return f"{cache_dir}/s1meta-{hash_str}.npz"
+
+
+def _read_metadata_cache(cache_file):
+    if cache_file is None or not os.path.exists(cache_file):
+        return None
+    # plain arrays and a JSON header: no object is unpickled from the file
+    try:
+        with np.load(cache_file, allow_pickle=False) as data:
+            header = json.loads(str(data["header"]))
+            state_vectors = {
+                name[3:]: data[name] for name in data.files if name.startswith("sv_")
+            }
+            state_vectors["t0"] = isoparse(header["sv_t0"])
+            model = SwathMetadata(
+                **{name: header[name] for name in _METADATA_SCALARS},
+                **{name: data[name] for name in _METADATA_ARRAYS},
+                state_vectors=state_vectors,
+            )
+            burst_geom = {
+                "subswath": header["subswath"],
+                "burst": header["burst"],
+                "geometry": [str(it) for it in data["burst_geometry"]],
+            }
+        return {
+            "pth_tiff": header["pth_tiff"],
+            "model": model,
+            "burst_geom": burst_geom,
+            "orbit_type": header["orbit_type"],
+        }
+    except Exception:
+        log.warning(f"Could not read metadata cache {cache_file}, ignoring it.")
+        return None
+
+
+def _write_metadata_cache(cache_file, swath_meta):
+    if cache_file is None:
+        return
+    model = swath_meta["model"]
+    state_vectors = model.state_vectors
+    burst_geom = swath_meta["burst_geom"]
+    header = {name: getattr(model, name) for name in _METADATA_SCALARS}
+    header.update(
+        pth_tiff=str(swath_meta["pth_tiff"]),
+        orbit_type=swath_meta["orbit_type"],
+        sv_t0=state_vectors["t0"].isoformat(),
+        subswath=[str(it) for it in burst_geom["subswath"]],
+        burst=[int(it) for it in burst_geom["burst"]],
+    )
+    arrays = {name: getattr(model, name) for name in _METADATA_ARRAYS}
+    arrays.update(
+        {f"sv_{k}": np.asarray(v) for k, v in state_vectors.items() if k != "t0"}
+    )
+    arrays["burst_geometry"] = np.array(burst_geom["geometry"], dtype=str)
+    # write to a temporary file first in case of concurrent runs
+    tmp_file = f"{cache_file}-{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            np.savez(f, header=np.array(json.dumps(header)), **arrays)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        log.warning(f"Could not write metadata cache {cache_file}.")
+
+
+def _parse_swath_metadata(safe_path, product, iw, pol, orb_dir):
+    # raster path
+    try:
+        str_tiff = f"**/measurement/*iw{iw}*{pol}*.tiff"
+        pth_tiff = list(product.glob(str_tiff))[0]
+    except IndexError:
+        raise FileNotFoundError("Tiff file is missing.")
+    # store path relative to the product root
+    if isinstance(product, zipfile.Path):
+        pth_tiff_rel = pth_tiff.at
+    else:
+        pth_tiff_rel = str(pth_tiff.relative_to(product))
+
+    # metadata path
+    try:
+        str_xml = f"**/annotation/*iw{iw}*{pol}*.xml"
+        pth_xml = list(product.glob(str_xml))[0]
+    except IndexError:
+        raise FileNotFoundError("Metadata file is missing.")
+
+    # calibration path
+    try:
+        str_cal = f"**/annotation/calibration/calibration*iw{iw}*{pol}*.xml"
+        pth_cal = list(product.glob(str_cal))[0]
+    except IndexError:
+        raise FileNotFoundError("Calibration file is missing.")
+
+    # read annotation data
+    meta = read_metadata(pth_xml)
+
+    # extract calibration LUT to rescale data
+    calinfo = read_metadata(pth_cal)
+    calvec = calinfo["calibration"]["calibrationVectorList"]["calibrationVector"]
+
+    # read burst geometries
+    gdf_burst_geom = get_burst_geometry(
+        path=safe_path, target_subswaths=f"IW{iw}", polarization=pol.upper()
+    )
+    burst_geom = {
+        "subswath": list(gdf_burst_geom["subswath"]),
+        "burst": list(gdf_burst_geom["burst"]),
+        "geometry": list(gdf_burst_geom.geometry.to_wkt(rounding_precision=-1)),
+    }
+
+    log.info(f"S1IWSwath Initialization:")
+    log.info(f"- Read metadata file {pth_xml}")
+    log.info(f"- Read calibration file {pth_cal}")
+    log.info(f"- Set up raster path {pth_tiff}")
+    log.info(f"- Look for available OSV (Orbit State Vectors)")
+
+    state_vectors, orbit_type = _read_orbit(safe_path, orb_dir)
+
+    return {
+        "pth_tiff": pth_tiff_rel,
+        "model": SwathMetadata.from_annotation(meta, calvec, state_vectors),
+        "burst_geom": burst_geom,
+        "orbit_type": orbit_type,
+    }
+
+
+def _read_orbit(safe_path, orb_dir):
+    product = identify(safe_path)
+    zip_orb = product.getOSV(orb_dir, osvType=["POE", "RES"], returnMatch=True)
+    if not zip_orb:
+        raise RuntimeError("No orbit file available for this product")
+
+    if "POEORB" in zip_orb:
+        log.info("-- Precise orbit found")
+        orbit_type = "POEORB"
+    elif "RESORB" in zip_orb:
+        log.info("-- Restituted orbit found")
+        orbit_type = "RESORB"
+    else:
+        raise RuntimeError("Unknown orbit file")
+
+    with zipfile.ZipFile(zip_orb) as zf:
+        orb_file = zf.namelist()[0]
+        with zf.open(orb_file) as f:
+            orbdict = parse(f.read())
+    orbdata = orbdict["Earth_Explorer_File"]["Data_Block"]["List_of_OSVs"]["OSV"]
+    state_vectors = {}
+    t0 = isoparse(orbdata[0]["UTC"][4:])
+    state_vectors["t0"] = t0
+    state_vectors["t"] = np.array(
+        [(isoparse(it["UTC"][4:]) - t0).total_seconds() for it in orbdata]
+    )
+    state_vectors["x"] = np.array([float(it["X"]["#text"]) for it in orbdata])
+    state_vectors["y"] = np.array([float(it["Y"]["#text"]) for it in orbdata])
+    state_vectors["z"] = np.array([float(it["Z"]["#text"]) for it in orbdata])
+    state_vectors["vx"] = np.array([float(it["VX"]["#text"]) for it in orbdata])
+    state_vectors["vy"] = np.array([float(it["VY"]["#text"]) for it in orbdata])
+    state_vectors["vz"] = np.array([float(it["VZ"]["#text"]) for it in orbdata])
+    return state_vectors, orbit_type
+
+
 def read_chunk(pth_tiff, first_line=0, number_of_lines=1500):
 
     with rasterio.open(pth_tiff) as src:
@@ -974,7 +1437,16 @@ def sv_interpolator_poly(state_vectors):
 
 
 # TODO add resampling type option
-def load_dem_coords(dem_file, upscale_factor=1):
+def load_dem(dem_file, upscale_factor=1):
+    """Reads DEM heights.
+
+    Args:
+        dem_file (str): path to the DEM, it needs a tag named 'COMPOSITE_CRS'.
+        upscale_factor (float, optional): upsampling factor applied at read time. Defaults to 1.
+
+    Returns:
+        (array, dict, str): heights with nodata set to nan, rasterio profile of the (upsampled) DEM and composite CRS.
+    """
 
     with rasterio.open(dem_file) as ds:
         if upscale_factor != 1:
@@ -993,81 +1465,196 @@ def load_dem_coords(dem_file, upscale_factor=1):
             dem_trans = ds.transform * ds.transform.scale(
                 (ds.width / alt.shape[-1]), (ds.height / alt.shape[-2])
             )
-            if "COMPOSITE_CRS" in ds.tags():
-                composite_crs = ds.tags()["COMPOSITE_CRS"]
-            else:
-                raise KeyError("DEM file needs to have a tag named 'COMPOSITE_CRS'.")
-            nodata = ds.nodata
         else:
             alt = ds.read(1)
             dem_prof = ds.profile.copy()
             dem_trans = ds.transform
-            if "COMPOSITE_CRS" in ds.tags():
-                composite_crs = ds.tags()["COMPOSITE_CRS"]
-            else:
-                raise KeyError("DEM file needs to have a tag named 'COMPOSITE_CRS'.")
-            nodata = ds.nodata
-
-    # output lat-lon coordinates
-    width, height = alt.shape[1], alt.shape[0]
-    if dem_trans[1] > 1.0e-8 or dem_trans[3] > 1.0e-8:
-        grid = np.meshgrid(np.arange(width), np.arange(height))
-        lat, lon = rasterio.transform.xy(dem_trans, grid[1].ravel(), grid[0].ravel())
-        lat = np.array(lat)
-        lon = np.array(lon)
-    else:
-        # much faster
-        ix, iy = np.arange(width), np.arange(height)
-        lat_ = dem_trans[0] * ix + dem_trans[2]
-        lon_ = dem_trans[4] * iy + dem_trans[5]
-        lon = lon_[:, None] + np.zeros_like(alt)
-        lat = lat_[None, :] + np.zeros_like(alt)
+        if "COMPOSITE_CRS" in ds.tags():
+            composite_crs = ds.tags()["COMPOSITE_CRS"]
+        else:
+            raise KeyError("DEM file needs to have a tag named 'COMPOSITE_CRS'.")
+        nodata = ds.nodata
 
     # make sure nodata is nan in output
-    if not np.isnan(nodata):
+    if nodata is not None and not np.isnan(nodata):
         msk = alt == nodata
     alt = alt.astype("float64")
-    if not np.isnan(nodata):
+    if nodata is not None and not np.isnan(nodata):
         alt[msk] = np.nan
 
+    width, height = alt.shape[1], alt.shape[0]
     dem_prof.update({"width": width, "height": height, "transform": dem_trans})
+    return alt, dem_prof, composite_crs
+
+
+def dem_coords(dem_trans, row_start, row_stop, width):
+    """Computes the coordinates of a block of DEM rows from the affine transform.
+
+    Args:
+        dem_trans (Affine): DEM transform
+        row_start (int): first row
+        row_stop (int): last row (excluded)
+        width (int): number of columns
+
+    Returns:
+        (array, array): x and y coordinates of shape (row_stop - row_start, width)
+    """
+    ix = np.arange(width, dtype="float64")[None, :]
+    iy = np.arange(row_start, row_stop, dtype="float64")[:, None]
+    x = dem_trans.a * ix + dem_trans.b * iy + dem_trans.c
+    y = dem_trans.d * ix + dem_trans.e * iy + dem_trans.f
+    return x, y
+
+
+def load_dem_coords(dem_file, upscale_factor=1):
+    alt, dem_prof, composite_crs = load_dem(dem_file, upscale_factor)
+    # output lat-lon coordinates
+    lat, lon = dem_coords(dem_prof["transform"], 0, alt.shape[0], alt.shape[1])
     return lat, lon, alt, dem_prof, composite_crs
 
 
-def lla_to_ecef(lat, lon, alt, composite_crs):
+def lla_to_ecef(lat, lon, alt, composite_crs, geoid_dir="/tmp"):
+    """Converts DEM coordinates to ECEF (EPSG:4978) coordinates.
+
+    For DEMs in geographic coordinates on the WGS84 ellipsoid, heights are converted to ellipsoidal heights using a geoid undulation grid (see `geoid_grid`) and the conversion is done by a parallel numba kernel. Other CRS are converted with pyproj.
+
+    Args:
+        lat (array): x coordinates (longitudes) as returned by `load_dem_coords`
+        lon (array): y coordinates (latitudes) as returned by `load_dem_coords`
+        alt (array): heights in the vertical CRS of the DEM
+        composite_crs (str): horizontal and vertical CRS of the DEM, e.g. "EPSG:4326+5773"
+        geoid_dir (str, optional): directory where geoid grids are cached. Defaults to "/tmp".
 
-    # WGS84_crs = "EPSG:4326+5773"
-    ECEF_crs = "EPSG:4978"
+    Returns:
+        (array, array, array): x, y and z ECEF coordinates with the shape of the inputs.
+    """
+    shape = np.shape(alt)
+    x_deg = np.ascontiguousarray(np.ravel(lat), dtype="float64")
+    y_deg = np.ascontiguousarray(np.ravel(lon), dtype="float64")
+    h = np.ascontiguousarray(np.ravel(alt), dtype="float64")
+
+    crs = CRS(composite_crs)
+    horizontal_crs = crs.sub_crs_list[0] if crs.is_compound else crs
+    ellps = horizontal_crs.ellipsoid
+    is_wgs84 = (
+        horizontal_crs.is_geographic
+        and ellps is not None
+        and np.isclose(ellps.semi_major_metre, 6378137.0)
+        and np.isclose(ellps.inverse_flattening, 298.257223563)
+    )
 
-    # much faster than rasterio transform
-    # tf = Transformer.from_crs(WGS84_crs, ECEF_crs)
-    tf = Transformer.from_crs(composite_crs, ECEF_crs)
+    if not is_wgs84:
+        # generic (slower) path
+        tf = Transformer.from_crs(composite_crs, "EPSG:4978", always_xy=True)
+        dem_x, dem_y, dem_z = tf.transform(x_deg, y_deg, h)
+        return (
+            np.reshape(dem_x, shape),
+            np.reshape(dem_y, shape),
+            np.reshape(dem_z, shape),
+        )
 
-    # single-threaded
-    # !! pyproj uses lon, lat whereas rasterio uses lat, lon
-    # WGS84_points = (lon, lat, alt)
-    # dem_pts = tf.transform(*WGS84_points)
+    if crs.is_compound and x_deg.size > 0:
+        # snap to whole degrees so that grids are shared between DEMs
+        bounds = (
+            float(np.floor(np.nanmin(x_deg))),
+            float(np.floor(np.nanmin(y_deg))),
+            float(np.floor(np.nanmax(x_deg)) + 1),
+            float(np.floor(np.nanmax(y_deg)) + 1),
+        )
+        und, step = geoid_grid(composite_crs, bounds, geoid_dir)
+        x0, y0 = bounds[0], bounds[1]
+    else:
+        # ellipsoidal heights
+        und, step, x0, y0 = np.zeros((2, 2)), 1.0, 0.0, 0.0
 
-    # multi-threaded
-    # WARNING: this fails with pyproj 3.7.0
-    chunk = 128
-    wgs_pts = [
-        (lon[b : b + chunk], lat[b : b + chunk], alt[b : b + chunk])
-        for b in range(0, len(lon), chunk)
-    ]
-    chunked = Parallel(n_jobs=-1, prefer="threads")(
-        delayed(tf.transform)(*b) for b in wgs_pts
+    a = 6378137.0
+    f = 1 / 298.257223563
+    dem_x, dem_y, dem_z = _lla_to_ecef_kernel(
+        x_deg, y_deg, h, und, x0, y0, step, a, f * (2 - f)
     )
-    dem_x = np.zeros_like(lon)
-    dem_y = np.zeros_like(lon)
-    dem_z = np.zeros_like(lon)
-    for i in range(len(chunked)):
-        b1 = i * chunk
-        b2 = np.minimum((i + 1) * chunk, lon.shape[0])
-        dem_x[b1:b2] = chunked[i][0]
-        dem_y[b1:b2] = chunked[i][1]
-        dem_z[b1:b2] = chunked[i][2]
+    return np.reshape(dem_x, shape), np.reshape(dem_y, shape), np.reshape(dem_z, shape)
+
 
+@lru_cache(maxsize=16)
+def geoid_grid(composite_crs, bounds, geoid_dir="/tmp", step=1 / 60):
+    """Samples the geoid undulation of the vertical CRS on a regular latitude-longitude grid.
+
+    The grid is computed once with pyproj and stored as `geoid-{hash}.npz` in `geoid_dir` so that subsequent calls do not need PROJ grids or network access. Grids are not stored on disk when the geoid model is not available to PROJ (undulation is then 0 as in pyproj's ballpark transformation).
+
+    Args:
+        composite_crs (str): horizontal and vertical CRS, e.g. "EPSG:4326+5773"
+        bounds (tuple): (lon_min, lat_min, lon_max, lat_max) of the grid in degrees
+        geoid_dir (str, optional): cache directory. If None, the grid is not cached on disk. Defaults to "/tmp".
+        step (float, optional): grid spacing in degrees. Defaults to 1/60 (1 arc minute).
+
+    Returns:
+        (array, float): undulation grid with latitudes along the first axis (starting at lat_min) and longitudes along the second axis (starting at lon_min), grid spacing.
+    """
+    hash_input = f"{CRS(composite_crs).to_string()}_{bounds}_{step}".encode("utf-8")
+    hash_str = hashlib.md5(hash_input).hexdigest()
+    geoid_file = f"{geoid_dir}/geoid-{hash_str}.npz" if geoid_dir else None
+
+    if geoid_file and os.path.exists(geoid_file):
+        with np.load(geoid_file) as npz:
+            return npz["undulation"], float(npz["step"])
+
+    log.info("Sample geoid undulation grid")
+    x_min, y_min, x_max, y_max = bounds
+    nx = int(round((x_max - x_min) / step)) + 1
+    ny = int(round((y_max - y_min) / step)) + 1
+    xx, yy = np.meshgrid(x_min + step * np.arange(nx), y_min + step * np.arange(ny))
+
+    # ellipsoidal height of points at zero height in the vertical CRS
+    tg = TransformerGroup(composite_crs, "EPSG:4979", always_xy=True)
+    if not tg.transformers:
+        raise RuntimeError(
+            f"No transformation found from {composite_crs} to EPSG:4979."
+        )
+    _, _, und = tg.transformers[0].transform(xx.ravel(), yy.ravel(), np.zeros(xx.size))
+    und = np.reshape(und, xx.shape)
+    if not np.all(np.isfinite(und)):
+        raise RuntimeError("Geoid undulation could not be computed.")
+
+    if not tg.best_available:
+        log.warning(
+            "Geoid model is not available to PROJ: heights are used as ellipsoidal heights."
+        )
+    elif geoid_file:
+        # write to a temporary file first in case of concurrent runs
+        tmp_file = f"{geoid_file[:-4]}-{os.getpid()}.npz"
+        np.savez(tmp_file, undulation=und, step=step)
+        os.replace(tmp_file, geoid_file)
+
+    return und, step
+
+
+@njit(nogil=True, parallel=True, cache=True)
+def _lla_to_ecef_kernel(lon, lat, alt, und, lon0, lat0, step, a, e2):
+    dem_x = np.empty_like(alt)
+    dem_y = np.empty_like(alt)
+    dem_z = np.empty_like(alt)
+    ny, nx = und.shape
+    for i in prange(alt.shape[0]):
+        # bilinear interpolation of the geoid undulation
+        fx = min(max((lon[i] - lon0) / step, 0.0), nx - 1.0)
+        fy = min(max((lat[i] - lat0) / step, 0.0), ny - 1.0)
+        j0 = min(int(fx), nx - 2)
+        i0 = min(int(fy), ny - 2)
+        wx = fx - j0
+        wy = fy - i0
+        n_top = und[i0, j0] + wx * (und[i0, j0 + 1] - und[i0, j0])
+        n_bottom = und[i0 + 1, j0] + wx * (und[i0 + 1, j0 + 1] - und[i0 + 1, j0])
+        h = alt[i] + n_top + wy * (n_bottom - n_top)
+
+        phi = np.radians(lat[i])
+        lam = np.radians(lon[i])
+        sin_phi = np.sin(phi)
+        cos_phi = np.cos(phi)
+        # prime vertical radius of curvature
+        rn = a / np.sqrt(1 - e2 * sin_phi**2)
+        dem_x[i] = (rn + h) * cos_phi * np.cos(lam)
+        dem_y[i] = (rn + h) * cos_phi * np.sin(lam)
+        dem_z[i] = (rn * (1 - e2) + h) * sin_phi
     return dem_x, dem_y, dem_z
 
 
@@ -1156,6 +1743,460 @@ def range_doppler(xx, yy, zz, positions, velocities, tol=1e-8, maxiter=10000):
     return i_zd, r_zd, dx, dy, dz
 
 
+def _log_solver_stats(stats):
+    npts, evals, fallbacks, max_evals = stats
+    if npts > 0:
+        log.info(
+            f"Zero-Doppler solver: {evals / npts:.2f} evaluations per point on average "
+            f"(max {max_evals}), {fallbacks} / {npts} points solved by bisection"
+        )
+
+
+@njit(nogil=True, cache=True)
+def _doppler_newton_step(t, x, y, z, positions, velocities):
+    # orbit is linearly interpolated between state vectors t0 and t1
+    t0 = min(int(np.floor(t)), len(positions) - 2)
+    t1 = t0 + 1
+    u = t - t0
+
+    dpx = positions[t1, 0] - positions[t0, 0]
+    dpy = positions[t1, 1] - positions[t0, 1]
+    dpz = positions[t1, 2] - positions[t0, 2]
+    dvx = velocities[t1, 0] - velocities[t0, 0]
+    dvy = velocities[t1, 1] - velocities[t0, 1]
+    dvz = velocities[t1, 2] - velocities[t0, 2]
+
+    vx = velocities[t0, 0] + u * dvx
+    vy = velocities[t0, 1] + u * dvy
+    vz = velocities[t0, 2] + u * dvz
+    dx = x - (positions[t0, 0] + u * dpx)
+    dy = y - (positions[t0, 1] + u * dpy)
+    dz = z - (positions[t0, 2] + u * dpz)
+
+    d = np.sqrt(dx**2 + dy**2 + dz**2)
+    vd = vx * dx + vy * dy + vz * dz
+    fc = -vd / d
+
+    # derivative of the Doppler function with respect to the orbit index
+    dvd = dvx * dx + dvy * dy + dvz * dz - (vx * dpx + vy * dpy + vz * dpz)
+    dd = -(dx * dpx + dy * dpy + dz * dpz) / d
+    dfc = -dvd / d + vd * dd / d**2
+
+    return fc, dfc, dx, dy, dz
+
+
+@njit(nogil=True, cache=True, parallel=True)
+def range_doppler_newton(
+    xx, yy, zz, positions, velocities, ncols, tol=1e-8, maxiter=10000, max_newton=20
+):
+    """Solves the Range-Doppler equations using Newton iterations on the Doppler function.
+
+    Points are processed row by row: each point is seeded with the solution of its left neighbour in the same DEM row. Bisection over the whole orbit is only used when Newton iterations leave the orbit interval or do not converge.
+
+    Args:
+        xx (array): flattened x coordinates of the DEM points
+        yy (array): flattened y coordinates of the DEM points
+        zz (array): flattened z coordinates of the DEM points
+        positions (array): orbit positions of shape (n, 3)
+        velocities (array): orbit velocities of shape (n, 3)
+        ncols (int): number of columns of the DEM (length of a row)
+        tol (float, optional): tolerance on the Doppler function. Defaults to 1e-8.
+        maxiter (int, optional): maximum number of bisection iterations. Defaults to 10000.
+        max_newton (int, optional): maximum number of Newton iterations before switching to bisection. Defaults to 20.
+
+    Returns:
+        (array, array, array, array, array, array): azimuth (orbit) indices, slant range distances, look vector components and iteration statistics `[number of points, number of Doppler evaluations, number of bisection fallbacks, maximum evaluations for a single point]`.
+    """
+
+    i_zd = np.zeros_like(xx)
+    r_zd = np.zeros_like(xx)
+    dx = np.zeros_like(xx)
+    dy = np.zeros_like(xx)
+    dz = np.zeros_like(xx)
+    num_orbits = len(positions)
+    t_max = num_orbits - 1
+
+    npts = xx.shape[0]
+    nrows = (npts + ncols - 1) // ncols
+    row_pts = np.zeros(nrows, dtype=np.int64)
+    row_evals = np.zeros(nrows, dtype=np.int64)
+    row_fallbacks = np.zeros(nrows, dtype=np.int64)
+    row_max_evals = np.zeros(nrows, dtype=np.int64)
+
+    for row in prange(nrows):
+        t_seed = np.nan
+        for i in range(row * ncols, min((row + 1) * ncols, npts)):
+            x_val = xx[i]
+            y_val = yy[i]
+            z_val = zz[i]
+            if np.isnan(x_val):
+                continue
+            evals = 0
+
+            # Newton iterations starting from the neighbour solution
+            c = t_seed if not np.isnan(t_seed) else t_max / 2.0
+            converged = False
+            for _ in range(max_newton):
+                fc, dfc, px, py, pz = _doppler_newton_step(
+                    c, x_val, y_val, z_val, positions, velocities
+                )
+                evals += 1
+                if np.abs(fc) <= tol:
+                    converged = True
+                    break
+                if dfc == 0.0:
+                    break
+                c = c - fc / dfc
+                if not (c >= 0 and c <= t_max):
+                    break
+
+            # bracket failed: fall back to bisection on the whole orbit
+            if not converged:
+                row_fallbacks[row] += 1
+                a = 0.0
+                b = float(t_max)
+                fa = _doppler_newton_step(
+                    a, x_val, y_val, z_val, positions, velocities
+                )[0]
+                fb = _doppler_newton_step(
+                    b, x_val, y_val, z_val, positions, velocities
+                )[0]
+                evals += 2
+                # exit if no solution
+                if np.sign(fa * fb) > 0:
+                    i_zd[i] = np.nan
+                    r_zd[i] = np.nan
+                    row_pts[row] += 1
+                    row_evals[row] += evals
+                    row_max_evals[row] = max(row_max_evals[row], evals)
+                    continue
+                c = (a + b) / 2.0
+                fc, _, px, py, pz = _doppler_newton_step(
+                    c, x_val, y_val, z_val, positions, velocities
+                )
+                evals += 1
+                its = 0
+                while np.abs(fc) > tol and its < maxiter:
+                    its += 1
+                    if fa * fc < 0:
+                        b = c
+                    else:
+                        a = c
+                        fa = fc
+                    c = (a + b) / 2.0
+                    fc, _, px, py, pz = _doppler_newton_step(
+                        c, x_val, y_val, z_val, positions, velocities
+                    )
+                    evals += 1
+
+            i_zd[i] = c
+            dx[i] = px
+            dy[i] = py
+            dz[i] = pz
+            r_zd[i] = np.sqrt(px**2 + py**2 + pz**2)
+            t_seed = c
+
+            row_pts[row] += 1
+            row_evals[row] += evals
+            row_max_evals[row] = max(row_max_evals[row], evals)
+
+    stats = np.array(
+        [
+            row_pts.sum(),
+            row_evals.sum(),
+            row_fallbacks.sum(),
+            row_max_evals.max() if nrows > 0 else 0,
+        ]
+    )
+    return i_zd, r_zd, dx, dy, dz, stats
+
+
+def _solve_range_doppler(xx, yy, zz, positions, velocities, ncols, solver="newton"):
+    if solver == "newton":
+        i_zd, r_zd, dx, dy, dz, stats = range_doppler_newton(
+            xx, yy, zz, positions, velocities, ncols, tol=1e-8, maxiter=10000
+        )
+        _log_solver_stats(stats)
+    else:
+        i_zd, r_zd, dx, dy, dz = range_doppler(
+            xx, yy, zz, positions, velocities, tol=1e-8, maxiter=10000
+        )
+    return i_zd, r_zd, dx, dy, dz
+
+
+def range_doppler_tie_points(
+    lat,
+    lon,
+    alt,
+    composite_crs,
+    positions,
+    velocities,
+    r0,
+    dr,
+    step=16,
+    tol=0.05,
+    solver="newton",
+    geoid_dir="/tmp",
+):
+    """Computes azimuth and range lookup tables by solving the Range-Doppler equations on a grid of tie points.
+
+    The DEM is split into tiles whose corners are spaced by `step` pixels. The equations are solved at the corners, the center and the edge midpoints of each tile. Tiles where the bilinear interpolation of the corners differs from the exact solution at one of these points by more than `tol` pixels, or that are only partially valid, are split in four and the process is repeated until tiles are small enough to be solved exactly. Tiles without valid tie points are only left empty if none of their DEM pixels is valid. DEM nodata pixels are NaN in the lookup tables.
+
+    Args:
+        lat (array): x coordinates of the DEM as returned by `load_dem_coords`
+        lon (array): y coordinates of the DEM as returned by `load_dem_coords`
+        alt (array): DEM heights
+        composite_crs (str): horizontal and vertical CRS of the DEM
+        positions (array): orbit positions of shape (n, 3) sampled at each azimuth line
+        velocities (array): orbit velocities of shape (n, 3) sampled at each azimuth line
+        r0 (float): slant range of the first sample
+        dr (float): slant range pixel spacing
+        step (int, optional): initial spacing between tie points in DEM pixels. Defaults to 16.
+        tol (float, optional): maximum interpolation error in pixels at the check points of the tiles. Defaults to 0.05.
+        solver (str, optional): zero-Doppler solver, "newton" or "bisection". Defaults to "newton".
+        geoid_dir (str, optional): directory where geoid grids are cached. Defaults to "/tmp".
+
+    Returns:
+        (array, array): azimuth and slant range indices with the shape of the DEM.
+    """
+    nr, nc = alt.shape
+    lat = np.reshape(lat, alt.shape)
+    lon = np.reshape(lon, alt.shape)
+    az = np.full(alt.shape, np.nan)
+    rg = np.full(alt.shape, np.nan)
+    solved = np.zeros(alt.shape, dtype=bool)
+
+    def solve(idx):
+        # exact solutions for the flat indices idx (sorted to improve warm starts)
+        idx = idx[~solved.flat[idx]]
+        if idx.size == 0:
+            return
+        ii, jj = np.unravel_index(idx, alt.shape)
+        xx, yy, zz = lla_to_ecef(
+            lat[ii, jj], lon[ii, jj], alt[ii, jj], composite_crs, geoid_dir
+        )
+        i_zd, r_zd, _, _, _ = _solve_range_doppler(
+            xx - positions[0, 0],
+            yy - positions[0, 1],
+            zz - positions[0, 2],
+            positions - positions[0],
+            velocities,
+            min(idx.size, 256),
+            solver,
+        )
+        # nodata points are not handled by the solvers
+        nodata = np.isnan(xx)
+        i_zd[nodata] = np.nan
+        r_zd[nodata] = np.nan
+        az.flat[idx] = i_zd
+        rg.flat[idx] = (r_zd - r0) / dr
+        solved.flat[idx] = True
+
+    ri = np.unique(np.r_[np.arange(0, nr, step), nr - 1])
+    ci = np.unique(np.r_[np.arange(0, nc, step), nc - 1])
+    if len(ri) < 2 or len(ci) < 2:
+        solve(np.arange(nr * nc))
+        return az, rg
+
+    # tiles are (first row, last row, first col, last col) of the corner tie points
+    rr, cc = np.meshgrid(np.arange(len(ri) - 1), np.arange(len(ci) - 1), indexing="ij")
+    tiles = np.stack(
+        [ri[rr.ravel()], ri[rr.ravel() + 1], ci[cc.ravel()], ci[cc.ravel() + 1]],
+        axis=1,
+    )
+
+    while len(tiles):
+        r_a, r_b, c_a, c_b = tiles.T
+        r_m = (r_a + r_b) // 2
+        c_m = (c_a + c_b) // 2
+        corners = [(r_a, c_a), (r_a, c_b), (r_b, c_a), (r_b, c_b)]
+        # tile center and edge midpoints (corners of the tiles after splitting)
+        checks = [(r_m, c_m), (r_a, c_m), (r_b, c_m), (r_m, c_a), (r_m, c_b)]
+        idx = np.concatenate(
+            [np.ravel_multi_index(rc, alt.shape) for rc in corners + checks]
+        )
+        solve(np.unique(idx))
+
+        # interpolation error at check points
+        bad = np.zeros(len(tiles), dtype=bool)
+        for arr in (az, rg):
+            v00, v01, v10, v11 = [arr[rc] for rc in corners]
+            for r, c in checks:
+                wr = (r - r_a) / (r_b - r_a)
+                wc = (c - c_a) / (c_b - c_a)
+                top = v00 + (v01 - v00) * wc
+                bottom = v10 + (v11 - v10) * wc
+                interp = top + (bottom - top) * wr
+                exact = arr[r, c]
+                bad |= np.abs(interp - exact) > tol
+                bad |= np.isnan(interp) != np.isnan(exact)
+        # partially valid tiles
+        n_nan = sum(np.isnan(az[rc]) for rc in corners)
+        bad |= (n_nan > 0) & (n_nan < 4)
+        # nodata tiles may still have valid DEM pixels between the tie points
+        empty = ~bad & (n_nan == 4)
+        if empty.any():
+            bad[empty] = _tiles_have_data(alt, tiles[empty])
+
+        _fill_tiles(az, rg, solved, tiles[~bad])
+
+        # tiles that can't be split further are solved exactly
+        tiles = tiles[bad]
+        small = (tiles[:, 1] - tiles[:, 0] <= 2) & (tiles[:, 3] - tiles[:, 2] <= 2)
+        if small.any():
+            msk = np.zeros(alt.shape, dtype=bool)
+            _mark_tiles(msk, tiles[small])
+            solve(np.flatnonzero(msk))
+        tiles = _split_tiles(tiles[~small])
+
+    # nodata holes between tie points of valid tiles
+    nodata = np.isnan(alt)
+    az[nodata] = np.nan
+    rg[nodata] = np.nan
+
+    log.info(
+        f"Tie-point geocoding: {solved.sum()} / {solved.size} points solved "
+        f"({100 * solved.sum() / solved.size:.2f} %)"
+    )
+    return az, rg
+
+
+def _split_tiles(tiles):
+    # split tiles in 4, or in 2 if they are only one pixel high or wide
+    children = []
+    for r_a, r_b, c_a, c_b in tiles:
+        r_m = (r_a + r_b) // 2
+        c_m = (c_a + c_b) // 2
+        rows = [(r_a, r_m), (r_m, r_b)] if r_b - r_a > 1 else [(r_a, r_b)]
+        cols = [(c_a, c_m), (c_m, c_b)] if c_b - c_a > 1 else [(c_a, c_b)]
+        children += [(r1, r2, c1, c2) for r1, r2 in rows for c1, c2 in cols]
+    return np.array(children, dtype=np.int64).reshape(-1, 4)
+
+
+@njit(nogil=True, cache=True)
+def _tile_extent(r_a, r_b, c_a, c_b, nr, nc):
+    # tiles own their first corner row and column, last ones are included at image borders
+    r_end = r_b + 1 if r_b == nr - 1 else r_b
+    c_end = c_b + 1 if c_b == nc - 1 else c_b
+    return r_end, c_end
+
+
+@njit(nogil=True, cache=True, parallel=True)
+def _tiles_have_data(alt, tiles):
+    # tiles with at least one valid DEM pixel, corner rows and columns included
+    has_data = np.zeros(tiles.shape[0], dtype=np.bool_)
+    for t in prange(tiles.shape[0]):
+        r_a, r_b, c_a, c_b = tiles[t]
+        for i in range(r_a, r_b + 1):
+            for j in range(c_a, c_b + 1):
+                if not np.isnan(alt[i, j]):
+                    has_data[t] = True
+                    break
+            if has_data[t]:
+                break
+    return has_data
+
+
+@njit(nogil=True, cache=True, parallel=True)
+def _mark_tiles(msk, tiles):
+    nr, nc = msk.shape
+    for t in prange(tiles.shape[0]):
+        r_a, r_b, c_a, c_b = tiles[t]
+        r_end, c_end = _tile_extent(r_a, r_b, c_a, c_b, nr, nc)
+        for i in range(r_a, r_end):
+            for j in range(c_a, c_end):
+                msk[i, j] = True
+
+
+@njit(nogil=True, cache=True, parallel=True)
+def _fill_tiles(az, rg, solved, tiles):
+    # bilinear interpolation of the tile corners for the unsolved pixels
+    nr, nc = az.shape
+    for t in prange(tiles.shape[0]):
+        r_a, r_b, c_a, c_b = tiles[t]
+        r_end, c_end = _tile_extent(r_a, r_b, c_a, c_b, nr, nc)
+        for i in range(r_a, r_end):
+            wr = (i - r_a) / (r_b - r_a)
+            for j in range(c_a, c_end):
+                if solved[i, j]:
+                    continue
+                wc = (j - c_a) / (c_b - c_a)
+                top = az[r_a, c_a] + (az[r_a, c_b] - az[r_a, c_a]) * wc
+                bottom = az[r_b, c_a] + (az[r_b, c_b] - az[r_b, c_a]) * wc
+                az[i, j] = top + (bottom - top) * wr
+                top = rg[r_a, c_a] + (rg[r_a, c_b] - rg[r_a, c_a]) * wc
+                bottom = rg[r_b, c_a] + (rg[r_b, c_b] - rg[r_b, c_a]) * wc
+                rg[i, j] = top + (bottom - top) * wr
+
+
+@njit(nogil=True, cache=True, parallel=True)
+def _look_vectors(az, xx, yy, zz, positions):
+    # vectors from the (linearly interpolated) orbit position to the DEM points
+    dx = np.full_like(xx, np.nan)
+    dy = np.full_like(xx, np.nan)
+    dz = np.full_like(xx, np.nan)
+    t_max = len(positions) - 1
+    for i in prange(len(az)):
+        t = az[i]
+        if not (t >= 0 and t <= t_max):
+            continue
+        t0 = min(int(np.floor(t)), t_max - 1)
+        u = t - t0
+        dx[i] = xx[i] - (
+            positions[t0, 0] + u * (positions[t0 + 1, 0] - positions[t0, 0])
+        )
+        dy[i] = yy[i] - (
+            positions[t0, 1] + u * (positions[t0 + 1, 1] - positions[t0, 1])
+        )
+        dz[i] = zz[i] - (
+            positions[t0, 2] + u * (positions[t0 + 1, 2] - positions[t0, 2])
+        )
+    return dx, dy, dz
+
+
+@njit(nogil=True, cache=True)
+def _terrain_gamma(lx, ly, lz, sx, sy, sz, nx, ny, nz):
+    """Simulated gamma nought of a DEM facet.
+
+    Args:
+        lx (float): look vector x coordinate
+        ly (float): look vector y coordinate
+        lz (float): look vector z coordinate
+        sx (float): S vector x coordinate
+        sy (float): S vector y coordinate
+        sz (float): S vector z coordinate
+        nx (float): facet normal x coordinate
+        ny (float): facet normal y coordinate
+        nz (float): facet normal z coordinate
+
+    Returns:
+        float: inverse of the tangent of the projected incidence angle, zero for facets facing away from the sensor
+    """
+    norm = np.sqrt(lx**2 + ly**2 + lz**2)
+    lx, ly, lz = lx / norm, ly / norm, lz / norm
+    norm = np.sqrt(sx**2 + sy**2 + sz**2)
+    sx, sy, sz = sx / norm, sy / norm, sz / norm
+    norm = np.sqrt(nx**2 + ny**2 + nz**2)
+    nx, ny, nz = nx / norm, ny / norm, nz / norm
+
+    # project normal in the slant-range plane
+    uv = lx * sx + ly * sy + lz * sz
+    up = lx * nx + ly * ny + lz * nz
+    vp = sx * nx + sy * ny + sz * nz
+    denom = 1 - uv**2
+    alpha = (up - uv * vp) / denom
+    beta = (vp - uv * up) / denom
+    px = alpha * lx + beta * sx
+    py = alpha * ly + beta * sy
+    pz = alpha * lz + beta * sz
+    norm = np.sqrt(px**2 + py**2 + pz**2)
+    cosp = (px * lx + py * ly + pz * lz) / norm
+
+    # gamma convention: inverse of the tangent
+    gamma = cosp / (1e-12 + np.sqrt(1 - cosp**2))
+    return gamma if gamma > 0 else 0.0
+
+
 @njit(nogil=True, parallel=True, cache=True)
 def simulate_terrain_backscatter(
     naz, nrg, az, rg, dem_x, dem_y, dem_z, dx, dy, dz, shadow_mask
@@ -1183,125 +2224,79 @@ def simulate_terrain_backscatter(
             - Instead of the sine of the projected incidence angle,
             the tangent is computed to comply with the gamma nought convention.
             - The simulated backscatter is regridded and accumulated in the SAR geometry to account for many-to-one and one-to-many relationships.
+        Each thread accumulates into its own bands of radar rows, so the output does not depend on the number of threads.
     """
 
-    # test if point is in triangle
-    def is_in_tri(p, a, b, c):
-
-        det = (b[1] - c[1]) * (a[0] - c[0]) + (c[0] - b[0]) * (a[1] - c[1])
-        l1 = ((b[1] - c[1]) * (p[0] - c[0]) + (c[0] - b[0]) * (p[1] - c[1])) / det
-        l2 = ((c[1] - a[1]) * (p[0] - c[0]) + (a[0] - c[0]) * (p[1] - c[1])) / det
-
-        return (l1 >= 0) and (l2 >= 0) and (l1 + l2 < 1)
-
-    def project_point_on_plane(p, u, v):
-
-        uv = np.dot(u, v)
-        up = np.dot(u, p)
-        vp = np.dot(v, p)
-
-        denom = 1 - uv**2
-
-        alpha = (up - uv * vp) / denom
-        beta = (vp - uv * up) / denom
-
-        # Compute the projection
-        p_proj = alpha * u + beta * v
-        return p_proj
-
-    def norm_vec(v):
-        return np.sqrt((v**2).sum())
-
     gamma_proj = np.zeros((naz, nrg))
 
     nl, nc = az.shape
-    # - loop on DEM
+    # - radar rows covered by each 4 neighborhood of the DEM
+    first_row = np.zeros((nl - 1, nc - 1), dtype=np.int32)
+    last_row = np.full((nl - 1, nc - 1), -1, dtype=np.int32)
     for i in prange(0, nl - 1):
         for j in range(0, nc - 1):
             if shadow_mask[i, j] == 1:
                 continue
-            # - for each 4 neighborhood
-            aa = az[i : i + 2, j : j + 2].flatten()
-            rr = rg[i : i + 2, j : j + 2].flatten()
-            xx = dem_x[i : i + 2, j : j + 2].flatten()
-            yy = dem_y[i : i + 2, j : j + 2].flatten()
-            zz = dem_z[i : i + 2, j : j + 2].flatten()
-            # - collect triangle vertices
-            aarr = np.vstack((aa, rr)).T
-            if np.isnan(aarr).any():
+            if _quad_has_nan(az, i, j) or _quad_has_nan(rg, i, j):
                 continue
-            # - compute bounding box in the radar grid
-            amin, amax = np.floor(aa.min()), np.ceil(aa.max())
-            rmin, rmax = np.floor(rr.min()), np.ceil(rr.max())
-            amin = int(np.maximum(amin, 0))
-            rmin = int(np.maximum(rmin, 0))
-            amax = int(np.minimum(amax, naz - 1)) + 1
-            rmax = int(np.minimum(rmax, nrg - 1)) + 1
-
-            # Triangle 1
-            # look vector
-            lv1 = np.array([dx[i, j], dy[i, j], dz[i, j]])
-            lv1 /= norm_vec(lv1)
-
-            # normal vector
-            nv1 = np.cross(
-                [xx[1] - xx[0], yy[1] - yy[0], zz[1] - zz[0]],
-                [xx[2] - xx[0], yy[2] - yy[0], zz[2] - zz[0]],
-            )
-            norm1 = norm_vec(nv1)
-            nv1 /= norm1
-
-            # compute S vector (normalized position)
-            s1 = np.array([dx[i, j] - xx[0], dy[i, j] - yy[0], dz[i, j] - zz[0]])
-            s1 /= norm_vec(s1)
-
-            # project normal in the slant-range plane
-            nv1p = project_point_on_plane(nv1, lv1, s1)
-            nv1p /= norm_vec(nv1p)
-            cos1p = (nv1p * lv1).sum()
-
-            # gamma convention: inverse of the tangent
-            gamma1 = cos1p / (1e-12 + np.sqrt(1 - cos1p**2))
-            gamma1 = gamma1 if gamma1 > 0 else 0
-
-            # Triangle 2
-            # look vector
-            lv2 = np.array([dx[i + 1, j + 1], dy[i + 1, j + 1], dz[i + 1, j + 1]])
-            lv2 /= norm_vec(lv2)
-
-            # normal vector
-            nv2 = -np.cross(
-                [xx[1] - xx[3], yy[1] - yy[3], zz[1] - zz[3]],
-                [xx[2] - xx[3], yy[2] - yy[3], zz[2] - zz[3]],
-            )
-            norm2 = norm_vec(nv2)
-            nv2 /= norm2
-
-            s2 = np.array(
-                [
-                    dx[i + 1, j + 1] - xx[3],
-                    dy[i + 1, j + 1] - yy[3],
-                    dz[i + 1, j + 1] - zz[3],
-                ]
-            )
-            s2 /= norm_vec(s2)
-
-            # project normal in the slant-range plane
-            nv2p = project_point_on_plane(nv2, lv2, s2)
-            nv2p /= norm_vec(nv2p)
-            cos2p = (nv2p * lv2).sum()
-
-            # gamma convention: inverse of the tangent
-            gamma2 = cos2p / (1e-12 + np.sqrt(1 - cos2p**2))
-            gamma2 = gamma2 if gamma2 >= 0 else 0
-
-            # project into SAR geometry
-            for a in range(amin, amax):
-                for r in range(rmin, rmax):
-                    if is_in_tri([a, r], aarr[0], aarr[1], aarr[2]):
-                        gamma_proj[a, r] += gamma1
-                    if is_in_tri([a, r], aarr[3], aarr[1], aarr[2]):
-                        gamma_proj[a, r] += gamma2
+            amin = min(az[i, j], az[i, j + 1], az[i + 1, j], az[i + 1, j + 1])
+            amax = max(az[i, j], az[i, j + 1], az[i + 1, j], az[i + 1, j + 1])
+            amin = max(np.floor(amin), 0.0)
+            amax = min(np.ceil(amax), naz - 1.0)
+            if amax >= amin:
+                first_row[i, j] = int(amin)
+                last_row[i, j] = int(amax)
+
+    # - each thread accumulates into its own bands of radar rows, visiting
+    # the DEM in serial order so that sums do not depend on scheduling
+    nbands = (naz + _RASTER_BAND_ROWS - 1) // _RASTER_BAND_ROWS
+    offsets, items = _band_index(first_row, last_row, _RASTER_BAND_ROWS, nbands)
+    for b in prange(nbands):
+        row_lo = b * _RASTER_BAND_ROWS
+        row_hi = min(row_lo + _RASTER_BAND_ROWS, naz)
+        for q in range(offsets[b], offsets[b + 1]):
+            i = items[q] // (nc - 1)
+            j = items[q] % (nc - 1)
+            # - separate into 2 triangles sharing the (i, j + 1), (i + 1, j) edge
+            for k in range(2):
+                i0, j0 = i + k, j + k
+                # edge vectors from the opposite vertex
+                ux = dem_x[i, j + 1] - dem_x[i0, j0]
+                uy = dem_y[i, j + 1] - dem_y[i0, j0]
+                uz = dem_z[i, j + 1] - dem_z[i0, j0]
+                vx = dem_x[i + 1, j] - dem_x[i0, j0]
+                vy = dem_y[i + 1, j] - dem_y[i0, j0]
+                vz = dem_z[i + 1, j] - dem_z[i0, j0]
+                # normal vector, facing up for both triangles
+                sign = 1.0 if k == 0 else -1.0
+                gamma = _terrain_gamma(
+                    dx[i0, j0],
+                    dy[i0, j0],
+                    dz[i0, j0],
+                    dx[i0, j0] - dem_x[i0, j0],
+                    dy[i0, j0] - dem_y[i0, j0],
+                    dz[i0, j0] - dem_z[i0, j0],
+                    sign * (uy * vz - uz * vy),
+                    sign * (uz * vx - ux * vz),
+                    sign * (ux * vy - uy * vx),
+                )
+
+                # project into SAR geometry
+                tri, a_start, a_stop = _triangle_setup(
+                    az[i0, j0],
+                    rg[i0, j0],
+                    az[i, j + 1],
+                    rg[i, j + 1],
+                    az[i + 1, j],
+                    rg[i + 1, j],
+                    naz,
+                    nrg,
+                )
+                for a in range(max(a_start, row_lo), min(a_stop, row_hi)):
+                    r_start, r_stop, e1, e2 = _triangle_span(tri, a)
+                    for r in range(r_start, r_stop):
+                        if _triangle_weights(tri, r, e1, e2)[0]:
+                            gamma_proj[a, r] += gamma
 
     for a in prange(gamma_proj.shape[0]):
         for r in range(gamma_proj.shape[1]):
@@ -1368,11 +2363,30 @@ def _shadow_mask(theta, rg0, az):
     nrg0 = rg0_max - rg0_min + 1
 
     # coarse warping into zero altitude (ground) geometry
-    theta0 = np.full((naz, nrg0), fill_value=np.nan)
+    # when several DEM points fall in the same cell, the last one in DEM order
+    # is kept: cells are written by the thread owning their row band
+    row0 = np.zeros(theta.shape, dtype=np.int32)
+    col0 = np.full(theta.shape, -1, dtype=np.int32)
     for i in prange(theta.shape[0]):
         for j in range(theta.shape[1]):
             if np.isfinite(az[i, j]) and az[i, j] > 0 and rg0[i, j] > 0:
-                theta0[int(az[i, j]) - az_min, int(rg0[i, j]) - rg0_min] = theta[i, j]
+                a0 = int(az[i, j]) - az_min
+                r0 = int(rg0[i, j]) - rg0_min
+                if a0 >= 0 and r0 >= 0:
+                    row0[i, j] = a0
+                    col0[i, j] = r0
+    nbands = (naz + _RASTER_BAND_ROWS - 1) // _RASTER_BAND_ROWS
+    offsets, items = _band_index(
+        row0, np.where(col0 >= 0, row0, -1), _RASTER_BAND_ROWS, nbands
+    )
+    theta0 = np.full((naz, nrg0), fill_value=np.nan)
+    thetaf = theta.ravel()
+    row0f = row0.ravel()
+    col0f = col0.ravel()
+    for b in prange(nbands):
+        for q in range(offsets[b], offsets[b + 1]):
+            k = items[q]
+            theta0[row0f[k], col0f[k]] = thetaf[k]
 
     # scanning lines in ground geometry
     mask0 = np.full_like(theta0, fill_value=np.nan)
@@ -1,30 +1,41 @@
-from eo_tools.S1.core import S1IWSwath, coregister, align
-from eo_tools.S1.util import presum, boxcar, remap
+from eo_tools.S1.core import S1IWSwath, coregister, _GEOCODING_BYTES_PER_PIXEL
+from eo_tools.S1.util import (
+    presum,
+    boxcar,
+    remap,
+    ResamplingPlan,
+    insar_looks,
+    goldstein_filter,
+)
 from eo_tools.auxils import get_burst_geometry
 from eo_tools.auxils import remove
 import numpy as np
-import xarray as xr
+import numba
 import rasterio as rio
 from rasterio.windows import Window
+from rasterio.shutil import copy as rio_copy
 import rioxarray as riox
-from rioxarray.merge import merge_arrays
+import xarray as xr
+import dask.array as da
 import warnings
 import os
-import concurrent
-import dask.array as da
+import concurrent.futures
+import multiprocessing
+import threading
+from collections import deque
+from itertools import islice
+from contextlib import ExitStack
 from rasterio.errors import NotGeoreferencedWarning
 import logging
 from pyroSAR import identify
 from typing import Union, List, Callable
 from datetime import datetime
 from pathlib import Path
+from glob import glob
 from shapely.geometry import shape
 from osgeo import gdal
-from rasterio.features import geometry_window
+from rasterio.features import geometry_window, geometry_mask
 from affine import Affine
-from numpy.fft import fft2, fftshift, ifft2, ifftshift
-from scipy.ndimage import uniform_filter as uflt
-from eo_tools.auxils import block_process
 from eo_tools.util import _has_overlap
 from skimage.morphology import binary_erosion
 
@@ -33,6 +44,16 @@ from skimage.morphology import binary_erosion
 # not needed anymore due to better memory handling in the latest rasterio
 USE_CP = False
 
+# GDAL block cache (MB) of the burst processing
+_BURST_GDAL_CACHEMAX = 512
+# approximate size of the arrays used to process one pixel of a burst of one SLC
+# (calibration, deramping, resampling plan, topographic phase and queued bursts)
+_BURST_BYTES_PER_PIXEL = 128
+# Zarr store of the coregistered SLCs of a stack, chunks in (date, azimuth, range)
+_ZARR_STORE = "slc.zarr"
+_ZARR_CHUNKS = [1, 512, 512]
+_ZARR_CLEVEL = 5
+
 log = logging.getLogger(__name__)
 
 
@@ -54,6 +75,10 @@ def process_insar(
     dem_upsampling: float = 1.8,
     dem_force_download: bool = False,
     dem_buffer_arc_sec: float = 40,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
     boxcar_coherence: Union[int, List[int]] = [3, 3],
     filter_ifg: bool = True,
     multilook: List[int] = [1, 4],
@@ -61,6 +86,8 @@ def process_insar(
     cal_type: str = "beta",
     clip_to_shape: bool = True,
     skip_preprocessing: bool = False,
+    n_workers: int = 1,
+    mem_budget: float = None,
 ) -> str:
     """Performs InSAR processing of a pair of SLC Sentinel-1 products, geocode the outputs and writes them as COG (Cloud Optimized GeoTiFF) files.
     AOI crop is optional.
@@ -83,13 +110,19 @@ def process_insar(
         dem_upsampling (float, optional): upsampling factor for the DEM, it is recommended to keep the default value. Defaults to 1.8.
         dem_force_download (bool, optional):  To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to False.
         dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
         boxcar_coherence (Union[int, List[int]], optional): Size of the boxcar filter to apply for coherence estimation. Defaults to [3, 3].
         filter_ifg (bool): Also applies boxcar to interferogram. Has no effect if complex_ifg_file is set to None or write_coherence is set to False. Defaults to True.x
         multilook (List[int], optional): Multilooking to apply prior to geocoding. Defaults to [1, 4].
-        warp_kernel (str, optional): Resampling kernel used in coregistration and geocoding. Possible values are "nearest", "bilinear", "bicubic" and "bicubic6". Defaults to "bicubic".
+        warp_kernel (str, optional): Resampling kernel used in coregistration and geocoding. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc". Defaults to "bicubic".
         cal_type (str, optional): Type of radiometric calibration. "beta" or "sigma" nought. Defaults to "beta"
         clip_to_shape (bool, optional): If set to False the geocoded images are not clipped according to the `shp` parameter. They are made of all the bursts intersecting the `shp` geometry. Defaults to True.
         skip_preprocessing (bool, optional): Skip the processing part in case the files are already written. Defaults to False.
+        n_workers (int, optional): Number of processes running subswath jobs concurrently. All the polarizations of a subswath are processed by the same job. Each process uses its share of the CPUs. Defaults to 1 (sequential processing).
+        mem_budget (float, optional): Memory in MB shared by the concurrent jobs. Jobs are started when their estimated peak memory fits in the budget. Only used if n_workers > 1. Defaults to None (no limit).
 
     Returns:
         str: output directory
@@ -117,7 +150,13 @@ def process_insar(
         dem_upsampling=dem_upsampling,
         dem_force_download=dem_force_download,
         dem_buffer_arc_sec=dem_buffer_arc_sec,
+        geocoding_mem_budget=geocoding_mem_budget,
+        tie_point_step=tie_point_step,
+        tie_point_tol=tie_point_tol,
+        cache_dir=cache_dir,
         skip_preprocessing=skip_preprocessing,
+        n_workers=n_workers,
+        mem_budget=mem_budget,
     )
 
     var_names = []
@@ -140,53 +179,23 @@ def process_insar(
 
     iw_idx = [iw[2] for iw in subswaths]
     patterns = [f"{p}_iw{iw}" for p in pol_ for iw in iw_idx]
+    slcs = []
     for pattern in patterns:
         prm_file = f"{out_dir}/slc_prm_{pattern}.tif"
         sec_file = f"{out_dir}/slc_sec_{pattern}.tif"
-
         if os.path.isfile(prm_file) and os.path.isfile(sec_file):
-            log.info(
-                f"---- Interferometric outputs for {" ".join(pattern.split('/')[-1].split('_')).upper()}"
-            )
-            if write_coherence and write_interferogram:
-                coh_file = f"{out_dir}/coh_{pattern}.tif"
-                ifg_file = f"{out_dir}/ifg_{pattern}.tif"
-                coherence(
-                    prm_file=prm_file,
-                    sec_file=sec_file,
-                    out_file=coh_file,
-                    box_size=boxcar_coherence,
-                    multilook=multilook,
-                    magnitude=True,
-                    complex_ifg_file=ifg_file,
-                    filter_ifg=filter_ifg,
-                )
-            elif write_coherence and not write_interferogram:
-                coh_file = f"{out_dir}/coh_{pattern}.tif"
-                coherence(
-                    prm_file=prm_file,
-                    sec_file=sec_file,
-                    out_file=coh_file,
-                    box_size=boxcar_coherence,
-                    multilook=multilook,
-                    magnitude=True,
-                )
-            elif not write_coherence and write_interferogram:
-                ifg_file = f"{out_dir}/ifg_{pattern}.tif"
-                interferogram(
-                    prm_file=prm_file,
-                    sec_file=sec_file,
-                    out_file=ifg_file,
-                    multilook=multilook,
-                )
-
-            if write_primary_amplitude:
-                ampl_file = f"{out_dir}/amp_prm_{pattern}.tif"
-                amplitude(in_file=prm_file, out_file=ampl_file, multilook=multilook)
-
-            if write_secondary_amplitude:
-                ampl_file = f"{out_dir}/amp_sec_{pattern}.tif"
-                amplitude(in_file=sec_file, out_file=ampl_file, multilook=multilook)
+            slcs.append((pattern, prm_file, sec_file))
+    _insar_products_iw(
+        slcs,
+        out_dir,
+        write_coherence=write_coherence,
+        write_interferogram=write_interferogram,
+        write_primary_amplitude=write_primary_amplitude,
+        write_secondary_amplitude=write_secondary_amplitude,
+        boxcar_coherence=boxcar_coherence,
+        filter_ifg=filter_ifg,
+        multilook=multilook,
+    )
 
     # by default, we use iw and pol which exist
     _child_process(
@@ -220,7 +229,13 @@ def prepare_insar(
     dem_upsampling: float = 1.8,
     dem_force_download: bool = False,
     dem_buffer_arc_sec: float = 40,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
     skip_preprocessing: bool = False,
+    n_workers: int = 1,
+    mem_budget: float = None,
 ) -> str:
     """Produce a coregistered pair of Single Look Complex images and associated lookup tables.
 
@@ -233,14 +248,20 @@ def prepare_insar(
         pol (Union[str, List[str]], optional):  Polarimetric channels to process (Either 'VH','VV, 'full' or a list like ['HV', 'VV']).  Defaults to "full".
         subswaths (List[str], optional):  limit the processing to a list of subswaths like `["IW1", "IW2"]`. Defaults to ["IW1", "IW2", "IW3"].
         apply_fast_esd (bool, optional): correct the phase to avoid jumps between bursts. This has no effect if only one burst is processed.  Defaults to False.
-        warp_kernel (str, optional): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic" and "bicubic6".Defaults to "bilinear".
+        warp_kernel (str, optional): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc".Defaults to "bilinear".
         cal_type (str, optional): Type of radiometric calibration. "beta" or "sigma" nought. Defaults to "beta"
         dem_dir (str, optional): Directory to store DEMs. Defaults to "/tmp".
         dem_name (str, optional): Digital Elevation Model to download. Possible values are 'nasadem', 'cop-dem-glo-30', 'cop-dem-glo-90', 'alos-dem'. Defaults to 'nasadem'.
         dem_upsampling (float, optional): upsampling factor for the DEM, it is recommended to keep the default value. Defaults to 1.8.
         dem_force_download (bool, optional):   To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to True.
         dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
         skip_preprocessing (bool, optional): Skip the processing part in case the files are already written. It is recommended to leave this parameter to default value. Defaults to False.
+        n_workers (int, optional): Number of processes running subswath jobs concurrently. All the polarizations of a subswath are processed by the same job. Each process uses its share of the CPUs. Defaults to 1 (sequential processing).
+        mem_budget (float, optional): Memory in MB shared by the concurrent jobs. Jobs are started when their estimated peak memory fits in the budget. Only used if n_workers > 1. Defaults to None (no limit).
 
     Returns:
         str: output directory
@@ -316,27 +337,51 @@ def prepare_insar(
     if not os.path.isdir(out_dir):
         log.info(f"Creating directory {out_dir}")
         os.makedirs(out_dir)
-    for p in pol_:
-        for subswath in unique_subswaths:
-            log.info(f"---- Processing subswath {subswath} in {p.upper()} polarization")
-
-            # identify bursts to process
-            bursts_prm = gdf_burst_prm[gdf_burst_prm["subswath"] == subswath][
-                "burst"
-            ].values
-            burst_prm_min = bursts_prm.min()
-            burst_prm_max = bursts_prm.max()
-
-            iw = int(subswath[2])
-            if not os.path.isdir(out_dir):
-                os.mkdir(out_dir)
-            if not skip_preprocessing:
-                preprocess_insar_iw(
-                    prm_path,
-                    sec_path,
-                    out_dir,
+    if skip_preprocessing:
+        log.info("Skipping preprocessing.")
+        return out_dir
+
+    # subswaths are processed independently, the geometry of each one
+    # is shared by all the polarizations
+    pol_ = [p.lower() for p in pol_]
+    jobs = []
+    for subswath in unique_subswaths:
+        # identify bursts to process
+        bursts_prm = gdf_burst_prm[gdf_burst_prm["subswath"] == subswath][
+            "burst"
+        ].values
+        burst_prm_min = bursts_prm.min()
+        burst_prm_max = bursts_prm.max()
+        iw = int(subswath[2])
+
+        mem = None
+        force_download = dem_force_download
+        if n_workers > 1:
+            # concurrent jobs must not download the same files
+            mem = _prefetch_iw(
+                [prm_path, sec_path],
+                pol_,
+                iw,
+                burst_prm_min,
+                burst_prm_max,
+                dem_dir,
+                dem_name,
+                dem_upsampling,
+                dem_buffer_arc_sec,
+                dem_force_download,
+                geocoding_mem_budget=geocoding_mem_budget,
+                cache_dir=cache_dir,
+            )
+            force_download = False
+        jobs.append(
+            (
+                _preprocess_insar_job,
+                dict(
+                    out_dir=out_dir,
+                    pol=pol_,
                     iw=iw,
-                    pol=p.lower(),
+                    prm_path=prm_path,
+                    sec_path=sec_path,
                     min_burst=burst_prm_min,
                     max_burst=burst_prm_max,
                     apply_fast_esd=apply_fast_esd,
@@ -346,25 +391,22 @@ def prepare_insar(
                     dem_name=dem_name,
                     dem_upsampling=dem_upsampling,
                     dem_buffer_arc_sec=dem_buffer_arc_sec,
-                    dem_force_download=dem_force_download,
-                )
-                os.rename(
-                    f"{out_dir}/primary.tif",
-                    f"{out_dir}/slc_prm_{p.lower()}_iw{iw}.tif",
-                )
-                os.rename(
-                    f"{out_dir}/secondary.tif",
-                    f"{out_dir}/slc_sec_{p.lower()}_iw{iw}.tif",
-                )
-                os.rename(f"{out_dir}/lut.tif", f"{out_dir}/lut_{p.lower()}_iw{iw}.tif")
-            else:
-                log.info("Skipping preprocessing.")
+                    geocoding_mem_budget=geocoding_mem_budget,
+                    tie_point_step=tie_point_step,
+                    tie_point_tol=tie_point_tol,
+                    cache_dir=cache_dir,
+                    dem_force_download=force_download,
+                ),
+                mem,
+            )
+        )
+    _run_jobs(jobs, n_workers, mem_budget)
     return out_dir
 
 
 def preprocess_insar_iw(
     prm_path: str,
-    sec_path: str,
+    sec_path: Union[str, List[str]],
     output_dir: str,
     iw: int = 1,
     pol: Union[str, List[str]] = "vv",
@@ -378,28 +420,40 @@ def preprocess_insar_iw(
     dem_upsampling: float = 1.8,
     dem_buffer_arc_sec: float = 40,
     dem_force_download: bool = False,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
+    queue_depth: int = 1,
 ) -> None:
     """Pre-process S1 InSAR subswaths pairs. Write coregistered primary and secondary SLC files as well as a lookup table that can be used to geocode rasters in the single-look radar geometry.
 
     Args:
         prm_path (str): directory or zip file containing the primary SLC product of the pair.
-        sec_path (str): directory or zip file containing the secondary SLC product of the pair.
+        sec_path (Union[str, List[str]]): directory or zip file containing the secondary SLC product of the pair, or list of secondary products to coregister with the same primary.
         output_dir (str): output directory (creating it if does not exist).
         iw (int, optional): subswath index. Defaults to 1.
-        pol (str, optional): polarization ('vv','vh'). Defaults to "vv".
+        pol (Union[str, List[str]], optional): polarization ('vv','vh') or list of polarizations like ['vv', 'vh']. Defaults to "vv".
         min_burst (int, optional): first burst to process. Defaults to 1.
         max_burst (int, optional): fast burst to process. If not set, last burst of the subswath. Defaults to None.
         apply_fast_esd: (bool, optional): correct the phase to avoid jumps between bursts. This has no effect if only one burst is processed. Defaults to True.
-        warp_kernel (str, optional): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic" and "bicubic6".Defaults to "bilinear".
+        warp_kernel (str, optional): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc".Defaults to "bilinear".
         cal_type (str, optional): Type of radiometric calibration. "beta" or "sigma" nought. Defaults to "beta"
         dem_dir (str, optional): directory where DEMs used for geocoding are stored. Defaults to "/tmp".
         dem_name (str, optional): Digital Elevation Model to download. Possible values are 'nasadem', 'cop-dem-glo-30', 'cop-dem-glo-90', 'alos-dem'. Defaults to 'nasadem'.
         dem_upsampling (float, optional): Upsample the DEM, it is recommended to keep the default value. Defaults to 2.
         dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
         dem_force_download (bool, optional): To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to false.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
+        queue_depth (int, optional): Number of bursts read ahead and waiting to be written while a burst is processed. Each one holds the burst rasters in memory. Defaults to 1.
 
     Note:
         DEM-assisted coregistration is performed to align the secondary with the Primary. A lookup table file is written to allow the geocoding images from the radar (single-look) grid to the geographic coordinates of the DEM. Bursts are stitched together to form continuous images. All output files are in the GeoTiff format that can be handled by most GIS softwares and geospatial raster tools such as GDAL and rasterio. Because they are in the SAR geometry, SLC rasters are not georeferenced.
+        If `pol` is a list, the geometry (lookup tables, coregistration, deramping and topographic phases) is computed once and applied to every polarization. The SLC files are then named `primary_{pol}.tif` and `secondary_{pol}.tif` and the lookup table `lut.tif` is shared.
+        If `sec_path` is a list, the primary geometry, DEM and calibrated primary bursts are computed once and every secondary is coregistered with them. The secondary files are then named `secondary_{k}.tif` (or `secondary_{k}_{pol}.tif`) where k is the position of the product in `sec_path`.
     """
 
     if not os.path.isdir(output_dir):
@@ -408,43 +462,29 @@ def preprocess_insar_iw(
     if iw not in [1, 2, 3]:
         raise ValueError("iw must be 1, 2 or 3")
 
-    if pol not in ["vv", "vh"]:
-        raise ValueError("pol must be 'vv' or 'vh'")
+    pol_ = [pol] if isinstance(pol, str) else list(pol)
+    if not pol_ or any(p not in ["vv", "vh"] for p in pol_):
+        raise ValueError("pol must be 'vv', 'vh' or a list of them")
 
     if cal_type not in ["beta", "sigma"]:
         raise ValueError(
             "Invalid calibration factor. Possible values are 'beta', 'sigma'."
         )
 
-    prm = S1IWSwath(prm_path, iw=iw, pol=pol)
-    sec = S1IWSwath(sec_path, iw=iw, pol=pol)
-
-    # retrieve burst geometries
-    sub_str = f"IW{iw}"
-    gdf_burst_prm = get_burst_geometry(
-        prm_path, target_subswaths=[sub_str], polarization="VV"
-    )
-    gdf_burst_sec = get_burst_geometry(
-        sec_path, target_subswaths=[sub_str], polarization="VV"
-    )
-
-    # here we deal with partial overlap
-    offsets = []
-    for _, it in gdf_burst_prm.iterrows():
-        for _, it2 in gdf_burst_sec.iterrows():
-            pair = (it["burst"], it2["burst"])
-            if _has_overlap(it["geometry"], it2["geometry"]):
-                offsets.append(pair[1] - pair[0])
-
-    if not offsets:
-        raise RuntimeError(
-            "No overlapping bursts. Cannot further process this product pair."
-        )
-    if not np.all(np.array(offsets) == offsets[0]):
-        raise RuntimeError("Overlapping bursts must be consecutive.")
+    # geometry and timing do not depend on the polarization
+    # the swaths of the first polarization are used to compute them
+    sec_paths = list(sec_path) if isinstance(sec_path, (list, tuple)) else [sec_path]
+    if not sec_paths:
+        raise ValueError("sec_path must not be empty")
+    prms = [S1IWSwath(prm_path, iw=iw, pol=p, cache_dir=cache_dir) for p in pol_]
+    secs = [
+        [S1IWSwath(path, iw=iw, pol=p, cache_dir=cache_dir) for p in pol_]
+        for path in sec_paths
+    ]
+    prm = prms[0]
 
     # == 0 if full overlap
-    burst_offset = offsets[0]
+    burst_offsets = [_burst_offset(prm, sec[0]) for sec in secs]
 
     # intra-product overlap
     overlap = np.round(prm.compute_burst_overlap(2)).astype(int)
@@ -454,14 +494,25 @@ def preprocess_insar_iw(
     else:
         max_burst_ = max_burst
 
+    # a single polarization given as a string keeps the file names without suffix
+    suffixes = [""] if isinstance(pol, str) else [f"_{p}" for p in pol_]
+    # same for a single secondary given as a string
+    if isinstance(sec_path, (list, tuple)):
+        sec_names = [f"secondary_{k}" for k in range(len(sec_paths))]
+    else:
+        sec_names = ["secondary"]
+    prm_files = [f"{output_dir}/primary{s}.tif" for s in suffixes]
+    sec_files = [[f"{output_dir}/{n}{s}.tif" for s in suffixes] for n in sec_names]
     if max_burst_ > min_burst:
-        tmp_prm = f"{output_dir}/tmp_primary.tif"
-        tmp_sec = f"{output_dir}/tmp_secondary.tif"
+        tmp_prms = [f"{output_dir}/tmp_primary{s}.tif" for s in suffixes]
+        tmp_secs = [
+            [f"{output_dir}/tmp_{n}{s}.tif" for s in suffixes] for n in sec_names
+        ]
     elif max_burst_ < min_burst:
         raise ValueError("max_burst must be >= min_burst")
     else:
-        tmp_prm = f"{output_dir}/primary.tif"
-        tmp_sec = f"{output_dir}/secondary.tif"
+        tmp_prms = prm_files
+        tmp_secs = sec_files
 
     if (
         max_burst_ > prm.burst_count
@@ -480,17 +531,17 @@ def preprocess_insar_iw(
     _child_process(
         _process_bursts_insar,
         (
-            prm,
-            sec,
-            tmp_prm,
-            tmp_sec,
+            prms,
+            secs,
+            tmp_prms,
+            tmp_secs,
             output_dir,
             dem_dir,
             naz,
             nrg,
             min_burst,
             max_burst_,
-            burst_offset,
+            burst_offsets,
             dem_name,
             dem_upsampling,
             dem_buffer_arc_sec,
@@ -498,52 +549,653 @@ def preprocess_insar_iw(
             warp_kernel,
             overlap,
             cal_type,
+            queue_depth,
+            geocoding_mem_budget,
+            tie_point_step,
+            tie_point_tol,
         ),
     )
 
-    if (max_burst_ > min_burst) & apply_fast_esd:
-        _child_process(
-            _apply_fast_esd,
+    for i, (tmp_prm, prm_file) in enumerate(zip(tmp_prms, prm_files)):
+        for tmp_sec_pol, sec_file_pol in zip(tmp_secs, sec_files):
+            tmp_sec, sec_file = tmp_sec_pol[i], sec_file_pol[i]
+            if (max_burst_ > min_burst) & apply_fast_esd:
+                _child_process(
+                    _apply_fast_esd,
+                    (
+                        tmp_prm,
+                        tmp_sec,
+                        min_burst,
+                        max_burst_,
+                        prm.lines_per_burst,
+                        nrg,
+                        overlap,
+                    ),
+                )
+
+            if max_burst_ > min_burst:
+                _child_process(
+                    _stitch_bursts,
+                    (
+                        tmp_sec,
+                        sec_file,
+                        prm.lines_per_burst,
+                        max_burst_ - min_burst + 1,
+                        overlap,
+                    ),
+                )
+
+        if max_burst_ > min_burst:
+            _child_process(
+                _stitch_bursts,
+                (
+                    tmp_prm,
+                    prm_file,
+                    prm.lines_per_burst,
+                    max_burst_ - min_burst + 1,
+                    overlap,
+                ),
+            )
+
+    log.info("Cleaning temporary files")
+    if max_burst_ > min_burst:
+        for tmp_file in tmp_prms + [f for files in tmp_secs for f in files]:
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+
+
+def _burst_offset(prm, sec):
+    # burst index offset between primary and secondary, here we deal with partial overlap
+    offsets = []
+    for _, it in prm.gdf_burst_geom.iterrows():
+        for _, it2 in sec.gdf_burst_geom.iterrows():
+            pair = (it["burst"], it2["burst"])
+            if _has_overlap(it["geometry"], it2["geometry"]):
+                offsets.append(pair[1] - pair[0])
+
+    if not offsets:
+        raise RuntimeError(
+            "No overlapping bursts. Cannot further process this product pair."
+        )
+    if not np.all(np.array(offsets) == offsets[0]):
+        raise RuntimeError("Overlapping bursts must be consecutive.")
+    return offsets[0]
+
+
+def process_insar_stack(
+    prm_path: str,
+    sec_paths: List[str],
+    output_dir: str,
+    aoi_name: str = None,
+    shp: shape = None,
+    pol: Union[str, List[str]] = "full",
+    subswaths: List[str] = ["IW1", "IW2", "IW3"],
+    pairs: Union[str, List[tuple]] = "sequential",
+    max_temporal_baseline: int = 48,
+    write_coherence: bool = True,
+    write_interferogram: bool = True,
+    write_primary_amplitude: bool = True,
+    write_secondary_amplitude: bool = False,
+    apply_fast_esd: bool = False,
+    dem_dir: str = "/tmp",
+    dem_name: str = "nasadem",
+    dem_upsampling: float = 1.8,
+    dem_force_download: bool = False,
+    dem_buffer_arc_sec: float = 40,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
+    boxcar_coherence: Union[int, List[int]] = [3, 3],
+    filter_ifg: bool = True,
+    multilook: List[int] = [1, 4],
+    warp_kernel: str = "bicubic",
+    cal_type: str = "beta",
+    clip_to_shape: bool = True,
+    skip_preprocessing: bool = False,
+    n_workers: int = 1,
+    mem_budget: float = None,
+    store: str = "tif",
+) -> str:
+    """Performs InSAR processing of a stack of SLC Sentinel-1 products acquired on the same track. All the products are coregistered with a single reference product and interferometric pairs are then formed from the coregistered stack. The outputs of each pair are geocoded and written as COG (Cloud Optimized GeoTiFF) files.
+    AOI crop is optional.
+
+    Args:
+        prm_path (str): reference image (SLC Sentinel-1 product directory or zip file).
+        sec_paths (List[str]): secondary images (SLC Sentinel-1 product directories or zip files).
+        output_dir (str): location in which the stack subdirectory will be created
+        aoi_name (str, optional): optional suffix to describe AOI / experiment. Defaults to None.
+        shp (shapely.geometry.shape, optional): Shapely geometry describing an area of interest as a polygon. Defaults to None.
+        pol (Union[str, List[str]], optional): Polarimetric channels to process (Either 'VH','VV, 'full' or a list like ['HV', 'VV']).  Defaults to "full".
+        subswaths (List[str], optional): limit the processing to a list of subswaths like `["IW1", "IW2"]`. Defaults to ["IW1", "IW2", "IW3"].
+        pairs (Union[str, List[tuple]], optional): Pairs to process. "sequential" for consecutive dates, "sbas" for all the pairs with a temporal baseline up to `max_temporal_baseline`, "all" for all the pairs, or a list of pairs of date identifiers like `[("2023-09-04-063730", "2023-09-16-063730")]`. Defaults to "sequential".
+        max_temporal_baseline (int, optional): Maximum temporal baseline in days of the "sbas" pairs. Defaults to 48.
+        write_coherence (bool, optional): Write the magnitude of the complex coherence. Defaults to True.
+        write_interferogram (bool, optional): Write the interferogram phase. Defaults to True.
+        write_primary_amplitude (bool, optional): Write the amplitude of the first image of each pair. Defaults to True.
+        write_secondary_amplitude (bool, optional): Write the amplitude of the second image of each pair. Defaults to False.
+        apply_fast_esd (bool, optional): correct the phase to avoid jumps between bursts. This has no effect if only one burst is processed. Defaults to False.
+        dem_dir (str, optional): Directory to store DEMs. Defaults to "/tmp".
+        dem_name (str, optional): Digital Elevation Model to download. Possible values are 'nasadem', 'cop-dem-glo-30', 'cop-dem-glo-90', 'alos-dem'. Defaults to 'nasadem'.
+        dem_upsampling (float, optional): upsampling factor for the DEM, it is recommended to keep the default value. Defaults to 1.8.
+        dem_force_download (bool, optional):  To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to False.
+        dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
+        boxcar_coherence (Union[int, List[int]], optional): Size of the boxcar filter to apply for coherence estimation. Defaults to [3, 3].
+        filter_ifg (bool): Also applies boxcar to interferogram. Has no effect if write_coherence is set to False. Defaults to True.
+        multilook (List[int], optional): Multilooking to apply prior to geocoding. Defaults to [1, 4].
+        warp_kernel (str, optional): Resampling kernel used in coregistration and geocoding. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc". Defaults to "bicubic".
+        cal_type (str, optional): Type of radiometric calibration. "beta" or "sigma" nought. Defaults to "beta"
+        clip_to_shape (bool, optional): If set to False the geocoded images are not clipped according to the `shp` parameter. They are made of all the bursts intersecting the `shp` geometry. Defaults to True.
+        skip_preprocessing (bool, optional): Skip the coregistration of the stack in case the files are already written. New pairs can then be processed from an existing stack. Defaults to False.
+        n_workers (int, optional): Number of processes running subswath jobs concurrently. All the polarizations of a subswath are processed by the same job. Each process uses its share of the CPUs. Defaults to 1 (sequential processing).
+        mem_budget (float, optional): Memory in MB shared by the concurrent jobs. Jobs are started when their estimated peak memory fits in the budget. Only used if n_workers > 1. Defaults to None (no limit).
+        store (str, optional): Storage of the coregistered SLCs. "tif" for GeoTiff files or "zarr" for a chunked and compressed Zarr store written by the subswath jobs (see `stack_to_zarr`). Defaults to "tif".
+
+    Returns:
+        str: output directory
+    """
+
+    if not np.any([write_coherence, write_interferogram]):
+        raise ValueError(
+            "At least one of `write_coherence` and `write_interferogram` must be True."
+        )
+
+    # coregister all the products with the reference
+    stack_dir = prepare_insar_stack(
+        prm_path=prm_path,
+        sec_paths=sec_paths,
+        output_dir=output_dir,
+        aoi_name=aoi_name,
+        shp=shp,
+        pol=pol,
+        apply_fast_esd=apply_fast_esd,
+        subswaths=subswaths,
+        warp_kernel=warp_kernel,
+        cal_type=cal_type,
+        dem_dir=dem_dir,
+        dem_name=dem_name,
+        dem_upsampling=dem_upsampling,
+        dem_force_download=dem_force_download,
+        dem_buffer_arc_sec=dem_buffer_arc_sec,
+        geocoding_mem_budget=geocoding_mem_budget,
+        tie_point_step=tie_point_step,
+        tie_point_tol=tie_point_tol,
+        cache_dir=cache_dir,
+        skip_preprocessing=skip_preprocessing,
+        n_workers=n_workers,
+        mem_budget=mem_budget,
+        store=store,
+    )
+
+    process_stack_pairs(
+        stack_dir,
+        pairs=pairs,
+        max_temporal_baseline=max_temporal_baseline,
+        shp=shp,
+        write_coherence=write_coherence,
+        write_interferogram=write_interferogram,
+        write_primary_amplitude=write_primary_amplitude,
+        write_secondary_amplitude=write_secondary_amplitude,
+        boxcar_coherence=boxcar_coherence,
+        filter_ifg=filter_ifg,
+        multilook=multilook,
+        warp_kernel=warp_kernel,
+        clip_to_shape=clip_to_shape,
+    )
+    return Path(stack_dir).parent
+
+
+def prepare_insar_stack(
+    prm_path: str,
+    sec_paths: List[str],
+    output_dir: str,
+    aoi_name: str = None,
+    shp: shape = None,
+    pol: Union[str, List[str]] = "full",
+    subswaths: List[str] = ["IW1", "IW2", "IW3"],
+    apply_fast_esd: bool = False,
+    warp_kernel: str = "bicubic",
+    cal_type: str = "beta",
+    dem_dir: str = "/tmp",
+    dem_name: str = "nasadem",
+    dem_upsampling: float = 1.8,
+    dem_force_download: bool = False,
+    dem_buffer_arc_sec: float = 40,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
+    skip_preprocessing: bool = False,
+    n_workers: int = 1,
+    mem_budget: float = None,
+    store: str = "tif",
+) -> str:
+    """Produce a stack of Single Look Complex images coregistered with a reference image and the associated lookup tables.
+
+    Args:
+        prm_path (str): Reference image (SLC Sentinel-1 product directory or zip file).
+        sec_paths (List[str]): Secondary images (SLC Sentinel-1 product directories or zip files).
+        output_dir (str): location in which the stack subdirectory will be created.
+        aoi_name (str, optional): optional suffix to describe AOI / experiment. Defaults to None.
+        shp (shapely.geometry.shape, optional): Shapely geometry describing an area of interest as a polygon. Defaults to None.
+        pol (Union[str, List[str]], optional):  Polarimetric channels to process (Either 'VH','VV, 'full' or a list like ['HV', 'VV']).  Defaults to "full".
+        subswaths (List[str], optional):  limit the processing to a list of subswaths like `["IW1", "IW2"]`. Defaults to ["IW1", "IW2", "IW3"].
+        apply_fast_esd (bool, optional): correct the phase to avoid jumps between bursts. This has no effect if only one burst is processed.  Defaults to False.
+        warp_kernel (str, optional): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc".Defaults to "bilinear".
+        cal_type (str, optional): Type of radiometric calibration. "beta" or "sigma" nought. Defaults to "beta"
+        dem_dir (str, optional): Directory to store DEMs. Defaults to "/tmp".
+        dem_name (str, optional): Digital Elevation Model to download. Possible values are 'nasadem', 'cop-dem-glo-30', 'cop-dem-glo-90', 'alos-dem'. Defaults to 'nasadem'.
+        dem_upsampling (float, optional): upsampling factor for the DEM, it is recommended to keep the default value. Defaults to 1.8.
+        dem_force_download (bool, optional):   To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to True.
+        dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
+        skip_preprocessing (bool, optional): Skip the processing part in case the files are already written. Defaults to False.
+        n_workers (int, optional): Number of processes running subswath jobs concurrently. All the polarizations of a subswath are processed by the same job. Each process uses its share of the CPUs. Defaults to 1 (sequential processing).
+        mem_budget (float, optional): Memory in MB shared by the concurrent jobs. Jobs are started when their estimated peak memory fits in the budget. Only used if n_workers > 1. Defaults to None (no limit).
+        store (str, optional): Storage of the coregistered SLCs. "tif" for GeoTiff files or "zarr" for a chunked and compressed Zarr store written by the subswath jobs (see `stack_to_zarr`). Defaults to "tif".
+
+    Returns:
+        str: output directory
+
+    Note:
+        The SLC files are named `slc_{date}_{pol}_iw{n}.tif` where date is the acquisition start time formatted like `2023-09-04-063730`, and the lookup tables `lut_iw{n}.tif`. The bursts intersecting `shp` are selected in the reference image.
+        With `store="zarr"`, each subswath job moves its SLCs to the `slc.zarr` store of the stack directory once they are coregistered.
+    """
+
+    if aoi_name is None:
+        aoi_substr = ""
+    else:
+        aoi_substr = f"_{aoi_name}"
+
+    if not isinstance(subswaths, list):
+        raise ValueError("Subswaths must be a list like ['IW1', 'IW2'].")
+
+    if not isinstance(sec_paths, list) or not sec_paths:
+        raise ValueError("sec_paths must be a non-empty list of products.")
+
+    if store not in ["tif", "zarr"]:
+        raise ValueError("store must be 'tif' or 'zarr'.")
+
+    # retrieve burst geometries of the reference
+    gdf_burst_prm = get_burst_geometry(
+        prm_path, target_subswaths=["IW1", "IW2", "IW3"], polarization="VV"
+    )
+
+    # find what subswaths and bursts intersect AOI
+    if shp is not None:
+        gdf_burst_prm = gdf_burst_prm[gdf_burst_prm.intersects(shp)]
+
+    if gdf_burst_prm.empty:
+        raise RuntimeError(
+            "The list of bursts to process is empty. Make sure shp intersects the product."
+        )
+
+    # identify corresponding subswaths
+    unique_subswaths = np.unique(gdf_burst_prm["subswath"])
+    unique_subswaths = [it for it in unique_subswaths if it in subswaths]
+
+    # check that polarization is correct
+    info_prm = identify(prm_path)
+    if isinstance(pol, str):
+        if pol == "full":
+            pol_ = info_prm.polarizations
+        else:
+            if pol.upper() in info_prm.polarizations:
+                pol_ = [pol]
+            else:
+                raise RuntimeError(
+                    f"polarization {pol} does not exists in the source product"
+                )
+    elif isinstance(pol, list):
+        pol_ = [x for x in pol if x in info_prm.polarizations]
+    else:
+        raise RuntimeError("polarizations must be of type str or list")
+
+    # do a check on orbits and parse dates
+    meta_prm = info_prm.scanMetadata()
+    orbnum = meta_prm["orbitNumber_rel"]
+    ids = []
+    for path in [prm_path] + sec_paths:
+        meta = identify(path).scanMetadata()
+        if meta["orbitNumber_rel"] != orbnum:
+            raise RuntimeError("Images must be from the same relative orbit.")
+        date = datetime.strptime(meta["start"], "%Y%m%dT%H%M%S")
+        ids.append(date.strftime("%Y-%m-%d-%H%M%S"))
+    if len(set(ids)) != len(ids):
+        raise RuntimeError("Images of the stack must have different dates.")
+
+    out_dir = f"{output_dir}/S1_InSAR_stack_{ids[0]}{aoi_substr}/sar"
+    if not os.path.isdir(out_dir):
+        log.info(f"Creating directory {out_dir}")
+        os.makedirs(out_dir)
+    if skip_preprocessing:
+        log.info("Skipping preprocessing.")
+        return out_dir
+
+    # subswaths are processed independently, the reference geometry of each one
+    # is shared by all the secondaries and polarizations
+    pol_ = [p.lower() for p in pol_]
+    if store == "zarr":
+        _create_zarr_store(out_dir)
+    jobs = []
+    for subswath in unique_subswaths:
+        # identify bursts to process
+        bursts_prm = gdf_burst_prm[gdf_burst_prm["subswath"] == subswath][
+            "burst"
+        ].values
+        burst_prm_min = bursts_prm.min()
+        burst_prm_max = bursts_prm.max()
+        iw = int(subswath[2])
+
+        mem = None
+        force_download = dem_force_download
+        if n_workers > 1:
+            # concurrent jobs must not download the same files
+            mem = _prefetch_iw(
+                [prm_path] + sec_paths,
+                pol_,
+                iw,
+                burst_prm_min,
+                burst_prm_max,
+                dem_dir,
+                dem_name,
+                dem_upsampling,
+                dem_buffer_arc_sec,
+                dem_force_download,
+                geocoding_mem_budget=geocoding_mem_budget,
+                cache_dir=cache_dir,
+            )
+            force_download = False
+        jobs.append(
             (
-                tmp_prm,
-                tmp_sec,
-                min_burst,
-                max_burst_,
-                prm.lines_per_burst,
-                nrg,
-                overlap,
-            ),
+                _preprocess_stack_job,
+                dict(
+                    out_dir=out_dir,
+                    pol=pol_,
+                    iw=iw,
+                    ids=ids,
+                    store=store,
+                    prm_path=prm_path,
+                    sec_path=sec_paths,
+                    min_burst=burst_prm_min,
+                    max_burst=burst_prm_max,
+                    apply_fast_esd=apply_fast_esd,
+                    warp_kernel=warp_kernel,
+                    cal_type=cal_type,
+                    dem_dir=dem_dir,
+                    dem_name=dem_name,
+                    dem_upsampling=dem_upsampling,
+                    dem_buffer_arc_sec=dem_buffer_arc_sec,
+                    geocoding_mem_budget=geocoding_mem_budget,
+                    tie_point_step=tie_point_step,
+                    tie_point_tol=tie_point_tol,
+                    cache_dir=cache_dir,
+                    dem_force_download=force_download,
+                ),
+                mem,
+            )
         )
+    _run_jobs(jobs, n_workers, mem_budget)
+    return out_dir
 
-    if max_burst_ > min_burst:
+
+def process_stack_pairs(
+    stack_dir: str,
+    pairs: Union[str, List[tuple]] = "sequential",
+    max_temporal_baseline: int = 48,
+    shp: shape = None,
+    write_coherence: bool = True,
+    write_interferogram: bool = True,
+    write_primary_amplitude: bool = True,
+    write_secondary_amplitude: bool = False,
+    boxcar_coherence: Union[int, List[int]] = [3, 3],
+    filter_ifg: bool = True,
+    multilook: List[int] = [1, 4],
+    warp_kernel: str = "bicubic",
+    clip_to_shape: bool = True,
+) -> List[str]:
+    """Compute and geocode the interferometric outputs of pairs of images of a coregistered stack.
+
+    Args:
+        stack_dir (str): directory containing the coregistered stack (output of `prepare_insar_stack`).
+        pairs (Union[str, List[tuple]], optional): Pairs to process. "sequential" for consecutive dates, "sbas" for all the pairs with a temporal baseline up to `max_temporal_baseline`, "all" for all the pairs, or a list of pairs of date identifiers like `[("2023-09-04-063730", "2023-09-16-063730")]`. Defaults to "sequential".
+        max_temporal_baseline (int, optional): Maximum temporal baseline in days of the "sbas" pairs. Defaults to 48.
+        shp (shapely.geometry.shape, optional): Shapely geometry describing an area of interest as a polygon. Defaults to None.
+        write_coherence (bool, optional): Write the magnitude of the complex coherence. Defaults to True.
+        write_interferogram (bool, optional): Write the interferogram phase. Defaults to True.
+        write_primary_amplitude (bool, optional): Write the amplitude of the first image of each pair. Defaults to True.
+        write_secondary_amplitude (bool, optional): Write the amplitude of the second image of each pair. Defaults to False.
+        boxcar_coherence (Union[int, List[int]], optional): Size of the boxcar filter to apply for coherence estimation. Defaults to [3, 3].
+        filter_ifg (bool): Also applies boxcar to interferogram. Has no effect if write_coherence is set to False. Defaults to True.
+        multilook (List[int], optional): Multilooking to apply prior to geocoding. Defaults to [1, 4].
+        warp_kernel (str, optional): Resampling kernel used in geocoding. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc". Defaults to "bicubic".
+        clip_to_shape (bool, optional): If set to False the geocoded images are not clipped according to the `shp` parameter. Defaults to True.
+
+    Returns:
+        List[str]: output directories of the pairs
+
+    Note:
+        The first image of a pair is the earliest one. The outputs of each pair are written in a subdirectory `S1_InSAR_{date1}__{date2}` next to the stack directory, and geocoded with the lookup tables of the stack.
+        If the stack directory has a Zarr store (see `stack_to_zarr`), the SLCs are read from it.
+    """
+    if os.path.isdir(f"{stack_dir}/{_ZARR_STORE}"):
+        group = _import_zarr().open_group(f"{stack_dir}/{_ZARR_STORE}", mode="r")
+        stacks = {}
+        for name in sorted(group.array_keys()):
+            pol, iw = name.split("_iw")
+            stacks[name] = open_stack(stack_dir, pol, int(iw))
+        ids = sorted({it for slcs in stacks.values() for it in slcs.date.values})
+        pols = sorted({name.split("_")[0] for name in stacks})
+    else:
+        stacks = None
+        files = glob(f"{stack_dir}/slc_*_iw[123].tif")
+        ids = sorted({Path(f).name.split("_")[1] for f in files})
+        pols = sorted({Path(f).name.split("_")[2] for f in files})
+    if len(ids) < 2:
+        raise RuntimeError(f"Less than two dates found in {stack_dir}")
+
+    var_names = []
+    if write_coherence:
+        var_names.append("coh")
+    if write_interferogram:
+        var_names.append("ifg")
+    if write_primary_amplitude:
+        var_names.append("amp_prm")
+    if write_secondary_amplitude:
+        var_names.append("amp_sec")
+
+    patterns = [f"{p}_iw{iw}" for p in pols for iw in [1, 2, 3]]
+    pair_dirs = []
+    for id1, id2 in _stack_pairs(ids, pairs, max_temporal_baseline):
+        log.info(f"---- Pair {id1} / {id2}")
+        pair_dir = f"{Path(stack_dir).parent}/S1_InSAR_{id1}__{id2}"
+        if not os.path.isdir(f"{pair_dir}/sar"):
+            os.makedirs(f"{pair_dir}/sar")
+        slcs = []
+        if stacks is not None:
+            for name, arr in stacks.items():
+                if {id1, id2} <= set(arr.date.values):
+                    slcs.append((name, arr.sel(date=id1).data, arr.sel(date=id2).data))
+        else:
+            for pattern in patterns:
+                prm_file = f"{stack_dir}/slc_{id1}_{pattern}.tif"
+                sec_file = f"{stack_dir}/slc_{id2}_{pattern}.tif"
+                if os.path.isfile(prm_file) and os.path.isfile(sec_file):
+                    slcs.append((pattern, prm_file, sec_file))
+        _insar_products_iw(
+            slcs,
+            f"{pair_dir}/sar",
+            write_coherence=write_coherence,
+            write_interferogram=write_interferogram,
+            write_primary_amplitude=write_primary_amplitude,
+            write_secondary_amplitude=write_secondary_amplitude,
+            boxcar_coherence=boxcar_coherence,
+            filter_ifg=filter_ifg,
+            multilook=multilook,
+        )
         _child_process(
-            _stitch_bursts,
-            (
-                tmp_sec,
-                f"{output_dir}/secondary.tif",
-                prm.lines_per_burst,
-                max_burst_ - min_burst + 1,
-                overlap,
+            geocode_and_merge_iw,
+            dict(
+                input_dir=pair_dir,
+                var_names=var_names,
+                shp=shp,
+                pol=pols,
+                subswaths=["IW1", "IW2", "IW3"],
+                warp_kernel=warp_kernel,
+                clip_to_shape=clip_to_shape,
+                lut_dir=stack_dir,
             ),
         )
+        pair_dirs.append(pair_dir)
+    return pair_dirs
 
-        _child_process(
-            _stitch_bursts,
-            (
-                tmp_prm,
-                f"{output_dir}/primary.tif",
-                prm.lines_per_burst,
-                max_burst_ - min_burst + 1,
-                overlap,
+
+def stack_to_zarr(
+    stack_dir: str,
+    chunks: List[int] = _ZARR_CHUNKS,
+    clevel: int = _ZARR_CLEVEL,
+    remove_tif: bool = True,
+    n_workers: int = 1,
+) -> str:
+    """Move the SLCs of a coregistered stack to a chunked and compressed Zarr store.
+
+    Args:
+        stack_dir (str): directory containing the coregistered stack (output of `prepare_insar_stack`).
+        chunks (List[int], optional): Chunk shape in dates, azimuth lines and range samples. Defaults to [1, 512, 512].
+        clevel (int, optional): Compression level of the Zstandard codec. Defaults to 5.
+        remove_tif (bool, optional): Remove the GeoTiff files of the SLCs once they are copied. Defaults to True.
+        n_workers (int, optional): Number of processes writing arrays concurrently. Defaults to 1.
+
+    Returns:
+        str: path of the Zarr store
+
+    Note:
+        The store `{stack_dir}/slc.zarr` holds one complex array per polarization and subswath, e.g. `vv_iw1`, with dimensions (date, azimuth, range) and the date identifiers in its `dates` attribute. Chunks are compressed by Blosc with the Zstandard codec and bit shuffling. Invalid pixels are NaN. Arrays can be read lazily with `open_stack` and are used by `process_stack_pairs`. The lookup tables are kept as GeoTiff files.
+        This requires the zarr package (version 3 or later).
+    """
+    files = glob(f"{stack_dir}/slc_*_iw[123].tif")
+    if not files:
+        raise RuntimeError(f"No SLC files found in {stack_dir}")
+    ids = {}
+    for f in files:
+        _, id_, pol, iw = Path(f).stem.split("_")
+        ids.setdefault(f"{pol}_{iw}", []).append(id_)
+
+    store = _create_zarr_store(stack_dir)
+    jobs = [
+        (
+            _slc_to_zarr,
+            dict(
+                stack_dir=stack_dir,
+                name=name,
+                ids=sorted(ids[name]),
+                chunks=chunks,
+                clevel=clevel,
+                remove_tif=remove_tif,
             ),
+            None,
         )
+        for name in sorted(ids)
+    ]
+    _run_jobs(jobs, n_workers)
+    return store
 
-    log.info("Cleaning temporary files")
-    if max_burst_ > min_burst:
-        if os.path.isfile(tmp_prm):
-            os.remove(tmp_prm)
-        if os.path.isfile(tmp_sec):
-            os.remove(tmp_sec)
+
+def open_stack(stack_dir: str, pol: str = "vv", iw: int = 1) -> xr.DataArray:
+    """Open lazily the coregistered SLCs of a subswath from the Zarr store of a stack.
+
+    Args:
+        stack_dir (str): directory containing the coregistered stack with its Zarr store (see `stack_to_zarr`).
+        pol (str, optional): Polarization. Defaults to "vv".
+        iw (int, optional): Subswath index. Defaults to 1.
+
+    Returns:
+        xarray.DataArray: dask array with dimensions (date, azimuth, range) and the date identifiers as coordinates.
+
+    Note:
+        Dates can be passed to `insar_products` or `coherence` without intermediate files, e.g. `insar_products(slcs.sel(date=id1).data, slcs.sel(date=id2).data, coh_file="coh.tif")`.
+    """
+    zarr = _import_zarr()
+    group = zarr.open_group(f"{stack_dir}/{_ZARR_STORE}", mode="r")
+    name = f"{pol.lower()}_iw{iw}"
+    if name not in group:
+        raise RuntimeError(f"No SLCs for {name.upper()} in {stack_dir}")
+    arr = group[name]
+    return xr.DataArray(
+        da.from_zarr(arr),
+        dims=("date", "azimuth", "range"),
+        coords={"date": list(arr.attrs["dates"])},
+        name=name,
+    )
+
+
+def _stack_pairs(ids, pairs="sequential", max_temporal_baseline=48):
+    # pairs of date identifiers, the earliest date first
+    ids = sorted(ids)
+    dates = [datetime.strptime(it, "%Y-%m-%d-%H%M%S") for it in ids]
+    n = len(ids)
+    if isinstance(pairs, list):
+        for pair in pairs:
+            if len(pair) != 2 or any(it not in ids for it in pair):
+                raise ValueError(f"Pair {pair} is not made of dates of the stack.")
+        return [tuple(sorted(pair)) for pair in pairs]
+    if pairs == "sequential":
+        return [(ids[i], ids[i + 1]) for i in range(n - 1)]
+    if pairs == "all":
+        return [(ids[i], ids[j]) for i in range(n) for j in range(i + 1, n)]
+    if pairs == "sbas":
+        return [
+            (ids[i], ids[j])
+            for i in range(n)
+            for j in range(i + 1, n)
+            if (dates[j] - dates[i]).days <= max_temporal_baseline
+        ]
+    raise ValueError("pairs must be 'sequential', 'sbas', 'all' or a list of pairs.")
+
+
+def _insar_products_iw(
+    slcs,
+    out_dir,
+    write_coherence,
+    write_interferogram,
+    write_primary_amplitude,
+    write_secondary_amplitude,
+    boxcar_coherence,
+    filter_ifg,
+    multilook,
+):
+    # interferometric outputs of each subswath and polarization from (pattern, primary, secondary) SLCs
+    for pattern, prm_slc, sec_slc in slcs:
+        log.info(
+            f"---- Interferometric outputs for {" ".join(pattern.split('/')[-1].split('_')).upper()}"
+        )
+        # single pass over both SLCs for all the outputs
+        insar_products(
+            prm_file=prm_slc,
+            sec_file=sec_slc,
+            coh_file=f"{out_dir}/coh_{pattern}.tif" if write_coherence else None,
+            ifg_file=f"{out_dir}/ifg_{pattern}.tif" if write_interferogram else None,
+            amp_prm_file=(
+                f"{out_dir}/amp_prm_{pattern}.tif" if write_primary_amplitude else None
+            ),
+            amp_sec_file=(
+                f"{out_dir}/amp_sec_{pattern}.tif"
+                if write_secondary_amplitude
+                else None
+            ),
+            box_size=boxcar_coherence,
+            multilook=multilook,
+            magnitude=True,
+            # the interferogram is filtered only along with coherence
+            filter_ifg=filter_ifg and write_coherence,
+        )
 
 
 def process_slc(
@@ -558,11 +1210,17 @@ def process_slc(
     dem_upsampling: float = 1.8,
     dem_force_download: bool = False,
     dem_buffer_arc_sec: float = 40,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
     multilook: List[int] = [1, 4],
     warp_kernel: str = "bicubic",
     cal_type: str = "beta",
     clip_to_shape: bool = True,
     skip_preprocessing: bool = False,
+    n_workers: int = 1,
+    mem_budget: float = None,
 ) -> str:
     """Geocode the amplitude of a Sentinel-1 SLC product in the DEM geometry and writes the results as a COG (Cloud Optimized GeoTiFF) file.
     AOI crop is optional.
@@ -579,11 +1237,17 @@ def process_slc(
         dem_upsampling (float, optional): upsampling factor for the DEM, it is recommended to keep the default value. Defaults to 1.8.
         dem_force_download (bool, optional):  To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to False.
         dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. It does not apply to terrain normalization. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
         multilook (List[int], optional): Multilooking to apply prior to geocoding. Defaults to [1, 4].
-        warp_kernel (str, optional): Resampling kernel used in coregistration and geocoding. Possible values are "nearest", "bilinear", "bicubic" and "bicubic6". Defaults to "bicubic".
-        cal_type (str, optional): Type of radiometric calibration. Possible values are "beta", "sigma" nought or "terrain" normalization. Defaults to "beta"
+        warp_kernel (str, optional): Resampling kernel used in coregistration and geocoding. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc". Defaults to "bicubic".
+        cal_type (str, optional): Type of radiometric calibration. Possible values are "beta", "sigma" nought or "terrain" normalization. Terrain normalization geocodes the full DEM of each burst at once, regardless of `geocoding_mem_budget`. Defaults to "beta"
         clip_to_shape (bool, optional): If set to False the geocoded images are not clipped according to the `shp` parameter. They are made of all the bursts intersecting the `shp` geometry. Defaults to True.
         skip_preprocessing (bool, optional): Skip the processing part in case the files are already written. Defaults to False.
+        n_workers (int, optional): Number of processes running subswath jobs concurrently. All the polarizations of a subswath are processed by the same job. Each process uses its share of the CPUs. Defaults to 1 (sequential processing).
+        mem_budget (float, optional): Memory in MB shared by the concurrent jobs. Jobs are started when their estimated peak memory fits in the budget. Only used if n_workers > 1. Defaults to None (no limit).
 
     Returns:
         str: output directory
@@ -608,7 +1272,13 @@ def process_slc(
         dem_upsampling=dem_upsampling,
         dem_force_download=dem_force_download,
         dem_buffer_arc_sec=dem_buffer_arc_sec,
+        geocoding_mem_budget=geocoding_mem_budget,
+        tie_point_step=tie_point_step,
+        tie_point_tol=tie_point_tol,
+        cache_dir=cache_dir,
         skip_preprocessing=skip_preprocessing,
+        n_workers=n_workers,
+        mem_budget=mem_budget,
     )
 
     var_names = ["amp"]
@@ -663,7 +1333,13 @@ def prepare_slc(
     dem_upsampling: float = 1.8,
     dem_force_download: bool = False,
     dem_buffer_arc_sec: float = 40,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
     skip_preprocessing: bool = False,
+    n_workers: int = 1,
+    mem_budget: float = None,
 ) -> str:
     """Pre-process a Sentinel-1 SLC product with the ability to select subswaths polarizations and an area of interest.  Apply radiometric calibration, stitch the selected bursts and compute lookup tables for each subswath of interest, which can be used to project the data in the DEM geometry.
 
@@ -674,13 +1350,19 @@ def prepare_slc(
         shp (shapely.geometry.shape, optional): Shapely geometry describing an area of interest as a polygon. Defaults to None.
         pol (Union[str, List[str]], optional):  Polarimetric channels to process (Either 'VH','VV, 'full' or a list like ['HV', 'VV']).  Defaults to "full".
         subswaths (List[str], optional):  limit the processing to a list of subswaths like `["IW1", "IW2"]`. Defaults to ["IW1", "IW2", "IW3"].
-        cal_type (str, optional): Type of radiometric calibration. Possible values are "beta", "sigma" nought or "terrain" normalization. Defaults to "beta"
+        cal_type (str, optional): Type of radiometric calibration. Possible values are "beta", "sigma" nought or "terrain" normalization. Terrain normalization geocodes the full DEM of each burst at once, regardless of `geocoding_mem_budget`. Defaults to "beta"
         dem_dir (str, optional): Directory to store DEMs. Defaults to "/tmp".
         dem_name (str, optional): Digital Elevation Model to download. Possible values are 'nasadem', 'cop-dem-glo-30', 'cop-dem-glo-90', 'alos-dem'. Defaults to 'nasadem'.
         dem_upsampling (float, optional): upsampling factor for the DEM, it is recommended to keep the default value. Defaults to 1.8.
         dem_force_download (bool, optional):   To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to True.
         dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. It does not apply to terrain normalization. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
         skip_preprocessing (bool, optional): Skip the processing part in case the files are already written. It is recommended to leave this parameter to default value. Defaults to False.
+        n_workers (int, optional): Number of processes running subswath jobs concurrently. All the polarizations of a subswath are processed by the same job. Each process uses its share of the CPUs. Defaults to 1 (sequential processing).
+        mem_budget (float, optional): Memory in MB shared by the concurrent jobs. Jobs are started when their estimated peak memory fits in the budget. Only used if n_workers > 1. Defaults to None (no limit).
 
     Returns:
         str: output directory
@@ -741,26 +1423,53 @@ def prepare_slc(
     if not os.path.isdir(out_dir):
         log.info(f"Creating directory {out_dir}")
         os.makedirs(out_dir)
-    for p in pol_:
-        for subswath in unique_subswaths:
-            log.info(f"---- Processing subswath {subswath} in {p.upper()} polarization")
-
-            # identify bursts to process
-            bursts_prm = gdf_burst_prm[gdf_burst_prm["subswath"] == subswath][
-                "burst"
-            ].values
-            burst_prm_min = bursts_prm.min()
-            burst_prm_max = bursts_prm.max()
-
-            iw = int(subswath[2])
-            if not os.path.isdir(out_dir):
-                os.mkdir(out_dir)
-            if not skip_preprocessing:
-                preprocess_slc_iw(
-                    slc_path,
-                    out_dir,
+    if skip_preprocessing:
+        log.info("Skipping preprocessing.")
+        return out_dir
+
+    # subswaths are processed independently, the geometry of each one
+    # is shared by all the polarizations
+    pol_ = [p.lower() for p in pol_]
+    jobs = []
+    for subswath in unique_subswaths:
+        # identify bursts to process
+        bursts_prm = gdf_burst_prm[gdf_burst_prm["subswath"] == subswath][
+            "burst"
+        ].values
+        burst_prm_min = bursts_prm.min()
+        burst_prm_max = bursts_prm.max()
+        iw = int(subswath[2])
+
+        mem = None
+        force_download = dem_force_download
+        if n_workers > 1:
+            # concurrent jobs must not download the same files
+            mem = _prefetch_iw(
+                [slc_path],
+                pol_,
+                iw,
+                burst_prm_min,
+                burst_prm_max,
+                dem_dir,
+                dem_name,
+                dem_upsampling,
+                dem_buffer_arc_sec,
+                dem_force_download,
+                # terrain normalization geocodes the full DEM of a burst
+                geocoding_mem_budget=(
+                    geocoding_mem_budget if cal_type != "terrain" else None
+                ),
+                cache_dir=cache_dir,
+            )
+            force_download = False
+        jobs.append(
+            (
+                _preprocess_slc_job,
+                dict(
+                    out_dir=out_dir,
+                    pol=pol_,
                     iw=iw,
-                    pol=p.lower(),
+                    slc_path=slc_path,
                     min_burst=burst_prm_min,
                     max_burst=burst_prm_max,
                     cal_type=cal_type,
@@ -768,15 +1477,16 @@ def prepare_slc(
                     dem_name=dem_name,
                     dem_upsampling=dem_upsampling,
                     dem_buffer_arc_sec=dem_buffer_arc_sec,
-                    dem_force_download=dem_force_download,
-                )
-                os.rename(
-                    f"{out_dir}/slc.tif",
-                    f"{out_dir}/slc_{p.lower()}_iw{iw}.tif",
-                )
-                os.rename(f"{out_dir}/lut.tif", f"{out_dir}/lut_{p.lower()}_iw{iw}.tif")
-            else:
-                log.info("Skipping preprocessing.")
+                    geocoding_mem_budget=geocoding_mem_budget,
+                    tie_point_step=tie_point_step,
+                    tie_point_tol=tie_point_tol,
+                    cache_dir=cache_dir,
+                    dem_force_download=force_download,
+                ),
+                mem,
+            )
+        )
+    _run_jobs(jobs, n_workers, mem_budget)
     return out_dir
 
 
@@ -793,6 +1503,11 @@ def preprocess_slc_iw(
     dem_upsampling: float = 1.8,
     dem_buffer_arc_sec: float = 40,
     dem_force_download: bool = False,
+    geocoding_mem_budget: float = None,
+    tie_point_step: int = None,
+    tie_point_tol: float = 0.05,
+    cache_dir: str = None,
+    queue_depth: int = 1,
 ) -> None:
     """Pre-process a Sentinel-1 SLC subswath, with the ability to select a subset of bursts. Apply radiometric calibration, stitch the selected bursts and compute a lookup table, wich can be used to project the data in the DEM geometry.
 
@@ -800,19 +1515,25 @@ def preprocess_slc_iw(
         slc_path (str): directory or zip file containing the SLC input product.
         output_dir (str): output directory (creating it if does not exist).
         iw (int, optional): subswath index. Defaults to 1.
-        pol (str, optional): polarization ('vv','vh'). Defaults to "vv".
+        pol (Union[str, List[str]], optional): polarization ('vv','vh') or list of polarizations like ['vv', 'vh']. Defaults to "vv".
         min_burst (int, optional): first burst to process. Defaults to 1.
         max_burst (int, optional): fast burst to process. If not set, last burst of the subswath. Defaults to None.
-        cal_type (str, optional): Type of radiometric calibration. Possible values are "beta", "sigma" nought or "terrain" normalization. Defaults to "beta"
-        warp_kernel (str, optional): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic" and "bicubic6".Defaults to "bilinear".
+        cal_type (str, optional): Type of radiometric calibration. Possible values are "beta", "sigma" nought or "terrain" normalization. Terrain normalization geocodes the full DEM of each burst at once, regardless of `geocoding_mem_budget`. Defaults to "beta"
+        warp_kernel (str, optional): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc".Defaults to "bilinear".
         dem_dir (str, optional): directory where the DEM is downloaded. Must be created beforehand. Defaults to "/tmp".
         dem_name (str, optional): Digital Elevation Model to download. Possible values are 'nasadem', 'cop-dem-glo-30', 'cop-dem-glo-90', 'alos-dem'.
         dem_upsampling (float, optional): Upsample the DEM, it is recommended to keep the default value. Defaults to 2.
         dem_buffer_arc_sec (float, optional): Increase if the image area is not completely inside the DEM. Defaults to 40.
         dem_force_download (bool, optional): To reduce execution time, DEM files are stored on disk. Set to True to redownload these files if necessary. Defaults to false.
+        geocoding_mem_budget (float, optional): Approximate memory in MB used to geocode the DEM of a burst. If set, the DEM is geocoded by blocks of rows that fit in this budget, which bounds the memory of large bursts and upsampled DEMs. It does not apply to terrain normalization. Defaults to None (the DEM of a burst is geocoded at once).
+        tie_point_step (int, optional): If set, the Range-Doppler equations of each burst are only solved on a grid of tie points spaced by this number of DEM pixels and the lookup tables are interpolated in between, with tiles refined where the interpolation error exceeds `tie_point_tol`. Speeds up geocoding of large areas. Defaults to None (all DEM pixels are solved).
+        tie_point_tol (float, optional): Maximum interpolation error in azimuth and range pixels of the tie-point lookup tables. Only used when `tie_point_step` is set. Defaults to 0.05.
+        cache_dir (str, optional): Directory where the parsed metadata of the subswaths is cached, so that the products are parsed once for the concurrent jobs and for later runs (see `S1IWSwath`). Use a directory that other users cannot write to. Defaults to None (the metadata is parsed by each job).
+        queue_depth (int, optional): Number of bursts read ahead and waiting to be written while a burst is processed. Each one holds the burst rasters in memory. Defaults to 1.
 
     Note:
         DEM-assisted coregistration is performed to align the secondary with the Primary. A lookup table file is written to allow the geocoding images from the radar (single-look) grid to the geographic coordinates of the DEM. Bursts are stitched together to form continuous images. All output files are in the GeoTiff format that can be handled by most GIS softwares and geospatial raster tools such as GDAL and rasterio. Because they are in the SAR geometry, SLC rasters are not georeferenced.
+        If `pol` is a list, the lookup table (and terrain normalization) is computed once and applied to every polarization. The SLC files are then named `slc_{pol}.tif` and the lookup table `lut.tif` is shared.
     """
 
     if not os.path.isdir(output_dir):
@@ -821,17 +1542,19 @@ def preprocess_slc_iw(
     if iw not in [1, 2, 3]:
         raise ValueError("iw must be 1, 2 or 3")
 
-    if pol not in ["vv", "vh"]:
-        raise ValueError("pol must be 'vv' or 'vh'")
+    pol_ = [pol] if isinstance(pol, str) else list(pol)
+    if not pol_ or any(p not in ["vv", "vh"] for p in pol_):
+        raise ValueError("pol must be 'vv', 'vh' or a list of them")
 
     if cal_type not in ["beta", "sigma", "terrain"]:
         raise ValueError(
             "Invalid calibration factor. Possible values are 'beta', 'sigma' and 'terrain."
         )
 
-    slc = S1IWSwath(slc_path, iw=iw, pol=pol)
-
-    prm_burst_info = slc.meta["product"]["swathTiming"]["burstList"]["burst"]
+    # geometry and timing do not depend on the polarization
+    # the swath of the first polarization is used to compute them
+    slcs = [S1IWSwath(slc_path, iw=iw, pol=p, cache_dir=cache_dir) for p in pol_]
+    slc = slcs[0]
 
     overlap = np.round(slc.compute_burst_overlap(2)).astype(int)
 
@@ -840,12 +1563,15 @@ def preprocess_slc_iw(
     else:
         max_burst_ = max_burst
 
+    # a single polarization given as a string keeps the file names without suffix
+    suffixes = [""] if isinstance(pol, str) else [f"_{p}" for p in pol_]
+    slc_files = [f"{output_dir}/slc{s}.tif" for s in suffixes]
     if max_burst_ > min_burst:
-        tmp_slc = f"{output_dir}/tmp_slc.tif"
+        tmp_slcs = [f"{output_dir}/tmp_slc{s}.tif" for s in suffixes]
     elif max_burst_ < min_burst:
         raise ValueError("max_burst must be >= min_burst")
     else:
-        tmp_slc = f"{output_dir}/slc.tif"
+        tmp_slcs = slc_files
 
     if (
         max_burst_ > slc.burst_count
@@ -864,8 +1590,8 @@ def preprocess_slc_iw(
     _child_process(
         _process_bursts_slc,
         (
-            slc,
-            tmp_slc,
+            slcs,
+            tmp_slcs,
             output_dir,
             dem_dir,
             naz,
@@ -878,25 +1604,31 @@ def preprocess_slc_iw(
             dem_force_download,
             overlap,
             cal_type,
+            queue_depth,
+            geocoding_mem_budget,
+            tie_point_step,
+            tie_point_tol,
         ),
     )
 
     if max_burst_ > min_burst:
-        _child_process(
-            _stitch_bursts,
-            (
-                tmp_slc,
-                f"{output_dir}/slc.tif",
-                slc.lines_per_burst,
-                max_burst_ - min_burst + 1,
-                overlap,
-            ),
-        )
+        for tmp_slc, slc_file in zip(tmp_slcs, slc_files):
+            _child_process(
+                _stitch_bursts,
+                (
+                    tmp_slc,
+                    slc_file,
+                    slc.lines_per_burst,
+                    max_burst_ - min_burst + 1,
+                    overlap,
+                ),
+            )
 
     log.info("Cleaning temporary files")
     if max_burst_ > min_burst:
-        if os.path.isfile(tmp_slc):
-            os.remove(tmp_slc)
+        for tmp_slc in tmp_slcs:
+            if os.path.isfile(tmp_slc):
+                os.remove(tmp_slc)
 
 
 def geocode_and_merge_iw(
@@ -907,6 +1639,7 @@ def geocode_and_merge_iw(
     subswaths: List[str] = ["IW1", "IW2", "IW3"],
     warp_kernel: str = "bicubic",
     clip_to_shape: bool = True,
+    lut_dir: str = None,
 ) -> None:
     """Geocode and merge subswaths from the SAR geometry to the geographic coordinate system.
 
@@ -919,10 +1652,13 @@ def geocode_and_merge_iw(
         multilook (List[int], optional): Multilooking in azimuth and range. Defaults to [1, 4].
         warp_kernel (str, optional): Warping kernel. Defaults to "bicubic".
         clip_to_shape (bool, optional): If set to True, whole bursts intersecting shp will be included. Defaults to True.
+        lut_dir (str, optional): Directory containing the lookup tables, e.g. the directory of a coregistered stack. Defaults to None (the `sar` subdirectory of `input_dir`).
     Note:
         variables starting with the substring 'ifg' are interpreted as
         interferograms. Their phase will extracted after geocoding. The
         output file will start with 'phi'.
+        Subswaths are geocoded directly into the merged grid. Where they
+        overlap, the first subswath of `subswaths` with valid data is kept.
     """
     if isinstance(pol, str):
         if pol == "full":
@@ -934,195 +1670,707 @@ def geocode_and_merge_iw(
     else:
         raise RuntimeError("polarizations must be of type str or list")
     iw_idx = [iw[2] for iw in subswaths]
+    if lut_dir is None:
+        lut_dir = f"{input_dir}/sar"
 
     for var in var_names:
-        no_file_found = True
-        for p in pol_:
-            patterns = [f"{input_dir}/sar/{var}_{p}_iw{iw}.tif" for iw in iw_idx]
-
-            matched_files = [pattern for pattern in patterns if os.path.isfile(pattern)]
-
-            tmp_files = []
-            if matched_files:
-                no_file_found = False
-            for var_file in matched_files:
-                log.info(f"Geocode file {Path(var_file).name}.")
-                base_name = Path(var_file).stem
-                parts = base_name.split("_")
-                postfix = "_".join(parts[-2:])
-                lut_file = f"{input_dir}/sar/lut_{postfix}.tif"
-                out_file = f"{input_dir}/sar/{var}_{postfix}_geo.tif"
-
-                if not os.path.exists(lut_file):
+        patterns = [
+            f"{input_dir}/sar/{var}_{p}_iw{iw}.tif" for p in pol_ for iw in iw_idx
+        ]
+        if not any(os.path.isfile(pattern) for pattern in patterns):
+            raise FileNotFoundError(f"No file was found for variable {var}")
+
+    for p in pol_:
+        sar_files, out_files, write_phase = [], [], []
+        for var in var_names:
+            var_files = [f"{input_dir}/sar/{var}_{p}_iw{iw}.tif" for iw in iw_idx]
+            var_files = [f if os.path.isfile(f) else None for f in var_files]
+            if not any(var_files):
+                continue
+            for iw, var_file in zip(iw_idx, var_files):
+                lut_file = _lut_file(lut_dir, p, iw)
+                if var_file is not None and not os.path.exists(lut_file):
                     raise FileNotFoundError(
                         f"Corresponding LUT file {lut_file} not found for {var_file}"
                     )
+            is_complex = [
+                np.iscomplexobj(riox.open_rasterio(f)[0])
+                for f in var_files
+                if f is not None
+            ]
+
+            # handling phase as a special case
+            if var == "phi" and not all(is_complex):
+                warnings.warn(
+                    "Geocode real-valued phase? If so, the result might not be optimal if the phase is wrapped."
+                )
 
-                # handling phase as a special case
-                if var == "phi":
-                    darr = riox.open_rasterio(var_file)
-                    if not np.iscomplexobj(darr[0]):
-                        warnings.warn(
-                            "Geocode real-valued phase? If so, the result might not be optimal if the phase is wrapped."
-                        )
-                # if var == "ifg":
-                if var.startswith("ifg"):
-                    out_file = (
-                        f"{input_dir}/sar/{var.replace("ifg", "phi")}_{postfix}_geo.tif"
+            # if var != "ifg":
+            if not var.startswith("ifg"):
+                if any(is_complex):
+                    raise NotImplementedError(
+                        f"Trying to merge complex arrays ({var}). This is forbidden to prevent potential type casting errors."
                     )
-                    sar2geo(
-                        var_file,
-                        lut_file,
-                        out_file,
-                        warp_kernel,
-                        write_phase=True,
-                        magnitude_only=False,
+                out_file = f"{input_dir}/{var}_{p}.tif"
+            else:
+                out_file = f"{input_dir}/{var.replace("ifg", "phi")}_{p}.tif"
+            log.info(f"Geocode and merge file {Path(out_file).name}")
+            sar_files.append(var_files)
+            out_files.append(out_file)
+            write_phase.append(var.startswith("ifg"))
+
+        if not out_files:
+            continue
+        # only the subswaths with data are mosaicked
+        used = [i for i in range(len(iw_idx)) if any(f[i] for f in sar_files)]
+        # all variables are geocoded in one pass over the LUTs, straight into the final grid
+        _geocode_mosaic(
+            [[files[i] for i in used] for files in sar_files],
+            [_lut_file(lut_dir, p, iw_idx[i]) for i in used],
+            out_files,
+            warp_kernel,
+            write_phase,
+            shp=shp if shp and clip_to_shape else None,
+        )
+
+
+def sar2geo(
+    sar_file: Union[str, List[str]],
+    lut_file: str,
+    out_file: Union[str, List[str]],
+    kernel: str = "bicubic",
+    write_phase: Union[bool, List[bool]] = False,
+    magnitude_only: Union[bool, List[bool]] = False,
+    block_size: int = 512,
+    io_threads: int = 4,
+) -> None:
+    """Reproject slc file to a geographic grid using a lookup table with optional multilooking.
+
+    Args:
+        sar_file (Union[str, List[str]]): file in the SAR geometry, or list of files sharing the lookup table
+        lut_file (str): file containing a lookup table (output of the `preprocess_insar_iw` function)
+        out_file (Union[str, List[str]]): output file, or list of output files (one for each SAR file)
+        kernel (str): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic", "bicubic6" and "sinc".Defaults to "bilinear".
+        write_phase (Union[bool, List[bool]]): writes the array's phase. Can be given for each file. Defaults to False.
+        magnitude_only (Union[bool, List[bool]]): writes the array's magnitude instead of its complex values. Has no effect it `write_phase` is True. Can be given for each file. Defaults to False.
+        block_size (int): size of the output blocks geocoded at once. Defaults to 512.
+        io_threads (int): number of threads reading and writing blocks while other blocks are resampled. Defaults to 4.
+    Note:
+        Multilooking is recommended as it reduces the spatial resolution and mitigates speckle effects.
+        The output grid is processed block by block and only the part of the SAR raster needed by each block is read, so that memory usage does not depend on the size of the scene.
+        When several files are given, the lookup table is read once for all of them, and the kernel weights of each block are computed once for all files with the same SAR grid.
+    """
+    sar_files = [sar_file] if isinstance(sar_file, str) else list(sar_file)
+    out_files = [out_file] if isinstance(out_file, str) else list(out_file)
+    if len(out_files) != len(sar_files):
+        raise ValueError("There must be one output file for each SAR file.")
+    if isinstance(write_phase, bool):
+        write_phase = [write_phase] * len(sar_files)
+    if isinstance(magnitude_only, bool):
+        magnitude_only = [magnitude_only] * len(sar_files)
+    if len(write_phase) != len(sar_files) or len(magnitude_only) != len(sar_files):
+        raise ValueError(
+            "write_phase and magnitude_only must be booleans or lists with one value for each SAR file."
+        )
+
+    log.info("Project image with the lookup table.")
+    _geocode_mosaic(
+        [[f] for f in sar_files],
+        [lut_file],
+        out_files,
+        kernel,
+        write_phase,
+        magnitude_only,
+        block_size=block_size,
+        io_threads=io_threads,
+    )
+
+
+def _geocode_mosaic(
+    sar_files,
+    lut_files,
+    out_files,
+    kernel="bicubic",
+    write_phase=None,
+    magnitude_only=None,
+    shp=None,
+    block_size=512,
+    io_threads=4,
+):
+    """Geocode rasters of several lookup tables (e.g. subswaths) into mosaics on the union of the lookup table grids.
+
+    Each block of the output grid is geocoded from all lookup tables overlapping it and written once. Where lookup tables overlap, the first one with valid data wins (same rule as `rioxarray.merge.merge_arrays`).
+
+    Args:
+        sar_files (list): for each output, list of the files in the SAR geometry of each lookup table (None if there is no file for a lookup table)
+        lut_files (list): lookup table files, in order of priority
+        out_files (list): output files
+        kernel (str): resampling kernel. Defaults to "bicubic".
+        write_phase (list): for each output, writes the array's phase. Defaults to None (False for all outputs).
+        magnitude_only (list): for each output, writes the array's magnitude. Defaults to None (False for all outputs).
+        shp (shapely.geometry.shape, optional): if set, the output grid is cropped to the pixels touched by the shape and pixels outside the shape are set to nodata. Defaults to None.
+        block_size (int): size of the output blocks geocoded at once. Defaults to 512.
+        io_threads (int): number of threads reading and writing blocks. Defaults to 4.
+    """
+    n_out = len(out_files)
+    write_phase = write_phase or [False] * n_out
+    magnitude_only = magnitude_only or [False] * n_out
+
+    # union of the lookup table grids
+    luts = []
+    for lut_file in lut_files:
+        with rio.open(lut_file) as ds_lut:
+            luts.append((ds_lut.profile.copy(), ds_lut.bounds))
+    prof_lut, _ = luts[0]
+    res_x, res_y = prof_lut["transform"].a, prof_lut["transform"].e
+    for prof, _ in luts[1:]:
+        if prof["crs"] != prof_lut["crs"] or (
+            (prof["transform"].a, prof["transform"].e) != (res_x, res_y)
+        ):
+            raise ValueError(
+                "Lookup tables must have the same coordinate system and resolution."
+            )
+    x0 = min(b.left for _, b in luts)
+    y0 = max(b.top for _, b in luts)
+    width = int(round((max(b.right for _, b in luts) - x0) / res_x))
+    height = int(round((min(b.bottom for _, b in luts) - y0) / res_y))
+    # position of the lookup tables in the output grid (rounded as in rasterio.merge)
+    offsets = [
+        (
+            int(np.floor((b.top - y0) / res_y + 0.1)),
+            int(np.floor((b.left - x0) / res_x + 0.1)),
+        )
+        for _, b in luts
+    ]
+
+    inside = None
+    if shp is not None:
+        inside = geometry_mask(
+            [shp],
+            out_shape=(height, width),
+            transform=Affine(res_x, 0, x0, 0, res_y, y0),
+            all_touched=True,
+            invert=True,
+        )
+        rows = np.flatnonzero(inside.any(1))
+        cols = np.flatnonzero(inside.any(0))
+        if not rows.size:
+            raise ValueError("The shape does not intersect the lookup tables.")
+        inside = inside[rows[0] : rows[-1] + 1, cols[0] : cols[-1] + 1]
+        offsets = [(r - rows[0], c - cols[0]) for r, c in offsets]
+        x0 += cols[0] * res_x
+        y0 += rows[0] * res_y
+        height, width = inside.shape
+
+    # incompatible with tiled output, not needed (?) elsewhere
+    prof_lut.pop("blockxsize", None)
+    prof_lut.pop("blockysize", None)
+    prof_lut.pop("tiled", None)
+    prof_lut.pop("interleave", None)
+    prof_lut.update(
+        {
+            "width": width,
+            "height": height,
+            "transform": Affine(res_x, 0, x0, 0, res_y, y0),
+        }
+    )
+
+    outputs = []
+    for k in range(n_out):
+        sources = []
+        for sar in sar_files[k]:
+            if sar is None:
+                sources.append(None)
+                continue
+            with rio.open(sar) as ds_sar:
+                prof_src = ds_sar.profile.copy()
+                trans_src = ds_sar.transform
+                # check if input was rescaled (multilook, etc.)
+                sources.append((ds_sar.shape, trans_src.e, trans_src.a))
+
+            if not trans_src.is_rectilinear:
+                raise ValueError("The input dataset is not in the SAR geometry")
+            if prof_src["count"] != 1:
+                raise ValueError("Only single band rasters are supported.")
+
+            is_complex = np.issubdtype(np.dtype(prof_src["dtype"]), np.complexfloating)
+            if write_phase[k] and not is_complex:
+                warnings.warn(
+                    "write_phase: Trying to write phase of a real-valued array. This option will have no effect."
+                )
+            if magnitude_only[k] and not is_complex:
+                warnings.warn(
+                    "magnitude_only: Writing magnitude (absolute value) of a real-valued array."
+                )
+            if len(outputs) == k:
+                # the first file of an output sets its type (as in merge_arrays)
+                phase = write_phase[k] and is_complex
+                dtype, nodata = _geo_output_type(
+                    prof_src["dtype"], prof_src["nodata"], phase, magnitude_only[k]
+                )
+                # COG cannot be written by blocks: write a tiled GeoTIFF first
+                # Using COG only if real-valued
+                to_cog = phase or magnitude_only[k] or not is_complex
+                prof_dst = prof_lut.copy()
+                prof_dst.update(
+                    {
+                        "driver": "GTiff",
+                        "count": 1,
+                        "dtype": dtype,
+                        "nodata": nodata,
+                        "tiled": True,
+                        "blockxsize": 512,
+                        "blockysize": 512,
+                        "compress": "zstd",
+                        "num_threads": "all_cpus",
+                    }
+                )
+                out = out_files[k]
+                outputs.append(
+                    {
+                        "out_file": out,
+                        "tmp_file": (
+                            f"{os.path.splitext(out)[0]}_tmp.tif" if to_cog else out
+                        ),
+                        "to_cog": to_cog,
+                        "profile": prof_dst,
+                        # complex outputs keep NaN for invalid pixels
+                        "fill": np.nan if np.dtype(dtype).kind == "c" else nodata,
+                        "write_phase": phase,
+                        "magnitude_only": magnitude_only[k],
+                    }
+                )
+        outputs[k]["sources"] = sources
+
+    # for each lookup table, outputs with the same SAR grid share positions, windows and kernel weights
+    grids = []
+    for i in range(len(lut_files)):
+        grids.append({})
+        for k, output in enumerate(outputs):
+            if output["sources"][i] is not None:
+                grids[i].setdefault(output["sources"][i], []).append(k)
+
+    with ExitStack() as stack:
+        ds_luts = [stack.enter_context(rio.open(f)) for f in lut_files]
+        ds_sars = [
+            [
+                stack.enter_context(rio.open(f)) if f is not None else None
+                for f in sar_files[k]
+            ]
+            for k in range(n_out)
+        ]
+        dsts = [
+            stack.enter_context(rio.open(o["tmp_file"], "w", **o["profile"]))
+            for o in outputs
+        ]
+        lut_locks = [threading.Lock() for _ in lut_files]
+        sar_locks = [[threading.Lock() for _ in files] for files in sar_files]
+        dst_locks = [threading.Lock() for _ in outputs]
+
+        def read_block(win):
+            blocks = []
+            for i, (ds_lut, (r0, c0)) in enumerate(zip(ds_luts, offsets)):
+                # part of the block covered by the lookup table
+                rows = slice(
+                    max(win.row_off, r0),
+                    min(win.row_off + win.height, r0 + ds_lut.height),
+                )
+                cols = slice(
+                    max(win.col_off, c0),
+                    min(win.col_off + win.width, c0 + ds_lut.width),
+                )
+                if rows.start >= rows.stop or cols.start >= cols.stop:
+                    continue
+                win_lut = Window(
+                    cols.start - c0,
+                    rows.start - r0,
+                    cols.stop - cols.start,
+                    rows.stop - rows.start,
+                )
+                with lut_locks[i]:
+                    lut = ds_lut.read(window=win_lut)
+                rows = slice(rows.start - win.row_off, rows.stop - win.row_off)
+                cols = slice(cols.start - win.col_off, cols.stop - win.col_off)
+                for (shape_src, sy, sx), idx in grids[i].items():
+                    rr = lut[0] / sy
+                    cc = lut[1] / sx
+                    win_sar = _sar_window(rr, cc, shape_src)
+                    arrs = []
+                    if win_sar is not None:
+                        for k in idx:
+                            with sar_locks[k][i]:
+                                arrs.append(ds_sars[k][i].read(1, window=win_sar))
+                    blocks.append((rows, cols, idx, rr, cc, win_sar, arrs))
+            return win, blocks
+
+        def geocode_block(win, blocks):
+            values = []
+            for output in outputs:
+                values.append(
+                    np.full(
+                        (win.height, win.width),
+                        output["fill"],
+                        dtype=output["profile"]["dtype"],
                     )
+                )
+            for rows, cols, idx, rr, cc, win_sar, arrs in blocks:
+                if win_sar is None:
+                    continue
+                if len(idx) == 1:
+                    arrs_out = [
+                        remap(
+                            arrs[0],
+                            rr - win_sar.row_off,
+                            cc - win_sar.col_off,
+                            kernel,
+                            single_precision=True,
+                        )
+                    ]
                 else:
-                    sar2geo(
-                        var_file,
-                        lut_file,
-                        out_file,
-                        warp_kernel,
-                        write_phase=False,
-                        magnitude_only=False,
+                    # same weights as remap: single precision only for single precision rasters
+                    single = all(
+                        arr.dtype in (np.float32, np.complex64) for arr in arrs
                     )
-                tmp_files.append(out_file)
-            if tmp_files:
-                # if var != "ifg":
-                if not var.startswith("ifg"):
-                    out_file = f"{input_dir}/{var}_{p}.tif"
-                else:
-                    out_file = f"{input_dir}/{var.replace("ifg", "phi")}_{p}.tif"
-                log.info(f"Merge file {Path(out_file).name}")
-                da_to_merge = [riox.open_rasterio(file) for file in tmp_files]
+                    plan = ResamplingPlan(
+                        rr - win_sar.row_off,
+                        cc - win_sar.col_off,
+                        (win_sar.height, win_sar.width),
+                        kernel,
+                        single_precision=single,
+                    )
+                    arrs_out = [plan.apply(arr) for arr in arrs]
+                for k, arr_out in zip(idx, arrs_out):
+                    output = outputs[k]
+                    arr_out = _geo_output_values(
+                        arr_out,
+                        output["write_phase"],
+                        output["magnitude_only"],
+                        output["profile"]["nodata"],
+                    )
+                    # pixels already set by a lookup table with higher priority are kept
+                    region = values[k][rows, cols]
+                    empty = _is_nodata(region, output["fill"])
+                    region[empty] = arr_out[empty]
+            if inside is not None:
+                outside = ~inside[win.toslices()]
+                for output, arr in zip(outputs, values):
+                    arr[outside] = output["fill"]
+            return values
+
+        def write_block(win, values):
+            for k, arr in enumerate(values):
+                with dst_locks[k]:
+                    dsts[k].write(arr, 1, window=win)
+
+        _stream_blocks(
+            _block_windows(height, width, block_size),
+            read_block,
+            geocode_block,
+            write_block,
+            io_threads,
+        )
+
+    for output in outputs:
+        if output["to_cog"]:
+            rio_copy(
+                output["tmp_file"],
+                output["out_file"],
+                driver="COG",
+                compress="zstd",
+                num_threads="all_cpus",
+                resampling="nearest",
+                overview_resampling="nearest",
+            )
+            remove(output["tmp_file"], verb=False)
+
+
+def _is_nodata(arr, nodata):
+    """Mask of the pixels of a geocoded raster without data."""
+    if np.isnan(nodata):
+        return np.isnan(arr)
+    return arr == nodata
+
+
+def _block_windows(height, width, block_size):
+    """Windows of the blocks covering a raster, in row-major order."""
+    return [
+        Window(col, row, min(block_size, width - col), min(block_size, height - row))
+        for row in range(0, height, block_size)
+        for col in range(0, width, block_size)
+    ]
+
+
+def _stream_blocks(windows, read_block, compute_block, write_block, io_threads=4):
+    """Process raster blocks with reads and writes in a thread pool.
+
+    Blocks are read ahead and written in the background while the calling thread computes, so that jitted functions are never called from several threads at once. At most `io_threads` blocks wait to be computed or written.
+
+    Args:
+        windows (list): output windows
+        read_block (callable): reads the inputs of a window, returns a tuple of arguments for `compute_block`
+        compute_block (callable): computes the output of a block from its inputs
+        write_block (callable): writes the output of a block, called with the window and the output
+        io_threads (int): number of threads. Defaults to 4.
+    """
+    with concurrent.futures.ThreadPoolExecutor(io_threads) as pool:
+        reads = deque()
+        writes = deque()
+
+        def compute_next():
+            win, inputs = reads.popleft()
+            values = compute_block(*inputs.result())
+            writes.append(pool.submit(write_block, win, values))
+            if len(writes) > io_threads:
+                writes.popleft().result()
+
+        for win in windows:
+            reads.append((win, pool.submit(read_block, win)))
+            if len(reads) > io_threads:
+                compute_next()
+        while reads:
+            compute_next()
+        while writes:
+            writes.popleft().result()
+
+
+def _stream_stages(items, read_item, compute_item, write_item, queue_depth=1):
+    """Process items with reader, compute and writer stages running concurrently.
+
+    Items are read by a background thread and written by another one, in their order, while the calling thread computes, so that jitted functions are never called from several threads at once.
+
+    Args:
+        items (iterable): items to process, e.g. burst indices
+        read_item (callable): reads the inputs of an item, returns a tuple of arguments for `compute_item`
+        compute_item (callable): computes the outputs of an item from its inputs, returns a tuple of arguments for `write_item`
+        write_item (callable): writes the outputs of an item
+        queue_depth (int): number of items read ahead and of computed items waiting to be written. Defaults to 1.
+    """
+    if queue_depth < 1:
+        raise ValueError("queue_depth must be >= 1")
+    items = iter(items)
+    with (
+        concurrent.futures.ThreadPoolExecutor(1) as reader,
+        concurrent.futures.ThreadPoolExecutor(1) as writer,
+    ):
+        reads = deque(
+            reader.submit(read_item, item) for item in islice(items, queue_depth)
+        )
+        writes = deque()
+        while reads:
+            inputs = reads.popleft().result()
+            for item in islice(items, 1):
+                reads.append(reader.submit(read_item, item))
+            outputs = compute_item(*inputs)
+            writes.append(writer.submit(write_item, *outputs))
+            if len(writes) > queue_depth:
+                writes.popleft().result()
+        while writes:
+            writes.popleft().result()
+
+
+def _open_strips(src, stack):
+    """Opens the first band of a raster file, or a 2D array, for reads by strips of lines.
+
+    Args:
+        src (Union[str, array-like]): raster file, or 2D array such as a date of a Zarr stack (see `open_stack`)
+        stack (contextlib.ExitStack): context closing the file
+
+    Returns:
+        tuple: the profile of the raster and a function reading lines `r0` to `r1` and the first `ncols` columns, with invalid pixels set to NaN. It can be called from several threads.
+    """
+    if isinstance(src, (str, os.PathLike)):
+        ds = stack.enter_context(rio.open(src))
+        lock = threading.Lock()
+
+        def read(r0, r1, ncols):
+            with lock:
+                return ds.read(
+                    1, window=Window(0, r0, ncols, r1 - r0), masked=True
+                ).filled(np.nan)
+
+        return ds.profile.copy(), read
+
+    if src.ndim != 2:
+        raise ValueError("Array inputs must be 2D.")
+    prof = dict(
+        driver="GTiff",
+        count=1,
+        height=src.shape[0],
+        width=src.shape[1],
+        dtype=np.dtype(src.dtype).name,
+        transform=Affine.identity(),
+    )
 
-                if any(np.iscomplexobj(it) for it in da_to_merge):
-                    raise NotImplementedError(
-                        f"Trying to merge complex arrays ({var}). This is forbidden to prevent potential type casting errors."
-                    )
+    def read(r0, r1, ncols):
+        # computes the strip for dask arrays
+        return np.asarray(src[r0:r1, :ncols])
 
-                if shp and clip_to_shape:
-                    merged = merge_arrays(
-                        da_to_merge, parse_coordinates=False
-                    ).rio.clip([shp], all_touched=True)
-                else:
-                    merged = merge_arrays(da_to_merge, parse_coordinates=False)
-                merged.rio.to_raster(
-                    out_file,
-                    driver="COG",
-                    compress="zstd",
-                    num_threads="all_cpus",
-                    resampling="nearest",
-                    overview_resampling="nearest",
-                )
-                # clean tmp files
-                for file in tmp_files:
-                    remove(file)
-        if no_file_found:
-            raise FileNotFoundError(f"No file was found for variable {var}")
+    return prof, read
 
 
-def sar2geo(
-    sar_file: str,
-    lut_file: str,
-    out_file: str,
-    kernel: str = "bicubic",
-    write_phase: bool = False,
-    magnitude_only: bool = False,
-) -> None:
-    """Reproject slc file to a geographic grid using a lookup table with optional multilooking.
+def _sar_window(rr, cc, shape, margin=4):
+    """Window of a SAR raster needed to resample a block of a lookup table.
 
     Args:
-        sar_file (str): file in the SAR geometry
-        lut_file (str): file containing a lookup table (output of the `preprocess_insar_iw` function)
-        out_file (str): output file
-        kernel (str): kernel used to align secondary SLC. Possible values are "nearest", "bilinear", "bicubic" and "bicubic6".Defaults to "bilinear".
-        write_phase (bool): writes the array's phase . Defaults to False.
-        magnitude_only (bool): writes the array's magnitude instead of its complex values. Has no effect it `write_phase` is True. Defaults to False.
-    Note:
-        Multilooking is recommended as it reduces the spatial resolution and mitigates speckle effects.
+        rr (array): lookup table for row positions
+        cc (array): lookup table for column positions
+        shape (tuple): shape of the SAR raster
+        margin (int): number of pixels added around the positions for the kernel support. Defaults to 4 (largest kernel half width).
+
+    Returns:
+        rasterio.windows.Window: window clipped to the raster, None if no position falls in the raster.
     """
-    log.info("Project image with the lookup table.")
+    valid = ~(np.isnan(rr) | np.isnan(cc))
+    if not valid.any():
+        return None
+    r0 = max(int(np.floor(rr[valid].min())) - margin, 0)
+    r1 = min(int(np.ceil(rr[valid].max())) + margin + 1, shape[0])
+    c0 = max(int(np.floor(cc[valid].min())) - margin, 0)
+    c1 = min(int(np.ceil(cc[valid].max())) + margin + 1, shape[1])
+    if r1 <= r0 or c1 <= c0:
+        return None
+    return Window(c0, r0, c1 - c0, r1 - r0)
+
+
+def _geo_output_type(dtype, nodata, write_phase, magnitude_only):
+    """Data type and nodata value of a geocoded raster (see `sar2geo`)."""
+    zero = np.zeros(1, dtype=dtype)
+    if write_phase:
+        return np.angle(zero).dtype.name, -9999
+    elif magnitude_only:
+        return np.abs(zero).dtype.name, 0
+    elif not np.iscomplexobj(zero):
+        return zero.dtype.name, 0
+    else:
+        return zero.dtype.name, nodata
 
-    with rio.open(sar_file) as ds_sar:
-        arr = ds_sar.read(1)
-        prof_src = ds_sar.profile.copy()
-        trans_src = ds_sar.transform
 
-    with rio.open(lut_file) as ds_lut:
-        lut = ds_lut.read()
-        prof_dst = ds_lut.profile.copy()
+def _geo_output_values(arr_out, write_phase, magnitude_only, nodata):
+    """Geocoded values written by `sar2geo`, with nodata for invalid pixels."""
+    if write_phase:
+        arr_out = np.angle(arr_out)
+    elif magnitude_only:
+        arr_out = np.abs(arr_out)
+    elif np.iscomplexobj(arr_out):
+        return arr_out
+    arr_out[np.isnan(arr_out)] = nodata
+    return arr_out
 
-    if not trans_src.is_rectilinear:
-        raise ValueError("The input dataset is not in the SAR geometry")
-    if prof_src["count"] != 1:
-        raise ValueError("Only single band rasters are supported.")
 
-    if write_phase and not np.iscomplexobj(arr):
-        warnings.warn(
-            "write_phase: Trying to write phase of a real-valued array. This option will have no effect."
-        )
-    if magnitude_only and not np.iscomplexobj(arr):
-        warnings.warn(
-            "magnitude_only: Writing magnitude (absolute value) of a real-valued array."
-        )
+def apply_by_strips(
+    in_files: Union[str, List[str]],
+    out_file: str,
+    fun: Callable,
+    multilook: List = [1, 1],
+    margin: int = 0,
+    dtype: str = None,
+    block_size: int = 512,
+    io_threads: int = 4,
+) -> None:
+    """Apply a function to rasters by strips of lines and write the result.
 
-    # check if input was rescaled (multilook, etc.)
-    sx = trans_src.a
-    sy = trans_src.e
-    arr_out = remap(arr, lut[0] / sy, lut[1] / sx, kernel)
+    Args:
+        in_files (Union[str, List[str]]): Input GeoTiff file or list of files with the same shape.
+        out_file (str): Output file.
+        fun (callable): Function of the strips of the input files, in the order of `in_files`. It receives 2D arrays of `mlt_az` times the number of output lines and must return the strip of output lines, with `width // mlt_rg` columns (for instance by calling `presum`).
+        multilook (List, optional): Number of looks in azimuth and range of the output. Defaults to [1, 1].
+        margin (int, optional): Number of output lines added on each side of the strips for functions that use neighbouring lines (e.g. filters). These lines are computed but not written. Defaults to 0.
+        dtype (str, optional): Data type of the output. Defaults to None (data type of the first input).
+        block_size (int, optional): Number of output lines computed at once. Defaults to 512.
+        io_threads (int, optional): Number of threads reading and writing strips while other strips are computed. Defaults to 4.
+    Note:
+        Strips of input lines are multiples of the azimuth looks, so that the output is the same as for the whole rasters. Bands are processed independently: band i of the output is computed from band i of the inputs.
+        Operations on the strips can be chained in `fun` without writing intermediate files, e.g. `lambda prm, sec: presum(np.abs(prm) / np.abs(sec), 2, 8)`.
+    """
+    if not isinstance(in_files, list):
+        in_files = [in_files]
+    if not isinstance(multilook, list):
+        raise ValueError("Multilook must be a list like [mlt_az, mlt_rg]")
+    else:
+        mlt_az, mlt_rg = multilook
 
-    prof_dst.update({k: prof_src[k] for k in ["count", "dtype", "nodata"]})
+    warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
+    with rio.open(in_files[0]) as ds_src:
+        prof = ds_src.profile.copy()
+        trans = ds_src.transform
+    if mlt_az > prof["height"] or mlt_rg > prof["width"]:
+        raise ValueError(
+            "Cannot multilook with these parameters; multilook is too large for the image dimensions."
+        )
+    height = prof["height"] // mlt_az
+    width = prof["width"] // mlt_rg
 
-    cog_dict = dict(
-        driver="COG",
-        compress="zstd",
-        num_threads="all_cpus",
-        resampling="nearest",
-        overview_resampling="nearest",
+    prof.pop("blockxsize", None)
+    prof.pop("blockysize", None)
+    prof.update(
+        {
+            "driver": "GTiff",
+            "width": width,
+            "height": height,
+            "transform": trans * Affine.scale(mlt_rg, mlt_az),
+            "dtype": dtype or prof["dtype"],
+            "tiled": True,
+            "blockxsize": 512,
+            "blockysize": 512,
+        }
     )
-    # incompatible with COG, not needed (?) elsewhere
-    prof_dst.pop("blockxsize", None)
-    prof_dst.pop("blockysize", None)
-    prof_dst.pop("tiled", None)
-    prof_dst.pop("interleave", None)
-    if write_phase and np.iscomplexobj(arr_out):
-        phi = np.angle(arr_out)
-        nodata = -9999
-        phi[np.isnan(phi)] = nodata
-        prof_dst.update({"dtype": phi.dtype.name, "nodata": nodata, **cog_dict})
-        with rio.open(out_file, "w", **prof_dst) as dst:
-            dst.write(phi, 1)
-    else:
-        if magnitude_only:
-            mag = np.abs(arr_out)
-            nodata = 0
-            mag[np.isnan(mag)] = nodata
-            prof_dst.update({"dtype": mag.dtype.name, "nodata": nodata, **cog_dict})
-            with rio.open(out_file, "w", **prof_dst) as dst:
-                dst.write(mag, 1)
-        else:
-            # Using COG only if real-valued
-            if not np.iscomplexobj(arr_out):
-                nodata = 0
-                prof_dst.update({"driver": "COG", "nodata": nodata, **cog_dict})
-                arr_out[np.isnan(arr_out)] = nodata
-            else:
-                prof_dst.update({"compress": "zstd", "num_threads": "all_cpus"})
-            with rio.open(out_file, "w", **prof_dst) as dst:
-                dst.write(arr_out, 1)
+
+    with ExitStack() as stack:
+        srcs = [stack.enter_context(rio.open(file)) for file in in_files]
+        for ds in srcs[1:]:
+            if ds.shape != srcs[0].shape:
+                raise ValueError("Input rasters must have the same shape.")
+        dst = stack.enter_context(rio.open(out_file, "w", **prof))
+        src_locks = [threading.Lock() for _ in srcs]
+        dst_lock = threading.Lock()
+
+        def read_block(win):
+            r0 = max(win.row_off - margin, 0)
+            r1 = min(win.row_off + win.height + margin, height)
+            win_src = Window(0, r0 * mlt_az, srcs[0].width, (r1 - r0) * mlt_az)
+            arrs = []
+            for ds, lock in zip(srcs, src_locks):
+                with lock:
+                    arrs.append(ds.read(window=win_src))
+            return win, r0, arrs
+
+        def compute_block(win, r0, arrs):
+            rows = slice(win.row_off - r0, win.row_off - r0 + win.height)
+            return np.stack([fun(*bands)[rows] for bands in zip(*arrs)])
+
+        def write_block(win, values):
+            with dst_lock:
+                dst.write(values, window=win)
+
+        _stream_blocks(
+            [
+                Window(0, row, width, min(block_size, height - row))
+                for row in range(0, height, block_size)
+            ],
+            read_block,
+            compute_block,
+            write_block,
+            io_threads,
+        )
 
 
-def multilook(in_file: str, out_file: str, mlt: List = [1, 1]) -> None:
+def multilook(
+    in_file: str,
+    out_file: str,
+    mlt: List = [1, 1],
+    block_size: int = 512,
+    io_threads: int = 4,
+) -> None:
     """Apply multilooking to raster.
 
     Args:
         in_file (str): GeoTiff file of the primary SLC image
         out_file (str): output file
         mlt (list): number of looks in azimuth and range. Defaults to [1, 1]
-        mlt_az (int): multilook in azimuth. Defaults to 1.
-        mlt_rg (int): multilook in range. Defaults to 1.
+        block_size (int, optional): Number of output lines computed at once. Defaults to 512.
+        io_threads (int, optional): Number of threads reading and writing strips while other strips are computed. Defaults to 4.
+    Note:
+        The raster is processed by strips of lines (see `apply_by_strips`). With [1, 1] looks, the raster is copied.
     """
 
     if not isinstance(mlt, list):
@@ -1131,35 +2379,33 @@ def multilook(in_file: str, out_file: str, mlt: List = [1, 1]) -> None:
         mlt_az, mlt_rg = mlt
 
     log.info(f"Apply {mlt_az} by {mlt_rg} multilooking.")
-
-    with rio.open(in_file) as ds_src:
-        prof = ds_src.profile.copy()
-        trans = ds_src.transform
-        w_out = ds_src.width // mlt_rg
-        h_out = ds_src.height // mlt_az
-        prof.update(
-            {
-                "width": w_out,
-                "height": h_out,
-                "transform": trans * Affine.scale(mlt_rg, mlt_az),
-            }
-        )
-        warnings.filterwarnings("ignore", category=rio.errors.NotGeoreferencedWarning)
-        with rio.open(out_file, "w", **prof) as dst:
-            if mlt_az > 1 or mlt_rg > 1:
-                for i in range(prof["count"]):
-                    arr = ds_src.read(i + 1)
-                    arr_out = presum(arr, mlt_az, mlt_rg)
-                    dst.write(arr_out, i + 1)
+    apply_by_strips(
+        in_file,
+        out_file,
+        lambda arr: presum(arr, mlt_az, mlt_rg),
+        multilook=mlt,
+        block_size=block_size,
+        io_threads=io_threads,
+    )
 
 
-def amplitude(in_file: str, out_file: str, multilook: List = [1, 1]) -> None:
+def amplitude(
+    in_file: str,
+    out_file: str,
+    multilook: List = [1, 1],
+    block_size: int = 512,
+    io_threads: int = 4,
+) -> None:
     """Compute the amplitude of a complex-valued image.
 
     Args:
         in_file (str): GeoTiff file of the primary SLC image
         out_file (str): output file
         multilook (list): number of looks in azimuth and range. Defaults to [1, 1]
+        block_size (int, optional): Number of output lines computed at once. Defaults to 512.
+        io_threads (int, optional): Number of threads reading and writing strips while other strips are computed. Defaults to 4.
+    Note:
+        The image is processed by strips of lines (see `apply_by_strips`).
     """
 
     if not isinstance(multilook, list):
@@ -1169,32 +2415,25 @@ def amplitude(in_file: str, out_file: str, multilook: List = [1, 1]) -> None:
 
     log.info("Compute amplitude")
     with rio.open(in_file) as ds_slc:
-        slc = ds_slc.read(1)
-        prof = ds_slc.profile.copy()
-        trans = ds_slc.transform
-
-    amp = np.abs(slc)
-
-    amp = presum(amp, mlt_az, mlt_rg)
-    prof.update(
-        {
-            "width": amp.shape[1],
-            "height": amp.shape[0],
-            "transform": trans * Affine.scale(mlt_rg, mlt_az),
-        }
+        dtype = np.abs(np.zeros(1, dtype=ds_slc.dtypes[0])).dtype.name
+    apply_by_strips(
+        in_file,
+        out_file,
+        lambda slc: presum(np.abs(slc), mlt_az, mlt_rg),
+        multilook=multilook,
+        dtype=dtype,
+        block_size=block_size,
+        io_threads=io_threads,
     )
 
-    warnings.filterwarnings("ignore", category=rio.errors.NotGeoreferencedWarning)
-    # prof.update(
-    # {"dtype": amp.dtype.name, "compress": "zstd", "num_threads": "all_cpus"}
-    # )
-    prof.update({"dtype": amp.dtype.name})
-    with rio.open(out_file, "w", **prof) as dst:
-        dst.write(amp, 1)
-
 
 def interferogram(
-    prm_file: str, sec_file: str, out_file: str, multilook: List = [1, 1]
+    prm_file: str,
+    sec_file: str,
+    out_file: str,
+    multilook: List = [1, 1],
+    block_size: int = 512,
+    io_threads: int = 4,
 ) -> None:
     """Compute a complex interferogram from two SLC image files.
 
@@ -1202,35 +2441,23 @@ def interferogram(
         prm_file (str): GeoTiff file of the primary SLC image
         sec_file (str): GeoTiff file of the secondary SLC image
         out_file (str): output file
+        multilook (list): number of looks in azimuth and range. Defaults to [1, 1]
+        block_size (int, optional): Number of output lines computed at once. Defaults to 512.
+        io_threads (int, optional): Number of threads reading and writing strips while other strips are computed. Defaults to 4.
+    Note:
+        The images are processed by strips of lines (see `insar_products`).
     """
 
-    if not isinstance(multilook, list):
-        raise ValueError("Multilook must be a list like [mlt_az, mlt_rg]")
-    else:
-        mlt_az, mlt_rg = multilook
-
-    log.info("Compute interferogram")
-    with rio.open(prm_file) as ds_prm:
-        prm = ds_prm.read(1)
-        prof = ds_prm.profile.copy()
-        trans = ds_prm.transform
-    with rio.open(sec_file) as ds_sec:
-        sec = ds_sec.read(1)
-    ifg = prm * sec.conj()
-    ifg = presum(ifg, mlt_az, mlt_rg)
-    prof.update(
-        {
-            "width": ifg.shape[1],
-            "height": ifg.shape[0],
-            "transform": trans * Affine.scale(mlt_rg, mlt_az),
-        }
+    insar_products(
+        prm_file=prm_file,
+        sec_file=sec_file,
+        ifg_file=out_file,
+        multilook=multilook,
+        filter_ifg=False,
+        block_size=block_size,
+        io_threads=io_threads,
     )
 
-    warnings.filterwarnings("ignore", category=rio.errors.NotGeoreferencedWarning)
-    # prof.update({"compress": "zstd", "num_threads": "all_cpus"})
-    with rio.open(out_file, "w", **prof) as dst:
-        dst.write(ifg, 1)
-
 
 def coherence(
     prm_file: str,
@@ -1245,8 +2472,8 @@ def coherence(
     """Compute the complex coherence from two SLC image files.
 
     Args:
-        prm_file (str): GeoTiff file of the primary SLC image
-        sec_file (str): GeoTiff file of the secondary SLC image
+        prm_file (str): GeoTiff file of the primary SLC image, or 2D array such as a date of a Zarr stack (see `open_stack`).
+        sec_file (str): GeoTiff file of the secondary SLC image, or 2D array.
         out_file (str): output file
         box_size (int, optional): Window size in pixels for boxcar filtering. Defaults to 5.
         magnitude (bool, optional): Writes magnitude only. Otherwise a complex valued raster is written. Defaults to True.
@@ -1254,10 +2481,60 @@ def coherence(
         filter_ifg (bool): Also applies boxcar to interferogram. Has no effect if file_complex_ifg is set to None. Defaults to True.
     """
 
-    if not complex_ifg_file:
-        log.info("Compute coherence")
-    else:
-        log.info("Compute coherence & interferogram")
+    insar_products(
+        prm_file=prm_file,
+        sec_file=sec_file,
+        coh_file=out_file,
+        ifg_file=complex_ifg_file,
+        box_size=box_size,
+        multilook=multilook,
+        magnitude=magnitude,
+        filter_ifg=filter_ifg,
+    )
+
+
+def insar_products(
+    prm_file: str,
+    sec_file: str,
+    coh_file: str = None,
+    ifg_file: str = None,
+    amp_prm_file: str = None,
+    amp_sec_file: str = None,
+    box_size: Union[int, List[int]] = 5,
+    multilook: List = [1, 1],
+    magnitude: bool = True,
+    filter_ifg: bool = True,
+    block_size: int = 512,
+    io_threads: int = 4,
+) -> None:
+    """Compute coherence, interferogram and amplitudes from two SLC image files in a single pass.
+
+    Args:
+        prm_file (str): GeoTiff file of the primary SLC image, or 2D array such as a date of a Zarr stack (see `open_stack`).
+        sec_file (str): GeoTiff file of the secondary SLC image, or 2D array.
+        coh_file (str, optional): Coherence output file. Defaults to None.
+        ifg_file (str, optional): Complex interferogram output file. Defaults to None.
+        amp_prm_file (str, optional): Amplitude of the primary image output file. Defaults to None.
+        amp_sec_file (str, optional): Amplitude of the secondary image output file. Defaults to None.
+        box_size (Union[int, List[int]], optional): Window size in pixels for boxcar filtering. Defaults to 5.
+        multilook (List, optional): Multilooking in azimuth and range. Defaults to [1, 1].
+        magnitude (bool, optional): Writes the magnitude of the coherence. Otherwise a complex valued raster is written. Defaults to True.
+        filter_ifg (bool, optional): Also applies boxcar to interferogram. Defaults to True.
+        block_size (int, optional): Number of multilooked lines computed at once. Defaults to 512.
+        io_threads (int, optional): Number of threads reading and writing blocks while other blocks are computed. Defaults to 4.
+    Note:
+        The SLC images are read once, by strips with a margin for the boxcar filter. All the outputs are computed from the same strip and written together.
+        Dask arrays are computed strip by strip. Outputs of array inputs are not georeferenced, like the SLC files.
+    """
+    files = {
+        "coh": coh_file,
+        "ifg": ifg_file,
+        "amp_prm": amp_prm_file,
+        "amp_sec": amp_sec_file,
+    }
+    files = {name: file for name, file in files.items() if file}
+    if not files:
+        raise ValueError("At least one output file must be set.")
 
     if isinstance(box_size, list):
         box_az = box_size[0]
@@ -1271,147 +2548,181 @@ def coherence(
     else:
         mlt_az, mlt_rg = multilook
 
-    # open_args = dict(lock=False, chunks="auto", cache=True, masked=True)
-    open_args = dict(lock=False, chunks=(1, 1024, 1024), cache=True, masked=True)
-
-    warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
-    ds_prm = riox.open_rasterio(prm_file, **open_args)
-    ds_sec = riox.open_rasterio(sec_file, **open_args)
-
-    # accessing dask arrays
-    prm = ds_prm[0].data
-    sec = ds_sec[0].data
-
-    process_args = dict(
-        dimaz=box_az,
-        dimrg=box_rg,
-        depth=(box_az, box_rg),
-    )
-
-    ifg = presum(prm * sec.conj(), mlt_az, mlt_rg)
-    msk = ~np.isnan(ifg)
+    log.info(f"Compute {", ".join(files)}")
 
-    # remove nan to avoid division errors
-    prm2 = presum(np.nan_to_num((prm * prm.conj()).real), mlt_az, mlt_rg)
-    sec2 = presum(np.nan_to_num((sec * sec.conj()).real), mlt_az, mlt_rg)
+    # margin (in multilooked lines) for the boxcar filter and the erosion of the valid pixels
+    margin = box_az
+    struct = np.ones((box_az, box_rg))
 
-    ifg_box = da.map_overlap(boxcar, ifg, **process_args, dtype="complex64")
+    warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
+    dst_lock = threading.Lock()
+    with ExitStack() as stack:
+        prof, read_prm = _open_strips(prm_file, stack)
+        prof_sec, read_sec = _open_strips(sec_file, stack)
+        if (prof["height"], prof["width"]) != (prof_sec["height"], prof_sec["width"]):
+            raise ValueError("Primary and secondary images must have the same shape.")
+        dtype = np.result_type(prof["dtype"], prof_sec["dtype"])
+        if mlt_az > prof["height"] or mlt_rg > prof["width"]:
+            raise ValueError(
+                "Cannot multilook with these parameters; multilook is too large for the image dimensions."
+            )
+        height = prof["height"] // mlt_az
+        width = prof["width"] // mlt_rg
+        real_dtype = np.abs(np.zeros(1, dtype=dtype)).dtype
+        dtypes = {
+            "coh": real_dtype if magnitude else dtype,
+            "ifg": dtype,
+            "amp_prm": real_dtype,
+            "amp_sec": real_dtype,
+        }
 
-    coh = ifg_box / np.sqrt(
-        da.map_overlap(
-            boxcar,
-            prm2,
-            **process_args,
-            dtype="float32",
-        )
-    )
-    coh /= np.sqrt(
-        da.map_overlap(
-            boxcar,
-            sec2,
-            **process_args,
-            dtype="float32",
+        prof.pop("blockxsize", None)
+        prof.pop("blockysize", None)
+        prof.update(
+            {
+                "driver": "GTiff",
+                "count": 1,
+                "width": width,
+                "height": height,
+                "transform": prof["transform"] * Affine.scale(mlt_rg, mlt_az),
+                "nodata": np.nan,
+                "tiled": True,
+                "blockxsize": 512,
+                "blockysize": 512,
+            }
         )
-    )
-    nodataval = np.nan
-    if magnitude:
-        coh = np.abs(coh)
+        dsts = {
+            name: stack.enter_context(
+                rio.open(file, "w", **{**prof, "dtype": dtypes[name]})
+            )
+            for name, file in files.items()
+        }
 
-    struct = np.ones((box_az, box_rg))
-    msk_out = da.map_blocks(binary_erosion, msk, struct)
-    coh = da.where(msk_out, coh, np.nan)
+        def read_block(win):
+            r0 = max(win.row_off - margin, 0)
+            r1 = min(win.row_off + win.height + margin, height)
+            rows = (r0 * mlt_az, r1 * mlt_az, width * mlt_rg)
+            return win, r0, read_prm(*rows), read_sec(*rows)
 
-    da_coh = xr.DataArray(
-        name="coh",
-        data=coh[None],
-        dims=("band", "y", "x"),
-    )
-    da_coh.rio.write_transform(
-        ds_prm.rio.transform() * Affine.scale(mlt_rg, mlt_az), inplace=True
-    )
-    da_coh.rio.write_nodata(nodataval, inplace=True)
-    da_coh.rio.to_raster(out_file)
-    # da_coh.rio.to_raster(out_file, compress="zstd", num_threads="all_cpus")
-
-    # useful as users may want non-filtered interferograms
-    if complex_ifg_file:
-        if filter_ifg:
-            # ifg_box = presum(ifg_box, mlt_az, mlt_rg)
-            da_ifg = xr.DataArray(
-                data=ifg_box[None],
-                dims=("band", "y", "x"),
-            )
-        else:
-            # ifg = presum(ifg, mlt_az, mlt_rg)
-            da_ifg = xr.DataArray(
-                data=ifg[None],
-                dims=("band", "y", "x"),
+        def compute_block(win, r0, prm, sec):
+            ifg, pow_prm, pow_sec, amp_prm, amp_sec = insar_looks(
+                prm, sec, mlt_az, mlt_rg
             )
-        da_ifg.rio.write_transform(
-            ds_prm.rio.transform() * Affine.scale(mlt_rg, mlt_az), inplace=True
-        )
-        da_ifg.rio.write_nodata(np.nan, inplace=True)
-        da_ifg.rio.to_raster(
-            complex_ifg_file, driver="GTiff", tiled=True, blockxsize=512, blockysize=512
+            rows = slice(win.row_off - r0, win.row_off - r0 + win.height)
+            values = {}
+            if "coh" in files or ("ifg" in files and filter_ifg):
+                ifg_box = boxcar(ifg, box_az, box_rg)
+            if "coh" in files:
+                coh = ifg_box / np.sqrt(boxcar(pow_prm, box_az, box_rg))
+                coh /= np.sqrt(boxcar(pow_sec, box_az, box_rg))
+                if magnitude:
+                    coh = np.abs(coh)
+                msk = binary_erosion(~np.isnan(ifg), struct)
+                coh[~msk] = np.nan
+                values["coh"] = coh[rows]
+            if "ifg" in files:
+                values["ifg"] = ifg_box[rows] if filter_ifg else ifg[rows]
+            if "amp_prm" in files:
+                values["amp_prm"] = amp_prm[rows]
+            if "amp_sec" in files:
+                values["amp_sec"] = amp_sec[rows]
+            return values
+
+        def write_block(win, values):
+            with dst_lock:
+                for name, arr in values.items():
+                    dsts[name].write(arr, 1, window=win)
+
+        _stream_blocks(
+            [
+                Window(0, row, width, min(block_size, height - row))
+                for row in range(0, height, block_size)
+            ],
+            read_block,
+            compute_block,
+            write_block,
+            io_threads,
         )
 
 
 def goldstein(
-    ifg_file: str, out_file: str, alpha: float = 0.5, overlap: int = 14
+    ifg_file: str,
+    out_file: str,
+    alpha: float = 0.5,
+    overlap: int = 14,
+    block_size: int = 1024,
+    workers: int = -1,
+    io_threads: int = 4,
 ) -> None:
     """Apply the Goldstein filter to a complex interferogam to reduce phase noise.
 
     Args:
-        ifg_file (str): Input file.
+        ifg_file (str): Input file, or 2D complex array.
         out_file (str): Output file.
         alpha (float, optional): Filter parameter. Should be between 0 (no filtering) and 1 (strongest). Defaults to 0.5.
-        overlap (int, optional): Total overlap between 64x64 patches. Defaults to 14.
+        overlap (int, optional): Total overlap between patches. Patches are 32 + overlap // 2 pixels wide and 32 - overlap // 2 pixels apart. Defaults to 14.
+        block_size (int, optional): Approximate number of lines filtered at once. Defaults to 1024.
+        workers (int, optional): Number of workers of the FFTs. Defaults to -1 (all CPUs).
+        io_threads (int, optional): Number of threads reading and writing blocks while other blocks are filtered. Defaults to 4.
     Note:
         The method is described in:
         R.M. Goldstein and C.L. Werner, "Radar Interferogram Phase Filtering for Geophysical Applications," Geophysical Research Letters, 25, 4035-4038, 1998
+        The interferogram is filtered by strips of lines, each with a single batched FFT of its patches (see `goldstein_filter`).
     """
+    # blocks of 32 - overlap // 2 pixels extended by overlap // 2 pixels on each side
+    half = overlap // 2
+    if not 0 <= half < 32:
+        raise ValueError("Overlap must be between 0 and 63.")
+    patch_size = 32 + half
+    overlap = 2 * half
+    # strips and margins are multiples of the patch step to keep the patches of the full image
+    step = patch_size - overlap
+    margin = -(-patch_size // step) * step
+    block_size = max(block_size // step, 1) * step
 
-    # base filter to be applied on a patch
-    def filter_base(arr, alpha=1):
-        smooth = lambda x: uflt(x, 3)
-        Z = fftshift(fft2(arr))
-        H = smooth(abs(Z))
-        H = H ** (alpha)
-        arrout = ifft2(ifftshift(H * Z))
-        return arrout
-
-    # base filter to be sequentially applied on a chunk
-    def filter_chunk(chunk, alpha=0.5, overlap=14):
-        # complex phase
-        chunk_ = np.exp(1j * np.angle(chunk))
-        return block_process(
-            chunk_,
-            (32 - overlap // 2, 32 - overlap // 2),
-            (overlap // 2, overlap // 2),
-            filter_base,
-            alpha=alpha,
-        )
-
-    # TODO: find a way to automatically tune chunk size
-    open_args = dict(lock=False, chunks=(1, 2048, 2048), masked=True)
     warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
-    ds_ifg = riox.open_rasterio(ifg_file, **open_args)
-    ifg = ds_ifg[0].data
-
-    # process multiple chunks in parallel
-    process_args = dict(alpha=alpha, depth=(32, 32), dtype="complex64")
-    ifg_out = da.map_overlap(filter_chunk, ifg, **process_args)
-    da_out = xr.DataArray(
-        name="ifg",
-        data=ifg_out[None],
-        dims=("band", "y", "x"),
-    )
-    da_out.rio.write_transform(ds_ifg.rio.transform(), inplace=True)
-
-    nodataval = np.nan
-    da_out.rio.write_nodata(nodataval, inplace=True)
-    # block size manually set until better solution
-    da_out.rio.to_raster(out_file, tiled=True, blockxsize=512, blockysize=512)
+    dst_lock = threading.Lock()
+    with ExitStack() as stack:
+        prof, read_ifg = _open_strips(ifg_file, stack)
+        height, width = prof["height"], prof["width"]
+        prof.pop("blockxsize", None)
+        prof.pop("blockysize", None)
+        prof.update(
+            {
+                "driver": "GTiff",
+                "count": 1,
+                "dtype": "complex64",
+                "nodata": np.nan,
+                "tiled": True,
+                "blockxsize": 512,
+                "blockysize": 512,
+            }
+        )
+        dst = stack.enter_context(rio.open(out_file, "w", **prof))
+
+        def read_block(win):
+            r0 = max(win.row_off - margin, 0)
+            r1 = min(win.row_off + win.height + margin, height)
+            return win, r0, read_ifg(r0, r1, width)
+
+        def filter_block(win, r0, arr):
+            arr_out = goldstein_filter(arr, alpha, overlap, patch_size, workers)
+            return arr_out[win.row_off - r0 : win.row_off - r0 + win.height]
+
+        def write_block(win, values):
+            with dst_lock:
+                dst.write(values, 1, window=win)
+
+        _stream_blocks(
+            [
+                Window(0, row, width, min(block_size, height - row))
+                for row in range(0, height, block_size)
+            ],
+            read_block,
+            filter_block,
+            write_block,
+            io_threads,
+        )
 
 
 def apply_to_patterns_for_pair(
@@ -1509,17 +2820,17 @@ def apply_to_patterns_for_single(
 
 
 def _process_bursts_insar(
-    prm,
-    sec,
-    tmp_prm,
-    tmp_sec,
+    prms,
+    secs,
+    tmp_prms,
+    tmp_secs,
     output_dir,
     dem_dir,
     naz,
     nrg,
     min_burst,
     max_burst,
-    burst_offset,
+    burst_offsets,
     dem_name,
     dem_upsampling,
     dem_buffer_arc_sec,
@@ -1527,8 +2838,15 @@ def _process_bursts_insar(
     warp_kernel,
     overlap,
     cal_type,
+    queue_depth=1,
+    geocoding_mem_budget=None,
+    tie_point_step=None,
+    tie_point_tol=0.05,
 ):
-
+    # prms: swaths of each polarization of the primary
+    # secs: for each secondary, swaths of each polarization
+    # geometry is computed with the swaths of the first polarization
+    prm = prms[0]
     H = int(overlap / 2)
     prof_tmp = dict(
         width=nrg,
@@ -1574,123 +2892,198 @@ def _process_bursts_insar(
         blockysize=512,
     )
 
+    # primary geometry of the current burst, shared by all the secondaries
+    # (bursts are computed in order by a single thread)
+    ref = {}
+    n_sec = len(secs)
+
     # for now we hardcode this as benchmarks show lower peak memory and
     # slight speed gain
-    gdal_cachemax = 512
-    arr_lut = np.full((2, height_lut, width_lut), fill_value=np.nan)
-    with rio.Env(GDAL_CACHEMAX=gdal_cachemax) as env:
-        with (
-            rio.open(tmp_prm, "w", **prof_tmp) as ds_prm,
-            rio.open(tmp_sec, "w", **prof_tmp) as ds_sec,
-            rio.open(dem_file) as ds_dem,
-        ):
-            off_az = 0
-            for burst_idx in range(min_burst, max_burst + 1):
-                log.info(f"---- Processing burst {burst_idx} ----")
+    with rio.Env(GDAL_CACHEMAX=_BURST_GDAL_CACHEMAX) as env:
+        with ExitStack() as stack:
+            ds_prms = [
+                stack.enter_context(rio.open(f, "w", **prof_tmp)) for f in tmp_prms
+            ]
+            ds_secs = [
+                [stack.enter_context(rio.open(f, "w", **prof_tmp)) for f in files]
+                for files in tmp_secs
+            ]
+            ds_dem = stack.enter_context(rio.open(dem_file))
+            ds_lut = stack.enter_context(rio.open(lut_file, "w+", **prof_lut))
+
+            def read_burst(item):
+                # the primary burst is read along with the first secondary
+                burst_idx, k = item
+                w, dem_file_burst, arrs_p, cals_p = None, None, None, None
+                if k == 0:
+                    burst_geoms = prm.gdf_burst_geom
+                    burst_geom = burst_geoms[burst_geoms["burst"] == burst_idx].iloc[0]
+                    shp = burst_geom.geometry.buffer(dem_buffer_arc_sec / 3600)
+
+                    w = geometry_window(ds_dem, shapes=[shp])
+                    # window to read in the DEM and to write the burst in the LUT
+                    burst_window = [w.col_off, w.row_off, w.width, w.height]
+
+                    # use virtual raster to keep using the same geocoding function
+                    # (one per burst as the next bursts are prepared during computations)
+                    dem_file_burst = f"{output_dir}/dem_burst_{burst_idx}.vrt"
+                    gdal.Translate(
+                        destName=dem_file_burst,
+                        srcDS=dem_file,
+                        format="VRT",
+                        srcWin=burst_window,
+                        creationOptions=["BLOCKXSIZE=512", "BLOCKYSIZE=512"],
+                    )
 
-                # compute geocoding LUTs (lookup tables) for primary and secondary bursts
-                dem_file_burst = f"{output_dir}/dem_burst.tif"
-                burst_geoms = prm.gdf_burst_geom
-                burst_geom = burst_geoms[burst_geoms["burst"] == burst_idx].iloc[0]
-                shp = burst_geom.geometry.buffer(dem_buffer_arc_sec / 3600)
+                    # read primary burst rasters of each polarization
+                    # radiometric calibration (beta or sigma nought)
+                    arrs_p = [p.read_burst(burst_idx, True) for p in prms]
+                    cals_p = [
+                        p.calibration_factor(burst_idx, cal_type=cal_type) for p in prms
+                    ]
+
+                # read secondary burst rasters of each polarization
+                burst_idx_s = burst_idx + burst_offsets[k]
+                arrs_s = [s.read_burst(burst_idx_s, True) for s in secs[k]]
+                cals_s = [
+                    s.calibration_factor(burst_idx_s, cal_type=cal_type)
+                    for s in secs[k]
+                ]
+                return (
+                    burst_idx,
+                    k,
+                    w,
+                    dem_file_burst,
+                    arrs_p,
+                    cals_p,
+                    arrs_s,
+                    cals_s,
+                )
 
-                w = geometry_window(ds_dem, shapes=[shp])
-                # window to read in the DEM
-                burst_window = [w.col_off, w.row_off, w.width, w.height]
-                # pixel position to write burst in the LUT
-                slices = w.toslices()
+            def compute_burst(
+                burst_idx, k, w, dem_file_burst, arrs_p, cals_p, arrs_s, cals_s
+            ):
+                if k == 0:
+                    log.info(f"---- Processing burst {burst_idx} ----")
 
-                # use virtual raster to keep using the same geocoding function
-                dem_file_burst = f"{output_dir}/dem_burst.vrt"
-                gdal.Translate(
-                    destName=dem_file_burst,
-                    srcDS=dem_file,
-                    format="VRT",
-                    srcWin=burst_window,
-                    creationOptions=["BLOCKXSIZE=512", "BLOCKYSIZE=512"],
-                )
+                    # compute geocoding LUT (lookup table) for the primary burst
+                    # this implementation upsamples DEM at download, not during geocoding
+                    az_p2g, rg_p2g = prm.geocode_burst(
+                        dem_file_burst,
+                        burst_idx=burst_idx,
+                        dem_upsampling=1,
+                        tie_point_step=tie_point_step,
+                        tie_point_tol=tie_point_tol,
+                        mem_budget=geocoding_mem_budget,
+                    )
 
-                # this implementation upsamples DEM at download, not during geocoding
-                az_p2g, rg_p2g = prm.geocode_burst(
-                    dem_file_burst,
-                    burst_idx=burst_idx,
-                    dem_upsampling=1,
-                )
+                    log.info("Apply calibration factor")
+                    for arr_p, cal_p in zip(arrs_p, cals_p):
+                        arr_p /= cal_p
+
+                    # primary topographic phase
+                    shape = arrs_p[0].shape
+                    rg_p = np.zeros(shape[0])[:, None] + np.arange(0, shape[1])
+                    pht_p = prm.phi_topo(rg_p).reshape(*shape)
+                    ref.update(
+                        w=w,
+                        dem_file_burst=dem_file_burst,
+                        arr_p=arrs_p[0],
+                        az_p2g=az_p2g,
+                        rg_p2g=rg_p2g,
+                        pht_p=pht_p,
+                    )
+                if n_sec > 1:
+                    log.info(f"Secondary {k + 1}/{n_sec}")
+
+                # compute geocoding LUT for the secondary burst
+                sec = secs[k][0]
+                burst_idx_s = burst_idx + burst_offsets[k]
                 az_s2g, rg_s2g = sec.geocode_burst(
-                    dem_file_burst,
-                    burst_idx=burst_idx + burst_offset,
+                    ref["dem_file_burst"],
+                    burst_idx=burst_idx_s,
                     dem_upsampling=1,
+                    tie_point_step=tie_point_step,
+                    tie_point_tol=tie_point_tol,
+                    mem_budget=geocoding_mem_budget,
                 )
-
-                # read primary and secondary burst rasters
-                arr_p = prm.read_burst(burst_idx, True)
-                arr_s = sec.read_burst(burst_idx + burst_offset, True)
-
-                # radiometric calibration (beta or sigma nought)
-                cal_p = prm.calibration_factor(burst_idx, cal_type=cal_type)
-                cal_s = sec.calibration_factor(
-                    burst_idx + burst_offset, cal_type=cal_type
-                )
-                log.info("Apply calibration factor")
-                arr_p /= cal_p
-                arr_s /= cal_s
-
-                # deramp secondary
-                pdb_s = sec.deramp_burst(burst_idx + burst_offset)
-                log.info("Apply phase deramping")
-                arr_s *= np.exp(1j * pdb_s)
+                if k == n_sec - 1:
+                    remove(ref["dem_file_burst"])
 
                 # project Secondary LUT into Primary grid
+                arr_p, az_p2g, rg_p2g = ref["arr_p"], ref["az_p2g"], ref["rg_p2g"]
+                shape = arr_p.shape
                 az_s2p, rg_s2p = coregister(arr_p, az_p2g, rg_p2g, az_s2g, rg_s2g)
 
-                # warp raster secondary and deramping phase
-                arr_s = align(arr_s, az_s2p, rg_s2p, warp_kernel)
-                pdb_s = align(pdb_s, az_s2p, rg_s2p, warp_kernel)
-
-                # reramp secondary
-                log.info("Apply phase reramping")
-                arr_s *= np.exp(-1j * pdb_s)
+                # deramping phase, warped to the primary geometry
+                pdb_s = sec.deramp_burst(burst_idx_s)
+                plan = ResamplingPlan(
+                    az_s2p, rg_s2p, shape, warp_kernel, single_precision=True
+                )
+                ramp = np.exp(1j * pdb_s)
+                reramp = np.exp(-1j * plan.apply(pdb_s))
 
                 # compute topographic phases
-                rg_p = np.zeros(arr_p.shape[0])[:, None] + np.arange(0, arr_p.shape[1])
-                pht_p = prm.phi_topo(rg_p).reshape(*arr_p.shape)
-                pht_s = sec.phi_topo(rg_s2p.ravel()).reshape(*arr_p.shape)
-                log.info("Apply topographic phase removal")
-                pha_topo = np.exp(-1j * (pht_p - pht_s)).astype(np.complex64)
+                pht_s = sec.phi_topo(rg_s2p.ravel()).reshape(*shape)
+                pha_topo = np.exp(-1j * (ref["pht_p"] - pht_s)).astype(np.complex64)
 
-                arr_s *= pha_topo
+                for i, arr_s in enumerate(arrs_s):
+                    log.info("Apply calibration factor")
+                    arr_s /= cals_s[i]
+
+                    log.info("Apply phase deramping")
+                    arr_s *= ramp
+
+                    # warp raster secondary
+                    log.info("Warp secondary to primary geometry.")
+                    arr_s = plan.apply(arr_s)
+
+                    log.info("Apply phase reramping")
+                    arr_s *= reramp
+
+                    log.info("Apply topographic phase removal")
+                    arr_s *= pha_topo
+                    arrs_s[i] = arr_s
+
+                # the primary LUT is written once all the secondaries are coregistered
+                lut = None
+                if k == n_sec - 1:
+                    # place overlapping burst LUT with azimuth offset
+                    if burst_idx > min_burst:
+                        msk_overlap = az_p2g < H
+                        az_p2g[msk_overlap] = np.nan
+                        rg_p2g[msk_overlap] = np.nan
+                    lut = (ref["w"], az_p2g, rg_p2g)
+                return burst_idx, k, arrs_p, arrs_s, lut
+
+            def write_burst(burst_idx, k, arrs_p, arrs_s, lut):
                 first_line = (burst_idx - min_burst) * prm.lines_per_burst
+                off_az = (burst_idx - min_burst) * (prm.lines_per_burst - 2 * H)
 
                 # write the coregistered SLCs
-                ds_prm.write(
-                    arr_p, 1, window=Window(0, first_line, nrg, prm.lines_per_burst)
-                )
-                ds_sec.write(
-                    arr_s,
-                    1,
-                    window=Window(0, first_line, nrg, prm.lines_per_burst),
-                )
-
-                # place overlapping burst LUT with azimuth offset
-                if burst_idx > min_burst:
-                    msk_overlap = az_p2g < H
-                    az_p2g[msk_overlap] = np.nan
-                    rg_p2g[msk_overlap] = np.nan
-                msk = ~np.isnan(az_p2g)
-                arr_lut[0, slices[0], slices[1]][msk] = az_p2g[msk] + off_az
-                arr_lut[1, slices[0], slices[1]][msk] = rg_p2g[msk]
-                off_az += prm.lines_per_burst - 2 * H
-
-    remove(dem_file_burst)
-
-    with rio.Env(GDAL_CACHEMAX=gdal_cachemax) as env:
-        with rio.open(lut_file, "w", **prof_lut) as ds_lut:
-            ds_lut.write(arr_lut)
+                window = Window(0, first_line, nrg, prm.lines_per_burst)
+                if arrs_p is not None:
+                    for ds_prm, arr_p in zip(ds_prms, arrs_p):
+                        ds_prm.write(arr_p, 1, window=window)
+                for ds_sec, arr_s in zip(ds_secs[k], arrs_s):
+                    ds_sec.write(arr_s, 1, window=window)
+                if lut is not None:
+                    _write_burst_lut(ds_lut, lut[1], lut[2], lut[0], off_az)
+
+            # bursts are read, computed and written concurrently
+            # each secondary burst is an item, the primary burst comes with the first one
+            _stream_stages(
+                [(b, k) for b in range(min_burst, max_burst + 1) for k in range(n_sec)],
+                read_burst,
+                compute_burst,
+                write_burst,
+                queue_depth,
+            )
 
 
 def _process_bursts_slc(
-    slc,
-    tmp_slc,
+    slcs,
+    tmp_slcs,
     output_dir,
     dem_dir,
     naz,
@@ -1703,8 +3096,13 @@ def _process_bursts_slc(
     dem_force_download,
     overlap,
     cal_type,
+    queue_depth=1,
+    geocoding_mem_budget=None,
+    tie_point_step=None,
+    tie_point_tol=0.05,
 ):
-
+    # geometry is computed with the swath of the first polarization
+    slc = slcs[0]
     H = int(overlap / 2)
     prof_tmp = dict(
         width=nrg,
@@ -1750,27 +3148,26 @@ def _process_bursts_slc(
         blockysize=512,
     )
 
-    arr_lut = np.full((2, height_lut, width_lut), fill_value=np.nan)
-    with rio.Env(GDAL_CACHEMAX=512) as env:
-        with rio.open(tmp_slc, "w", **prof_tmp) as ds_prm, rio.open(dem_file) as ds_dem:
-            off_az = 0
-            for burst_idx in range(min_burst, max_burst + 1):
-                log.info(f"---- Processing burst {burst_idx} ----")
+    with rio.Env(GDAL_CACHEMAX=_BURST_GDAL_CACHEMAX) as env:
+        with ExitStack() as stack:
+            ds_slcs = [
+                stack.enter_context(rio.open(f, "w", **prof_tmp)) for f in tmp_slcs
+            ]
+            ds_dem = stack.enter_context(rio.open(dem_file))
+            ds_lut = stack.enter_context(rio.open(lut_file, "w+", **prof_lut))
 
-                # compute geocoding LUTs (lookup tables) for primary and secondary bursts
-                dem_file_burst = f"{output_dir}/dem_burst.tif"
+            def read_burst(burst_idx):
                 burst_geoms = slc.gdf_burst_geom
                 burst_geom = burst_geoms[burst_geoms["burst"] == burst_idx].iloc[0]
                 shp = burst_geom.geometry.buffer(dem_buffer_arc_sec / 3600)
 
                 w = geometry_window(ds_dem, shapes=[shp])
-                # window to read in the DEM
+                # window to read in the DEM and to write the burst in the LUT
                 burst_window = [w.col_off, w.row_off, w.width, w.height]
-                # pixel position to write burst in the LUT
-                slices = w.toslices()
 
                 # use virtual raster to keep using the same geocoding function
-                dem_file_burst = f"{output_dir}/dem_burst.vrt"
+                # (one per burst as the next bursts are prepared during computations)
+                dem_file_burst = f"{output_dir}/dem_burst_{burst_idx}.vrt"
                 gdal.Translate(
                     destName=dem_file_burst,
                     srcDS=dem_file,
@@ -1779,60 +3176,93 @@ def _process_bursts_slc(
                     creationOptions=["BLOCKXSIZE=512", "BLOCKYSIZE=512"],
                 )
 
+                # read burst raster of each polarization
+                arrs_p = [s.read_burst(burst_idx, True) for s in slcs]
+
+                # radiometric calibration (beta, sigma nought or terrain)
+                # we use beta as a normalization reference for terrain flattening
+                cals_p = [
+                    s.calibration_factor(
+                        burst_idx,
+                        cal_type=cal_type if cal_type != "terrain" else "beta",
+                    )
+                    for s in slcs
+                ]
+                return burst_idx, w, dem_file_burst, arrs_p, cals_p
+
+            def compute_burst(burst_idx, w, dem_file_burst, arrs_p, cals_p):
+                log.info(f"---- Processing burst {burst_idx} ----")
+
+                # compute geocoding LUTs (lookup tables) for the burst
                 # this implementation upsamples DEM at download, not during geocoding
                 if cal_type != "terrain":
                     az_p2g, rg_p2g = slc.geocode_burst(
                         dem_file_burst,
                         burst_idx=burst_idx,
                         dem_upsampling=1,
+                        tie_point_step=tie_point_step,
+                        tie_point_tol=tie_point_tol,
+                        mem_budget=geocoding_mem_budget,
                     )
                 else:
                     az_p2g, rg_p2g, gamma_t = slc.geocode_burst(
                         dem_file_burst,
                         burst_idx=burst_idx,
                         dem_upsampling=1,
+                        tie_point_step=tie_point_step,
+                        tie_point_tol=tie_point_tol,
                         simulate_terrain=True,
                     )
-
-                # read primary and secondary burst rasters
-                arr_p = slc.read_burst(burst_idx, True)
-
-                # radiometric calibration (beta, sigma nought or terrain)
-                if cal_type != "terrain":
-                    cal_p = slc.calibration_factor(burst_idx, cal_type=cal_type)
-                    log.info("Apply calibration factor")
-                    arr_p /= cal_p
-                else:
-                    # we use beta as a normalization reference
-                    cal_p = slc.calibration_factor(burst_idx, cal_type="beta")
-                    log.info("Apply calibration factor and terrain flattening")
-                    arr_p /= cal_p
-                    arr_p[~np.isnan(gamma_t)] /= np.sqrt(gamma_t[~np.isnan(gamma_t)])
-                    arr_p[np.isnan(gamma_t)] = np.nan
-
-                # read primary and secondary burst raster
-                first_line = (burst_idx - min_burst) * slc.lines_per_burst
-
-                # write the coregistered SLCs
-                ds_prm.write(
-                    arr_p, 1, window=Window(0, first_line, nrg, slc.lines_per_burst)
-                )
+                remove(dem_file_burst)
+
+                if cal_type == "terrain":
+                    msk_t = np.isnan(gamma_t)
+                    sqrt_gamma_t = np.sqrt(gamma_t[~msk_t])
+                for arr_p, cal_p in zip(arrs_p, cals_p):
+                    if cal_type != "terrain":
+                        log.info("Apply calibration factor")
+                        arr_p /= cal_p
+                    else:
+                        log.info("Apply calibration factor and terrain flattening")
+                        arr_p /= cal_p
+                        arr_p[~msk_t] /= sqrt_gamma_t
+                        arr_p[msk_t] = np.nan
 
                 # place overlapping burst LUT with azimuth offset
                 if burst_idx > min_burst:
                     msk_overlap = az_p2g < H
                     az_p2g[msk_overlap] = np.nan
                     rg_p2g[msk_overlap] = np.nan
-                msk = ~np.isnan(az_p2g)
-                arr_lut[0, slices[0], slices[1]][msk] = az_p2g[msk] + off_az
-                arr_lut[1, slices[0], slices[1]][msk] = rg_p2g[msk]
-                off_az += slc.lines_per_burst - 2 * H
+                return burst_idx, w, arrs_p, az_p2g, rg_p2g
+
+            def write_burst(burst_idx, w, arrs_p, az_p2g, rg_p2g):
+                first_line = (burst_idx - min_burst) * slc.lines_per_burst
+                off_az = (burst_idx - min_burst) * (slc.lines_per_burst - 2 * H)
+
+                # write the calibrated SLCs
+                window = Window(0, first_line, nrg, slc.lines_per_burst)
+                for ds_slc, arr_p in zip(ds_slcs, arrs_p):
+                    ds_slc.write(arr_p, 1, window=window)
+                _write_burst_lut(ds_lut, az_p2g, rg_p2g, w, off_az)
+
+            # bursts are read, computed and written concurrently
+            _stream_stages(
+                range(min_burst, max_burst + 1),
+                read_burst,
+                compute_burst,
+                write_burst,
+                queue_depth,
+            )
 
-    remove(dem_file_burst)
 
-    with rio.Env(GDAL_CACHEMAX=512) as env:
-        with rio.open(lut_file, "w", **prof_lut) as ds_lut:
-            ds_lut.write(arr_lut)
+def _write_burst_lut(ds_lut, az_p2g, rg_p2g, window, off_az):
+    # read-modify-write of the burst window so that the swath LUT
+    # is never fully loaded in memory
+    arr_lut = ds_lut.read(window=window)
+    msk = ~np.isnan(az_p2g)
+    arr_lut[0][msk] = az_p2g[msk] + off_az
+    arr_lut[1][msk] = rg_p2g[msk]
+    ds_lut.write(arr_lut, window=window)
 
 
 def _apply_fast_esd(
@@ -1974,3 +3404,220 @@ def _child_process(func, args):
             return func(**args)
         else:
             raise ValueError("Function arguments should be tuple, list or dict")
+
+
+def _preprocess_insar_job(out_dir, pol, iw, **kwargs):
+    # each job works in its own directory as intermediate file names are fixed
+    log.info(f"---- Processing subswath IW{iw} in {'+'.join(pol).upper()} polarization")
+    job_dir = f"{out_dir}/tmp_iw{iw}"
+    preprocess_insar_iw(output_dir=job_dir, iw=iw, pol=pol, **kwargs)
+    for p in pol:
+        os.rename(f"{job_dir}/primary_{p}.tif", f"{out_dir}/slc_prm_{p}_iw{iw}.tif")
+        os.rename(f"{job_dir}/secondary_{p}.tif", f"{out_dir}/slc_sec_{p}_iw{iw}.tif")
+    os.rename(f"{job_dir}/lut.tif", f"{out_dir}/lut_iw{iw}.tif")
+    os.rmdir(job_dir)
+
+
+def _preprocess_stack_job(out_dir, pol, iw, ids, store="tif", **kwargs):
+    # each job works in its own directory as intermediate file names are fixed
+    log.info(f"---- Processing subswath IW{iw} in {'+'.join(pol).upper()} polarization")
+    job_dir = f"{out_dir}/tmp_iw{iw}"
+    preprocess_insar_iw(output_dir=job_dir, iw=iw, pol=pol, **kwargs)
+    for p in pol:
+        os.rename(
+            f"{job_dir}/primary_{p}.tif", f"{out_dir}/slc_{ids[0]}_{p}_iw{iw}.tif"
+        )
+        for k, id_sec in enumerate(ids[1:]):
+            os.rename(
+                f"{job_dir}/secondary_{k}_{p}.tif",
+                f"{out_dir}/slc_{id_sec}_{p}_iw{iw}.tif",
+            )
+        if store == "zarr":
+            _slc_to_zarr(out_dir, f"{p}_iw{iw}", ids)
+    os.rename(f"{job_dir}/lut.tif", f"{out_dir}/lut_iw{iw}.tif")
+    os.rmdir(job_dir)
+
+
+def _import_zarr():
+    # optional dependency, only needed for stacks stored in Zarr
+    try:
+        import zarr
+    except ImportError as e:
+        raise ImportError(
+            "Zarr stores require the zarr package (version 3 or later)."
+        ) from e
+    return zarr
+
+
+def _create_zarr_store(stack_dir):
+    # the root group is created before jobs add their arrays
+    zarr = _import_zarr()
+    store = f"{stack_dir}/{_ZARR_STORE}"
+    zarr.open_group(store, mode="a", zarr_format=3)
+    return store
+
+
+def _slc_to_zarr(
+    stack_dir, name, ids, chunks=_ZARR_CHUNKS, clevel=_ZARR_CLEVEL, remove_tif=True
+):
+    # each job writes its own array, by strips of whole chunks
+    zarr = _import_zarr()
+    from zarr.codecs import BloscCodec
+
+    files = [f"{stack_dir}/slc_{it}_{name}.tif" for it in ids]
+    with rio.open(files[0]) as ds:
+        height, width = ds.shape
+        dtype = ds.dtypes[0]
+    arr = zarr.create_array(
+        store=f"{stack_dir}/{_ZARR_STORE}",
+        name=name,
+        shape=(len(ids), height, width),
+        chunks=chunks,
+        dtype=dtype,
+        compressors=BloscCodec(cname="zstd", clevel=clevel, shuffle="bitshuffle"),
+        fill_value=np.nan,
+        dimension_names=("date", "azimuth", "range"),
+        attributes={"dates": list(ids)},
+        overwrite=True,
+    )
+    log.info(f"Write {name.upper()} SLCs to the Zarr store")
+    warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
+    nlines = chunks[1]
+    for k, file in enumerate(files):
+        with rio.open(file) as ds:
+            if ds.shape != (height, width):
+                raise ValueError("SLCs of a subswath must have the same shape.")
+            for row in range(0, height, nlines):
+                win = Window(0, row, width, min(nlines, height - row))
+                arr[k, row : row + win.height] = ds.read(
+                    1, window=win, masked=True
+                ).filled(np.nan)
+    if remove_tif:
+        for file in files:
+            os.remove(file)
+
+
+def _preprocess_slc_job(out_dir, pol, iw, **kwargs):
+    # each job works in its own directory as intermediate file names are fixed
+    log.info(f"---- Processing subswath IW{iw} in {'+'.join(pol).upper()} polarization")
+    job_dir = f"{out_dir}/tmp_iw{iw}"
+    preprocess_slc_iw(output_dir=job_dir, iw=iw, pol=pol, **kwargs)
+    for p in pol:
+        os.rename(f"{job_dir}/slc_{p}.tif", f"{out_dir}/slc_{p}_iw{iw}.tif")
+    os.rename(f"{job_dir}/lut.tif", f"{out_dir}/lut_iw{iw}.tif")
+    os.rmdir(job_dir)
+
+
+def _lut_file(sar_dir, pol, iw):
+    # the LUT is shared by the polarizations, older products have one per polarization
+    lut_file = f"{sar_dir}/lut_iw{iw}.tif"
+    lut_file_pol = f"{sar_dir}/lut_{pol}_iw{iw}.tif"
+    if not os.path.exists(lut_file) and os.path.exists(lut_file_pol):
+        return lut_file_pol
+    return lut_file
+
+
+def _prefetch_iw(
+    slc_paths,
+    pol,
+    iw,
+    min_burst,
+    max_burst,
+    dem_dir,
+    dem_name,
+    dem_upsampling,
+    dem_buffer_arc_sec,
+    dem_force_download,
+    geocoding_mem_budget=None,
+    cache_dir=None,
+):
+    """Fills the orbit and DEM caches of a subswath job, and its metadata cache if `cache_dir` is set, and estimates its peak memory in MB.
+
+    Jobs running concurrently then only read these files.
+    """
+    swaths = [
+        S1IWSwath(path, iw=iw, pol=p, cache_dir=cache_dir)
+        for path in slc_paths
+        for p in pol
+    ]
+    swath = swaths[0]
+    dem_file = swath.fetch_dem(
+        min_burst,
+        max_burst,
+        dem_dir,
+        buffer_arc_sec=dem_buffer_arc_sec,
+        force_download=dem_force_download,
+        upscale_factor=dem_upsampling,
+        dem_name=dem_name,
+    )
+
+    # bursts are processed one at a time: the peak is set by the largest burst DEM window
+    # the geometry is computed once per product, the burst rasters are held for each polarization
+    # and the secondaries of a stack are coregistered one at a time
+    geoms = swath.gdf_burst_geom
+    geoms = geoms[(geoms["burst"] >= min_burst) & (geoms["burst"] <= max_burst)]
+    with rio.open(dem_file) as ds_dem:
+        windows = [
+            geometry_window(ds_dem, shapes=[geom.buffer(dem_buffer_arc_sec / 3600)])
+            for geom in geoms.geometry
+        ]
+    dem_pixels = max(w.width * w.height for w in windows)
+    burst_pixels = swath.lines_per_burst * swath.samples_per_burst
+    mem_geocoding = dem_pixels * _GEOCODING_BYTES_PER_PIXEL
+    if geocoding_mem_budget is not None:
+        # the DEM is geocoded by blocks of rows
+        mem_geocoding = min(mem_geocoding, geocoding_mem_budget * 2**20)
+    mem = min(len(slc_paths), 2) * (
+        len(pol) * burst_pixels * _BURST_BYTES_PER_PIXEL + mem_geocoding
+    )
+    return mem / 2**20 + _BURST_GDAL_CACHEMAX
+
+
+def _init_worker(num_threads):
+    # share the cores between the processes of the pool
+    numba.set_num_threads(min(num_threads, numba.config.NUMBA_NUM_THREADS))
+    os.environ["GDAL_NUM_THREADS"] = str(num_threads)
+
+
+def _run_jobs(jobs, n_workers=1, mem_budget=None):
+    """Run independent jobs in a pool of processes admitted against a memory budget.
+
+    Args:
+        jobs (list): tuples (func, kwargs, mem) where mem is the estimated peak memory of the job in MB
+        n_workers (int): number of processes. With 1, jobs run sequentially in the calling process. Defaults to 1.
+        mem_budget (float): memory in MB shared by the running jobs. A job starts when its estimate fits in the memory left by the running jobs, or when no other job is running. Defaults to None (no limit).
+    Note:
+        Jobs are started in their order. Numba and GDAL threads of each process are limited to their share of the CPUs.
+        Processes are spawned rather than forked since the calling process may already run numba or GDAL threads.
+    """
+    if n_workers < 1:
+        raise ValueError("n_workers must be >= 1")
+    if n_workers == 1:
+        for func, kwargs, _ in jobs:
+            func(**kwargs)
+        return
+
+    pending = deque(jobs)
+    running = {}
+    num_threads = max(os.cpu_count() // n_workers, 1)
+    with concurrent.futures.ProcessPoolExecutor(
+        n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(num_threads,),
+    ) as pool:
+        while pending or running:
+            while pending and len(running) < n_workers:
+                func, kwargs, mem = pending[0]
+                used = sum(running.values())
+                if running and mem_budget is not None and used + mem > mem_budget:
+                    break
+                log.info(f"Start job {len(jobs) - len(pending) + 1}/{len(jobs)}")
+                running[pool.submit(func, **kwargs)] = mem
+                pending.popleft()
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for job in done:
+                del running[job]
+                job.result()
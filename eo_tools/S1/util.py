@@ -1,7 +1,10 @@
 import numpy as np
 
-from scipy.ndimage import convolve
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft as sfft
+from scipy.ndimage import uniform_filter
 from numba import njit, prange, cfunc
+from functools import lru_cache
 
 
 def boxcar(img, dimaz, dimrg):
@@ -10,49 +13,205 @@ def boxcar(img, dimaz, dimrg):
 
     Args:
         img (complex or real array): Input image with arbitrary number of dimensions, shape (naz, nrg, ...).
-        dimaz (float): Size in azimuth of the filter.
-        dimrg (float): Size in range of the filter.
+        dimaz (int): Size in azimuth of the filter.
+        dimrg (int): Size in range of the filter.
 
     Returns:
         complex or real array: Filtered image, shape (naz, nrg, ...).
 
     Note:
-        The filter is always applied along 2 dimensions (azimuth, range). Please ensure to provide a valid image.
+        The filter is always applied along 2 dimensions (azimuth, range). Invalid (NaN) pixels stay invalid and are excluded from the averages of their neighbours.
+        Windows are placed as in `scipy.ndimage.convolve` and mirrored at the image borders. Running sums make the cost independent of the window size.
     """
-
-    # old implementation with uniform filter
-    # uflt = uniform_filter
-    # ndim = len(img.shape)
-    # ws = np.ones(ndim)
-    # ws[0] = dimaz
-    # ws[1] = dimrg
-
     if (dimaz > 1) or (dimrg > 1):
-        # avoid nan propagation
-        msk = np.isnan(img)
-        img_ = img.copy()
-        img_[msk] = 0
-        ker = np.ones((dimaz, dimrg)) / (dimaz * dimrg)
-        if np.iscomplexobj(img_):
-            # imgout = uflt(img_.real, size=ws) + 1j * uflt(img_.imag, size=ws)
-            imgout = convolve(img_.real, ker) + 1j * convolve(img_.imag, ker)
-            imgout[msk] = np.nan + 1j * np.nan
-        else:
-            # imgout = uflt(img_.real, size=ws)
-            imgout = convolve(img_, ker)
-            imgout[msk] = np.nan
+        if img.ndim > 2:
+            # filter each 2D image of the trailing dimensions
+            stack = img.reshape(*img.shape[:2], -1)
+            imgout = np.stack(
+                [boxcar(stack[..., k], dimaz, dimrg) for k in range(stack.shape[2])],
+                axis=-1,
+            )
+            return imgout.reshape(img.shape)
+        # sums are accumulated in double precision
+        zero = np.complex128(0) if np.iscomplexobj(img) else np.float64(0)
+        imgout = np.empty_like(img)
+        nan = np.full(1, np.nan + 1j * np.nan if np.iscomplexobj(img) else np.nan)
+        _boxcar(
+            np.ascontiguousarray(img),
+            int(dimaz),
+            int(dimrg),
+            imgout,
+            zero,
+            nan.astype(img.dtype)[0],
+        )
         return imgout
     else:
         return img
 
-def presum(img, m, n):
+
+@njit(nogil=True, cache=True)
+def _mirror(idx, n):
+    # index in the image mirrored at its borders (d c b a | a b c d | d c b a)
+    idx = idx % (2 * n)
+    return idx if idx < n else 2 * n - 1 - idx
+
+
+@njit(nogil=True, cache=True)
+def _range_sums(img, i, j0, j1, dimrg, zero, sums, counts):
+    # running sums of valid pixels of line i for columns j0 to j1
+    # the window of column j is [j - (dimrg - 1) // 2, j + dimrg // 2]
+    nrg = img.shape[1]
+    first = j0 - (dimrg - 1) // 2
+    s = zero
+    c = 0
+    for k in range(first, first + dimrg):
+        val = img[i, _mirror(k, nrg)]
+        if not np.isnan(val):
+            s += val
+            c += 1
+    sums[0] = s
+    counts[0] = c
+    for j in range(1, j1 - j0):
+        val = img[i, _mirror(first + j + dimrg - 1, nrg)]
+        if not np.isnan(val):
+            s += val
+            c += 1
+        val = img[i, _mirror(first + j - 1, nrg)]
+        if not np.isnan(val):
+            s -= val
+            c -= 1
+        sums[j] = s
+        counts[j] = c
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _boxcar(img, dimaz, dimrg, imgout, zero, nan):
+    naz, nrg = img.shape
+    first = -((dimaz - 1) // 2)
+    block = 256
+    for b in prange((nrg + block - 1) // block):
+        j0 = b * block
+        j1 = min(j0 + block, nrg)
+        # range sums of the lines in the azimuth window, in a ring buffer
+        ring = np.full((dimaz, j1 - j0), zero)
+        ring_counts = np.zeros((dimaz, j1 - j0), dtype=np.int32)
+        s = np.full(j1 - j0, zero)
+        c = np.zeros(j1 - j0, dtype=np.int32)
+        for k in range(dimaz):
+            _range_sums(
+                img,
+                _mirror(first + k, naz),
+                j0,
+                j1,
+                dimrg,
+                zero,
+                ring[k],
+                ring_counts[k],
+            )
+            s += ring[k]
+            c += ring_counts[k]
+        for i in range(naz):
+            if i > 0:
+                # the line leaving the window is replaced by the entering one
+                k = (i - 1) % dimaz
+                s -= ring[k]
+                c -= ring_counts[k]
+                _range_sums(
+                    img,
+                    _mirror(i + first + dimaz - 1, naz),
+                    j0,
+                    j1,
+                    dimrg,
+                    zero,
+                    ring[k],
+                    ring_counts[k],
+                )
+                s += ring[k]
+                c += ring_counts[k]
+            for j in range(j0, j1):
+                if np.isnan(img[i, j]):
+                    imgout[i, j] = nan
+                else:
+                    imgout[i, j] = s[j - j0] / c[j - j0]
+
+
+def goldstein_filter(ifg, alpha=0.5, overlap=14, patch_size=32, workers=-1):
+    """
+    Apply the Goldstein phase filter to a complex interferogram.
+
+    Args:
+        ifg (complex array): Input interferogram, shape (naz, nrg).
+        alpha (float, optional): Filter parameter. Should be between 0 (no filtering) and 1 (strongest). Defaults to 0.5.
+        overlap (int, optional): Overlap in pixels between consecutive patches. Defaults to 14.
+        patch_size (int, optional): Size of the square patches. Defaults to 32.
+        workers (int, optional): Number of workers of the FFTs (see `scipy.fft`). Defaults to -1 (all CPUs).
+
+    Returns:
+        complex array: Filtered interferogram, NaN where the input is NaN.
+
+    Note:
+        All the patches are filtered with a single batched FFT and recombined by overlap-add with a triangular window. Only the phase of the input is used and invalid pixels do not contribute to the filtered phase. Patches are placed every `patch_size - overlap` pixels from the first line and column, so that images cut at multiples of this step with a margin of at least `patch_size` pixels give the same result as the full image.
+    """
+    if not 0 <= overlap < patch_size:
+        raise ValueError(
+            "Overlap must be non-negative and smaller than the patch size."
+        )
+    step = patch_size - overlap
+    naz, nrg = ifg.shape
+
+    valid = ~np.isnan(ifg)
+    # patches start `overlap` pixels before the image, outside pixels are zero
+    npaz = (naz + overlap - 1) // step + 1
+    nprg = (nrg + overlap - 1) // step + 1
+    padded = np.zeros(
+        ((npaz - 1) * step + patch_size, (nprg - 1) * step + patch_size),
+        dtype=np.complex64,
+    )
+    padded[overlap : overlap + naz, overlap : overlap + nrg] = np.where(
+        valid, np.exp(1j * np.angle(ifg)), 0
+    )
+    patches = sliding_window_view(padded, (patch_size, patch_size))[::step, ::step]
+
+    # spectral weighting with the smoothed amplitude spectrum
+    spec = sfft.fftshift(sfft.fft2(patches, workers=workers), axes=(-2, -1))
+    weights = uniform_filter(np.abs(spec), size=(1, 1, 3, 3)) ** alpha
+    patches_out = sfft.ifft2(
+        sfft.ifftshift(weights * spec, axes=(-2, -1)), workers=workers
+    )
+
+    win = 1 - np.abs(np.arange(patch_size) - (patch_size - 1) / 2) / (patch_size / 2)
+    win = np.outer(win, win).astype(np.float32)
+    acc = np.zeros(padded.shape, dtype=np.complex64)
+    wsum = np.zeros(padded.shape, dtype=np.float32)
+    _overlap_add(patches_out, win, step, acc, wsum)
+
+    imgout = (acc / wsum)[overlap : overlap + naz, overlap : overlap + nrg]
+    imgout[~valid] = np.nan + 1j * np.nan
+    return imgout
+
+
+@njit(nogil=True, cache=True)
+def _overlap_add(patches, win, step, acc, wsum):
+    npaz, nprg, size, _ = patches.shape
+    for pi in range(npaz):
+        for pj in range(nprg):
+            r0 = pi * step
+            c0 = pj * step
+            for i in range(size):
+                for j in range(size):
+                    acc[r0 + i, c0 + j] += win[i, j] * patches[pi, pj, i, j]
+                    wsum[r0 + i, c0 + j] += win[i, j]
+
+
+def presum(img, m, n, ignore_nan=False):
     """
     Computes the m by n presummed image.
 
     Args:
-        img (array-like): Input image array with shape (naz, nrg,...).
+        img (array-like): Input image array with shape (naz, nrg,...). Can be a numpy or a dask array.
         m (int): Number of lines to sum. Must be an integer >= 1.
         n (int): Number of columns to sum. Must be an integer >= 1.
+        ignore_nan (bool, optional): Average only the valid (non-NaN) pixels of each window. Windows without valid pixels are NaN. Defaults to False, which propagates NaN values.
 
     Raises:
         TypeError: If m or n are not integers.
@@ -62,7 +221,98 @@ def presum(img, m, n):
         array: Presummed image array with shape (M, N,...), where M and N are the largest multiples of m and n that are less than or equal to img.shape[0] and img.shape[1], respectively.
     Note:
         Returns the input array if m==1 and n==1.
+        Each window is summed in a single pass over the image. Dask arrays are rechunked so that chunk boundaries are multiples of m and n and each chunk is presummed independently.
     """
+    _check_looks(img.shape, m, n)
+
+    # skip if m = n = 1, avoids conditionals in calls
+    if (m == 1) and (n == 1):
+        return img
+
+    M = (img.shape[0] // m) * m
+    N = (img.shape[1] // n) * n
+
+    if hasattr(img, "map_blocks"):
+        # dask array: look windows must not be split by chunk boundaries
+        img = img[:M, :N]
+        ch_az = max(img.chunksize[0] // m, 1) * m
+        ch_rg = max(img.chunksize[1] // n, 1) * n
+        img = img.rechunk({0: ch_az, 1: ch_rg})
+        chunks = (
+            tuple(c // m for c in img.chunks[0]),
+            tuple(c // n for c in img.chunks[1]),
+            *img.chunks[2:],
+        )
+        dtype = presum(np.zeros((m, n), dtype=img.dtype), m, n).dtype
+        return img.map_blocks(
+            presum, m, n, ignore_nan=ignore_nan, chunks=chunks, dtype=dtype
+        )
+
+    # integers are averaged in double precision
+    out_dtype = (np.zeros(1, dtype=img.dtype) / 1.0).dtype
+    imgout = np.empty((M // m, N // n, *img.shape[2:]), dtype=out_dtype)
+    # same rounding as numpy: real division, complex multiplication by the inverse
+    div = np.abs(imgout[:0]).dtype.type(m * n)
+    inv = div.dtype.type(1) / div
+    _presum(
+        img.reshape(*img.shape[:2], -1),
+        m,
+        n,
+        ignore_nan,
+        out_dtype.type(0),
+        div,
+        inv,
+        imgout.reshape(*imgout.shape[:2], -1),
+    )
+    return imgout
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _presum(img, m, n, ignore_nan, zero, div, inv, imgout):
+    M, N, K = imgout.shape
+    is_complex = np.iscomplexobj(imgout)
+    for I in prange(M):
+        lines = np.empty(N * n, dtype=imgout.dtype)
+        counts = np.zeros(N * n, dtype=np.int64)
+        for k in range(K):
+            # sum lines first, reading the image row by row
+            if ignore_nan:
+                lines[:] = zero
+                counts[:] = 0
+                for i in range(I * m, I * m + m):
+                    for j in range(N * n):
+                        x = img[i, j, k]
+                        if not np.isnan(x):
+                            lines[j] += x
+                            counts[j] += 1
+            else:
+                for j in range(N * n):
+                    lines[j] = img[I * m, j, k]
+                for i in range(I * m + 1, I * m + m):
+                    for j in range(N * n):
+                        lines[j] += img[i, j, k]
+            # then columns
+            for J in range(N):
+                s = lines[J * n]
+                cnt = counts[J * n]
+                for j in range(J * n + 1, J * n + n):
+                    s += lines[j]
+                    cnt += counts[j]
+                if ignore_nan:
+                    if cnt == 0:
+                        imgout[I, J, k] = np.nan
+                    elif is_complex:
+                        imgout[I, J, k] = s * (1 / cnt)
+                    else:
+                        imgout[I, J, k] = s / cnt
+                elif is_complex:
+                    imgout[I, J, k] = s * inv
+                else:
+                    imgout[I, J, k] = s / div
+
+
+def _check_looks(shape, m, n):
+    """Checks the number of looks of `presum` for an image shape."""
     # Check if m and n are integers >= 1
     if not isinstance(m, int) or not isinstance(n, int):
         raise TypeError("Parameters m and n must be integers.")
@@ -72,32 +322,104 @@ def presum(img, m, n):
         )
 
     # Check if m and n are valid in relation to the image dimensions
-    if m > img.shape[0] or n > img.shape[1]:
+    if m > shape[0] or n > shape[1]:
         raise ValueError(
             "Cannot presum with these parameters; m or n is too large for the image dimensions."
         )
 
-    # skip if m = n = 1, avoids conditionals in calls
-    if (m > 1) or (n > 1):
-        M = (img.shape[0] // m) * m
-        N = (img.shape[1] // n) * n
 
-        img_trimmed = img[:M, :N]
+def insar_looks(prm, sec, m, n):
+    """
+    Computes the m by n multilooked interferogram, powers and amplitudes of two images in a single pass.
 
-        s = img_trimmed[::m].copy()  # Make a copy once for efficiency
-        for i in range(1, m):
-            s += img_trimmed[i::m]
+    Args:
+        prm (array): Primary image, shape (naz, nrg).
+        sec (array): Secondary image, shape (naz, nrg).
+        m (int): Number of lines to sum. Must be an integer >= 1.
+        n (int): Number of columns to sum. Must be an integer >= 1.
 
-        t = s[:, ::n].copy()
-        for j in range(1, n):
-            t += s[:, j::n]
+    Raises:
+        TypeError: If m or n are not integers.
+        ValueError: If the images do not have the same shape, if m or n are less than 1, or if m > naz or n > nrg.
 
-        return t / float(m * n)
-    else:
-        return img
+    Returns:
+        tuple: Multilooked interferogram `presum(prm * sec.conj(), m, n)`, powers `presum(np.nan_to_num(np.abs(prm) ** 2), m, n)` and `presum(np.nan_to_num(np.abs(sec) ** 2), m, n)`, amplitudes `presum(np.abs(prm), m, n)` and `presum(np.abs(sec), m, n)`.
+    Note:
+        Invalid (NaN) pixels are propagated to the interferogram and the amplitudes, and are set to zero in the powers.
+    """
+    if prm.shape != sec.shape or prm.ndim != 2:
+        raise ValueError("Images must be 2D arrays with the same shape.")
+    _check_looks(prm.shape, m, n)
+
+    M = prm.shape[0] // m
+    N = prm.shape[1] // n
+    ifg = np.empty((M, N), dtype=np.result_type(prm.dtype, sec.dtype))
+    real_dtype = np.abs(ifg[:0]).dtype
+    pow_prm = np.empty((M, N), dtype=real_dtype)
+    pow_sec = np.empty((M, N), dtype=real_dtype)
+    amp_prm = np.empty((M, N), dtype=real_dtype)
+    amp_sec = np.empty((M, N), dtype=real_dtype)
+    # same rounding as presum: real division, complex multiplication by the inverse
+    div = real_dtype.type(m * n)
+    inv = real_dtype.type(1) / div
+    _insar_looks(prm, sec, m, n, div, inv, ifg, pow_prm, pow_sec, amp_prm, amp_sec)
+    return ifg, pow_prm, pow_sec, amp_prm, amp_sec
+
+
+@njit(nogil=True, cache=True)
+def _looks_column(prm, sec, r, c, m, zero):
+    # sums over m lines of one column, NaN powers are set to zero
+    s_ifg = prm[r, c] * np.conj(sec[r, c])
+    s_pp = zero
+    s_ps = zero
+    s_ap = zero
+    s_as = zero
+    for i in range(m):
+        x = prm[r + i, c]
+        y = sec[r + i, c]
+        if i > 0:
+            s_ifg += x * np.conj(y)
+        pp = (x * np.conj(x)).real
+        ps = (y * np.conj(y)).real
+        if not np.isnan(pp):
+            s_pp += pp
+        if not np.isnan(ps):
+            s_ps += ps
+        s_ap += np.abs(x)
+        s_as += np.abs(y)
+    return s_ifg, s_pp, s_ps, s_ap, s_as
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _insar_looks(prm, sec, m, n, div, inv, ifg, pow_prm, pow_sec, amp_prm, amp_sec):
+    M, N = ifg.shape
+    is_complex = np.iscomplexobj(ifg)
+    zero = div * 0
+    for I in prange(M):
+        for J in range(N):
+            # sum lines first, then columns, as presum does
+            s_ifg, s_pp, s_ps, s_ap, s_as = _looks_column(
+                prm, sec, I * m, J * n, m, zero
+            )
+            for j in range(1, n):
+                c_ifg, c_pp, c_ps, c_ap, c_as = _looks_column(
+                    prm, sec, I * m, J * n + j, m, zero
+                )
+                s_ifg += c_ifg
+                s_pp += c_pp
+                s_ps += c_ps
+                s_ap += c_ap
+                s_as += c_as
+            if is_complex:
+                ifg[I, J] = s_ifg * inv
+            else:
+                ifg[I, J] = s_ifg / div
+            pow_prm[I, J] = s_pp / div
+            pow_sec[I, J] = s_ps / div
+            amp_prm[I, J] = s_ap / div
+            amp_sec[I, J] = s_as / div
 
 
-# TODO: add truncated sinc
 @cfunc("double(double)")
 def _ker_near(x):
     ax = np.abs(x)
@@ -147,67 +469,311 @@ def _ker_cub6(x):
         return 0.0
 
 
-def remap(img, rr, cc, kernel="bicubic"):
+@cfunc("double(double)")
+def _ker_sinc(x):
+    """8-point truncated sinc with a Hann window"""
+    ax = np.abs(x)
+    if ax == 0:
+        return 1.0
+    elif ax < 4:
+        return np.sin(np.pi * ax) / (np.pi * ax) * (0.5 + 0.5 * np.cos(np.pi * ax / 4))
+    else:
+        return 0.0
+
+
+# kernel function and half width of the support around the floor / ceil positions
+_KERNELS = {
+    "nearest": (_ker_near, 0),
+    "bilinear": (_ker_lin, 0),
+    "bicubic": (_ker_cub, 1),
+    "bicubic6": (_ker_cub6, 2),
+    "sinc": (_ker_sinc, 3),
+}
+
+# number of fractional positions per pixel in the kernel weight tables
+_KERNEL_TABLE_RES = 1024
+
+# size of the output tiles processed by a thread
+_REMAP_TILE_ROWS = 32
+_REMAP_TILE_COLS = 256
+
+
+@lru_cache
+def _kernel_table(kernel):
+    """Tabulate the separable weights of a kernel at a fixed sub-pixel resolution.
+
+    Row q holds the weights of the taps floor(x) - H, ..., floor(x) + H + 1 for the fractional position q / _KERNEL_TABLE_RES of x. Weights in between are linearly interpolated by `_tap_weights`.
+
+    Args:
+        kernel (str): Kernel type ("nearest", "bilinear", "bicubic" -- 4 point, "bicubic6" -- 6 point, "sinc" -- 8 point).
+
+    Returns:
+        array: read-only table of shape (_KERNEL_TABLE_RES + 1, 2 * H + 2).
+    """
+    if kernel not in _KERNELS:
+        raise ValueError("Unknown interpolation type.")
+    ker, H = _KERNELS[kernel]
+    ntaps = 2 * H + 2
+    table = np.empty((_KERNEL_TABLE_RES + 1, ntaps))
+    for q in range(_KERNEL_TABLE_RES + 1):
+        for k in range(ntaps):
+            table[q, k] = ker(q / _KERNEL_TABLE_RES + H - k)
+    if kernel == "sinc":
+        # the truncated sinc does not sum to one
+        table /= table.sum(axis=1, keepdims=True)
+    table.flags.writeable = False
+    return table
+
+
+@njit(nogil=True, cache=True)
+def _tap_weights(table, f, snap, w):
+    """Interpolate the kernel weights of a fractional position f in [0, 1] from its table. With `snap`, f is rounded to the closest sample position (nearest neighbor)."""
+    if snap:
+        f = 0.0 if f < 0.5 else (1.0 if f > 0.5 else 0.5)
+    pos = f * (table.shape[0] - 1)
+    q = min(int(pos), table.shape[0] - 2)
+    t = pos - q
+    for k in range(w.size):
+        w[k] = table[q, k] + t * (table[q + 1, k] - table[q, k])
+
+
+def remap(img, rr, cc, kernel="bicubic", single_precision=False):
     """Resample an image using row, column lookup tables
 
     Args:
         img (array): image to resample (complex is allowed)
         rr (array): lookup table for row positions
         cc (array): lookup table for column positions
-        kernel (str, optional): Kernel type ("nearest", "bilinear", "bicubic" -- 4 point, "bicubic6" -- 6 point). Defaults to "bicubic".
+        kernel (str, optional): Kernel type ("nearest", "bilinear", "bicubic" -- 4 point, "bicubic6" -- 6 point, "sinc" -- 8 point). Defaults to "bicubic".
+        single_precision (bool, optional): Accumulate in single precision for float32 and complex64 images. Has no effect on other types. Defaults to False.
 
     Returns:
         array: Resampled image with same dimensions as rr and cc.
+
+    Note:
+        Kernel weights are interpolated from tables sampled at 1/1024 pixel.
     """
+    if rr.shape != cc.shape:
+        raise ValueError("Coordinate arrays must have the same shape.")
+    table = _kernel_table(kernel)
+
+    img = np.asarray(img)
+    if single_precision and img.dtype in (np.float32, np.complex64):
+        wzero = np.float32(0)
+    else:
+        wzero = np.float64(0)
+    # accumulator with the same type as the weights, complex if needed
+    zero = np.zeros(1, dtype=np.result_type(img.dtype, wzero))[0]
+
     if np.iscomplexobj(img):
-        return _remap(img.real, rr, cc, kernel) + 1j * _remap(img.imag, rr, cc, kernel)
+        arr_out = np.full(rr.shape, np.nan + 1j * np.nan, dtype=img.dtype)
     else:
-        return _remap(img, rr, cc, kernel)
+        arr_out = np.full(rr.shape, np.nan, dtype=img.dtype)
+    shape2d = (-1, rr.shape[-1])
+    _remap(
+        img,
+        np.ascontiguousarray(rr).reshape(shape2d),
+        np.ascontiguousarray(cc).reshape(shape2d),
+        arr_out.reshape(shape2d),
+        table,
+        kernel == "nearest",
+        zero,
+        wzero,
+    )
+    return arr_out
 
 
-@njit(parallel=True, nogil=True)
-def _remap(img, rr, cc, kernel="bicubic"):
+@njit(parallel=True, nogil=True, cache=True)
+def _remap(img, rr, cc, arr_out, table, snap, zero, wzero):
+    H = table.shape[1] // 2 - 1
+    nrows, ncols = rr.shape
+    ntx = (ncols + _REMAP_TILE_COLS - 1) // _REMAP_TILE_COLS
+    ntiles = ntx * ((nrows + _REMAP_TILE_ROWS - 1) // _REMAP_TILE_ROWS)
+
+    # visit tiles by increasing input row, so that each thread works on
+    # a compact part of the image
+    first_row = np.full(ntiles, np.inf)
+    for tile in prange(ntiles):
+        y0 = (tile // ntx) * _REMAP_TILE_ROWS
+        x0 = (tile % ntx) * _REMAP_TILE_COLS
+        for y in range(y0, min(y0 + _REMAP_TILE_ROWS, nrows)):
+            for x in range(x0, min(x0 + _REMAP_TILE_COLS, ncols)):
+                if rr[y, x] < first_row[tile]:
+                    first_row[tile] = rr[y, x]
+    order = np.argsort(first_row)
+
+    for t in prange(ntiles):
+        y0 = (order[t] // ntx) * _REMAP_TILE_ROWS
+        x0 = (order[t] % ntx) * _REMAP_TILE_COLS
+        # separable weights, evaluated once per output pixel
+        wr = np.full(2 * H + 2, wzero)
+        wc = np.full(2 * H + 2, wzero)
+        for y in range(y0, min(y0 + _REMAP_TILE_ROWS, nrows)):
+            for x in range(x0, min(x0 + _REMAP_TILE_COLS, ncols)):
+                r = rr[y, x]
+                c = cc[y, x]
+
+                if np.isnan(r) | np.isnan(c):
+                    continue
+                is_in_image = (
+                    (r >= 0) & (r < img.shape[0]) & (c >= 0) & (c < img.shape[1])
+                )
+                if not is_in_image:
+                    continue
+
+                # change boundaries if using other kernels
+                rmin = int(np.floor(r)) - H
+                rmax = int(np.ceil(r)) + H
+                cmin = int(np.floor(c)) - H
+                cmax = int(np.ceil(c)) + H
+                _tap_weights(table, r - np.floor(r), snap, wr)
+                _tap_weights(table, c - np.floor(c), snap, wc)
+
+                val = zero
+                for i in range(rmin, rmax + 1):
+                    # using nearest neighbor on image border
+                    i2 = min(max(0, i), img.shape[0] - 1)
+                    for j in range(cmin, cmax + 1):
+                        j2 = min(max(0, j), img.shape[1] - 1)
+                        val += wr[i - rmin] * wc[j - cmin] * img[i2, j2]
+                arr_out[y, x] = val
+
+
+class ResamplingPlan:
+    """Precomputed neighbourhoods and separable kernel weights of a lookup table, to resample many rasters of the same geometry.
+
+    The plan gives the same result as `remap` and avoids evaluating the kernel again for each raster.
+    It stores two base indices (int32), two tap counts (uint8) and two rows of weights per output pixel, that is 26 bytes for "nearest" and "bilinear", 42 for "bicubic", 58 for "bicubic6" and 74 for "sinc" with single precision weights, and 42, 74, 106 and 138 bytes with double precision weights.
+    """
 
-    if rr.shape != cc.shape:
-        raise ValueError("Coordinate arrays must have the same shape.")
+    def __init__(self, rr, cc, shape, kernel="bicubic", single_precision=True):
+        """Compute the neighbourhood of each output pixel in the input raster.
+
+        Args:
+            rr (array): lookup table for row positions
+            cc (array): lookup table for column positions
+            shape (tuple): shape (rows, columns) of the rasters to resample
+            kernel (str, optional): Kernel type ("nearest", "bilinear", "bicubic" -- 4 point, "bicubic6" -- 6 point, "sinc" -- 8 point). Defaults to "bicubic".
+            single_precision (bool, optional): Store weights in single precision and accumulate in single precision for float32 and complex64 rasters. Set to False for double precision weights, as used by `remap` with default arguments. Defaults to True.
+        """
+        if rr.shape != cc.shape:
+            raise ValueError("Coordinate arrays must have the same shape.")
+        table = _kernel_table(kernel)
+
+        self.out_shape = rr.shape
+        self.shape = tuple(shape[:2])
+        self.kernel = kernel
+        self.single_precision = single_precision
+
+        n = rr.size
+        ntaps = table.shape[1]
+        wtype = np.float32 if single_precision else np.float64
+        self.base_r = np.empty(n, dtype=np.int32)
+        self.base_c = np.empty(n, dtype=np.int32)
+        self.ntaps_r = np.zeros(n, dtype=np.uint8)
+        self.ntaps_c = np.zeros(n, dtype=np.uint8)
+        self.weights_r = np.zeros((n, ntaps), dtype=wtype)
+        self.weights_c = np.zeros((n, ntaps), dtype=wtype)
+        _build_plan(
+            np.ascontiguousarray(rr).ravel(),
+            np.ascontiguousarray(cc).ravel(),
+            self.shape[0],
+            self.shape[1],
+            table,
+            kernel == "nearest",
+            self.base_r,
+            self.base_c,
+            self.ntaps_r,
+            self.ntaps_c,
+            self.weights_r,
+            self.weights_c,
+        )
 
-    arr_out = np.full_like(rr, np.nan, dtype=img.dtype)
-    if kernel == "nearest":
-        ker = _ker_near
-        H = 0
-    elif kernel == "bilinear":
-        ker = _ker_lin
-        H = 0
-    elif kernel == "bicubic":
-        ker = _ker_cub
-        H = 1
-    elif kernel == "bicubic6":
-        ker = _ker_cub6
-        H = 2
-    else:
-        raise ValueError("Unknown interpolation type.")
+    def apply(self, img):
+        """Resample one raster or a stack of rasters.
+
+        Args:
+            img (array): raster (rows, columns) or stack of rasters (bands, rows, columns) in the geometry of the plan. Complex is allowed.
+
+        Returns:
+            array: Resampled raster with the shape of the lookup table, or stack of resampled rasters.
+        """
+        img = np.asarray(img)
+        if img.ndim not in (2, 3) or img.shape[-2:] != self.shape:
+            raise ValueError(
+                f"Raster shape {img.shape} does not match the plan shape {self.shape}."
+            )
+        stack = img if img.ndim == 3 else img[None]
+
+        wzero = self.weights_r.dtype.type(0)
+        if stack.dtype not in (np.float32, np.complex64):
+            wzero = np.float64(0)
+        zero = np.zeros(1, dtype=np.result_type(stack.dtype, wzero))[0]
+
+        if np.iscomplexobj(stack):
+            arr_out = np.full(
+                (stack.shape[0], self.base_r.size),
+                np.nan + 1j * np.nan,
+                dtype=stack.dtype,
+            )
+        else:
+            arr_out = np.full(
+                (stack.shape[0], self.base_r.size), np.nan, dtype=stack.dtype
+            )
+        _apply_plan(
+            stack,
+            self.base_r,
+            self.base_c,
+            self.ntaps_r,
+            self.ntaps_c,
+            self.weights_r,
+            self.weights_c,
+            arr_out,
+            zero,
+        )
+        arr_out = arr_out.reshape(stack.shape[0], *self.out_shape)
+        return arr_out if img.ndim == 3 else arr_out[0]
 
-    for idx in prange(len(rr.flat)):
-        r = rr.flat[idx]
-        c = cc.flat[idx]
 
-        # change boundaries if using other kernels
-        rmin = np.floor(r) - H
-        rmax = np.ceil(r) + H
-        cmin = np.floor(c) - H
-        cmax = np.ceil(c) + H
+@njit(parallel=True, nogil=True, cache=True)
+def _build_plan(
+    rr, cc, nrows, ncols, table, snap, base_r, base_c, ntaps_r, ntaps_c, wr, wc
+):
+    H = table.shape[1] // 2 - 1
+    for idx in prange(rr.size):
+        r = rr[idx]
+        c = cc[idx]
 
         if np.isnan(r) | np.isnan(c):
             continue
-        is_in_image = (r >= 0) & (r < img.shape[0]) & (c >= 0) & (c < img.shape[1])
+        is_in_image = (r >= 0) & (r < nrows) & (c >= 0) & (c < ncols)
         if not is_in_image:
             continue
-        val = 0.0
-        for i in range(int(rmin), int(rmax) + 1):
-            for j in range(int(cmin), int(cmax) + 1):
+
+        rmin = int(np.floor(r)) - H
+        rmax = int(np.ceil(r)) + H
+        cmin = int(np.floor(c)) - H
+        cmax = int(np.ceil(c)) + H
+        base_r[idx] = rmin
+        base_c[idx] = cmin
+        ntaps_r[idx] = rmax - rmin + 1
+        ntaps_c[idx] = cmax - cmin + 1
+        _tap_weights(table, r - np.floor(r), snap, wr[idx])
+        _tap_weights(table, c - np.floor(c), snap, wc[idx])
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _apply_plan(img, base_r, base_c, ntaps_r, ntaps_c, wr, wc, arr_out, zero):
+    nb, nrows, ncols = img.shape
+    for idx in prange(base_r.size):
+        if ntaps_r[idx] == 0:
+            continue
+        for b in range(nb):
+            val = zero
+            for k in range(ntaps_r[idx]):
                 # using nearest neighbor on image border
-                i2 = min(max(0, i), img.shape[0] - 1)
-                j2 = min(max(0, j), img.shape[1] - 1)
-                val += ker(r - i) * ker(c - j) * img[i2, j2]
-        arr_out.flat[idx] = val
-    return arr_out
+                i2 = min(max(0, base_r[idx] + k), nrows - 1)
+                for m in range(ntaps_c[idx]):
+                    j2 = min(max(0, base_c[idx] + m), ncols - 1)
+                    val += wr[idx, k] * wc[idx, m] * img[b, i2, j2]
+            arr_out[b, idx] = val
@@ -11,6 +11,9 @@ import xml.etree.ElementTree as ET
 import pandas as pd
 import geopandas as gpd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
 import logging
 
@@ -152,7 +155,24 @@ def get_burst_geometry(path, target_subswaths, polarization):
     return df_all
 
 
-def block_process(img, block_size, overlap_size, fun, *fun_args, **kwargs):
+def batched(fun):
+    """
+    Mark a function as able to process a batch of blocks in a single call (see `block_process`).
+
+    The decorated function receives blocks stacked along two leading dimensions (block rows, block columns) and has to return an array with the same leading dimensions.
+    """
+
+    @wraps(fun)
+    def wrapper(*args, **kwargs):
+        return fun(*args, **kwargs)
+
+    wrapper.batched = True
+    return wrapper
+
+
+def block_process(
+    img, block_size, overlap_size, fun, *fun_args, n_workers=1, **kwargs
+):
     """
     Block processing of a multi-channel 2-D image (or tuple of images) with an arbitrary function. Blocks can overlap. In this case, the overlap is added to the block size.
 
@@ -162,17 +182,20 @@ def block_process(img, block_size, overlap_size, fun, *fun_args, **kwargs):
         block_size (tuple of ints): Height and width of blocks.
         overlap_size (tuple of ints, optional): Height and width of overlaps.
         *fun_args: Additional positional arguments for the function.
+        n_workers (int, optional): Number of threads processing blocks concurrently. With more than 1, the function must be thread-safe. Has no effect on batched functions. Defaults to 1 (sequential processing).
         **kwargs: Additional keyword arguments.
 
     Returns:
         array: Processed output image with the same shape as the input image (or tuples).
 
     Raises:
-        ValueError: If overlap is less than 1 or if the output shape is incompatible with the input shape.
+        ValueError: If overlap is less than 1, if n_workers is less than 1 or if the output shape is incompatible with the input shape.
 
     Notes:
         The function to be applied has to have arguments of the form (in1, in2, ..., par1, par2, ...)
         with inputs grouped at the beginning. If not, write a wrapper that follows this order.
+        Functions decorated with `batched` are called with batches of blocks as strided views of shape (block rows, block columns, height + 2 * overlap height, width + 2 * overlap width, ...): one batch of views of the input for the blocks inside the image and up to four batches taken from zero-padded strips for the blocks on the image borders. Pixels outside the image are zeros.
+        Other functions are called once per block, from a pool of `n_workers` threads if `n_workers` > 1. Blocks are writable copies of the input, padded with zeros outside the image.
     """
     # Validate block_size
     if not isinstance(block_size, tuple) or not all(
@@ -194,62 +217,125 @@ def block_process(img, block_size, overlap_size, fun, *fun_args, **kwargs):
     if len(overlap_size) != 2:
         raise ValueError("overlap must be of length 2.")
 
+    if n_workers < 1:
+        raise ValueError("n_workers must be >= 1")
+
     # Parse block and overlap sizes
     block_height, block_width = block_size
     olap_height, olap_width = overlap_size
 
-    # Extract dimensions of the input image
-    if isinstance(img, tuple):
-        ih, iw = img[0].shape[:2]
-    else:
-        ih, iw = img.shape[:2]
-
-    # padding makes the code much simpler
-    pad_left, pad_right = (olap_width, iw - block_width * (iw // block_width))
-    pad_top, pad_bottom = (olap_height, ih - block_height * (ih // block_height))
-
-    img_ = (
-        np.pad(img, ((pad_top, pad_bottom), (pad_left, pad_right)))
-        if not isinstance(img, tuple)
-        else tuple(
-            np.pad(x, ((pad_top, pad_bottom), (pad_left, pad_right))) for x in img
+    imgs = img if isinstance(img, tuple) else (img,)
+    ih, iw = imgs[0].shape[:2]
+    nblk_h = -(-ih // block_height)
+    nblk_w = -(-iw // block_width)
+
+    if getattr(fun, "batched", False):
+        # blocks with their overlap inside the image are strided views of the input,
+        # the other ones come from zero-padded strips along the borders
+        i0 = min(-(-olap_height // block_height), nblk_h)
+        j0 = min(-(-olap_width // block_width), nblk_w)
+        i1 = max((ih - olap_height) // block_height, i0)
+        j1 = max((iw - olap_width) // block_width, j0)
+        regions = (
+            (i0, i1, j0, j1),
+            (0, i0, 0, nblk_w),
+            (i1, nblk_h, 0, nblk_w),
+            (i0, i1, 0, j0),
+            (i0, i1, j1, nblk_w),
         )
-    )
-
-    # Preallocate output image with the same shape as the input image
-    imgout = (
-        np.zeros_like(img_) if not isinstance(img_, tuple) else np.zeros_like(img_[0])
-    )
-
-    for i in range(pad_top, img_.shape[0], block_height):
-        for j in range(pad_left, img_.shape[1], block_width):
-
-            # slice inputs
-            sl = (
-                slice(i - olap_height, i + block_height + olap_height),
-                slice(j - olap_width, j + block_width + olap_width),
-            )
-
-            if isinstance(img, tuple):
-                blk = tuple(x[sl] for x in img_)
-            else:
-                blk = (img_[sl],)
-
-            # process and crop
-            processed_block = fun(*blk, *fun_args, **kwargs)[
+        imgout = None
+        for bi0, bi1, bj0, bj1 in regions:
+            if bi1 <= bi0 or bj1 <= bj0:
+                continue
+            r0, r1 = bi0 * block_height, bi1 * block_height
+            c0, c1 = bj0 * block_width, bj1 * block_width
+            views = []
+            for x in imgs:
+                strip = _read_block(
+                    x,
+                    r0 - olap_height,
+                    r1 + olap_height,
+                    c0 - olap_width,
+                    c1 + olap_width,
+                )
+                view = sliding_window_view(
+                    strip,
+                    (block_height + 2 * olap_height, block_width + 2 * olap_width),
+                    axis=(0, 1),
+                )[::block_height, ::block_width]
+                views.append(np.moveaxis(view, (-2, -1), (2, 3)))
+            processed = fun(*views, *fun_args, **kwargs)[
+                :,
+                :,
                 olap_height : olap_height + block_height,
                 olap_width : olap_width + block_width,
             ]
-
-            # slice outputs
-            sl2 = (
-                slice(i, i + block_height),
-                slice(j, j + block_width),
+            if imgout is None:
+                imgout = np.empty((ih, iw, *processed.shape[4:]), dtype=imgs[0].dtype)
+            # (block rows, height, block columns, width, ...) is the image layout
+            processed = np.moveaxis(processed, 2, 1)
+            if r1 <= ih and c1 <= iw:
+                # splitting the axes of the output gives a view in the block layout
+                imgout[r0:r1, c0:c1].reshape(processed.shape)[:] = processed
+            else:
+                imgout[r0:r1, c0:c1] = processed.reshape(
+                    r1 - r0, c1 - c0, *processed.shape[4:]
+                )[: ih - r0, : iw - c0]
+        return imgout
+
+    imgout = np.zeros_like(imgs[0])
+
+    # the last blocks are truncated to the image size plus the remainder of the division by the block size
+    end_h = ih + ih % block_height
+    end_w = iw + iw % block_width
+
+    def process(i, j):
+        r0 = i * block_height
+        c0 = j * block_width
+        blk = tuple(
+            _read_block(
+                x,
+                r0 - olap_height,
+                min(r0 + block_height + olap_height, end_h),
+                c0 - olap_width,
+                min(c0 + block_width + olap_width, end_w),
+                copy=True,
             )
-            imgout[sl2] = processed_block
-
-    if isinstance(imgout, tuple):
-        oh, ow = imgout[0].shape
-    else:
-        oh, ow = imgout.shape
-    return imgout[pad_top : oh - pad_bottom, pad_left : ow - pad_right]
+            for x in imgs
+        )
+        # process and crop
+        nr = min(block_height, ih - r0)
+        nc = min(block_width, iw - c0)
+        imgout[r0 : r0 + nr, c0 : c0 + nc] = fun(*blk, *fun_args, **kwargs)[
+            olap_height : olap_height + nr, olap_width : olap_width + nc
+        ]
+
+    if n_workers == 1:
+        for i in range(nblk_h):
+            for j in range(nblk_w):
+                process(i, j)
+        return imgout
+
+    with ThreadPoolExecutor(n_workers) as pool:
+        jobs = [
+            pool.submit(process, i, j) for i in range(nblk_h) for j in range(nblk_w)
+        ]
+        for job in jobs:
+            job.result()
+    return imgout
+
+
+def _read_block(img, r0, r1, c0, c1, copy=False):
+    """Block of an image, padded with zeros outside of the image. Inside the image, the block is a read-only view unless `copy` is set."""
+    ih, iw = img.shape[:2]
+    if r0 >= 0 and c0 >= 0 and r1 <= ih and c1 <= iw:
+        if copy:
+            return img[r0:r1, c0:c1].copy()
+        blk = img[r0:r1, c0:c1]
+        blk.flags.writeable = False
+        return blk
+    blk = np.zeros((r1 - r0, c1 - c0, *img.shape[2:]), dtype=img.dtype)
+    blk[max(-r0, 0) : min(r1, ih) - r0, max(-c0, 0) : min(c1, iw) - c0] = img[
+        max(r0, 0) : r1, max(c0, 0) : c1
+    ]
+    return blk
@@ -10,7 +10,6 @@
 
 import geopandas as gpd
 from eodag import EODataAccessGateway
-import rioxarray as riox
 import numpy as np
 import folium
 from folium import LayerControl
@@ -79,18 +78,31 @@ out_dir = prepare_insar(
 
 
 # %%
-def change_detection(amp_prm_file, amp_sec_file, out_file):
-    log.info("Smoothing amplitudes")
-    amp_prm = riox.open_rasterio(amp_prm_file)[0].rolling(x=7, y=7, center=True).mean()
-    amp_sec = riox.open_rasterio(amp_sec_file)[0].rolling(x=7, y=7, center=True).mean()
+from eo_tools.S1.process import apply_by_strips
+from eo_tools.S1.util import presum, boxcar
+
+
+def change_detection(prm_file, sec_file, out_file):
+    # amplitudes, smoothing and log-ratio are chained on strips of lines
+    def log_ratio(slc_prm, slc_sec):
+        amp_prm = boxcar(presum(np.abs(slc_prm), 2, 8), 7, 7)
+        amp_sec = boxcar(presum(np.abs(slc_sec), 2, 8), 7, 7)
+        return np.log(amp_prm + 1e-10) - np.log(amp_sec + 1e-10)
+
     log.info("Incoherent changes")
-    ch = np.log(amp_prm + 1e-10) - np.log(amp_sec + 1e-10)
-    ch.rio.to_raster(out_file)
+    apply_by_strips(
+        [prm_file, sec_file],
+        out_file,
+        log_ratio,
+        multilook=[2, 8],
+        margin=3,
+        dtype="float32",
+    )
 
 
 # %%
-from eo_tools.S1.process import coherence, amplitude
-from eo_tools.S1.process import apply_to_patterns_for_pair, apply_to_patterns_for_single
+from eo_tools.S1.process import coherence
+from eo_tools.S1.process import apply_to_patterns_for_pair
 from pathlib import Path
 
 out_dir = f"{output_dir}/S1_InSAR_2023-09-04-063730__2023-09-16-063730/sar"
@@ -107,30 +119,12 @@ apply_to_patterns_for_pair(
     multilook=[1, 4],
 )
 
-# compute primary amplitude
-apply_to_patterns_for_single(
-    amplitude,
-    out_dir=out_dir,
-    in_file_prefix="slc_prm",
-    out_file_prefix="amp_prm",
-    multilook=[2, 8],
-)
-
-# compute secondary amplitude
-apply_to_patterns_for_single(
-    amplitude,
-    out_dir=out_dir,
-    in_file_prefix="slc_sec",
-    out_file_prefix="amp_sec",
-    multilook=[2, 8],
-)
-
-# compute incoherent changes
+# compute incoherent changes without writing the amplitudes
 apply_to_patterns_for_pair(
     change_detection,
     out_dir=out_dir,
-    prm_file_prefix="amp_prm",
-    sec_file_prefix="amp_sec",
+    prm_file_prefix="slc_prm",
+    sec_file_prefix="slc_sec",
     out_file_prefix="change",
 )
 
@@ -1,6 +1,6 @@
 import pytest
 import numpy as np
-from eo_tools.auxils import block_process
+from eo_tools.auxils import block_process, batched
 
 # Example processing function
 def simple_process_fn(block, multiplier=1):
@@ -77,3 +77,69 @@ def test_block_process(input_array, block_size, overlap, multiplier, expected_ou
         print("Expected array:")
         print(expected_output)
         assert np.array_equal(output_array, expected_output)
+
+
+def local_sum_fn(block):
+    """Sum over 3x3 neighborhoods, uses the overlap."""
+    padded = np.pad(block, 1)
+    return sum(padded[i:i + block.shape[0], j:j + block.shape[1]] for i in range(3) for j in range(3))
+
+
+@batched
+def local_sum_batch_fn(blocks):
+    """Batched version of local_sum_fn."""
+    padded = np.pad(blocks, ((0, 0), (0, 0), (1, 1), (1, 1)))
+    nl, nc = blocks.shape[2:]
+    return sum(padded[:, :, i:i + nl, j:j + nc] for i in range(3) for j in range(3))
+
+
+def test_block_process_batched():
+    input_array = np.arange(48 * 40, dtype="float64").reshape(48, 40)
+    expected_output = local_sum_fn(input_array)
+
+    output_array = block_process(input_array, (16, 10), (1, 1), local_sum_fn)
+    assert np.array_equal(output_array, expected_output)
+
+    output_array = block_process(input_array, (16, 10), (1, 1), local_sum_batch_fn)
+    assert output_array.shape == input_array.shape
+    assert np.array_equal(output_array, expected_output)
+
+
+def test_block_process_batched_borders():
+    # ragged blocks, overlaps larger than the blocks and images smaller than a block
+    for shape, block, olap in [
+        ((45, 37), (16, 10), (1, 1)),
+        ((45, 37), (4, 3), (5, 2)),
+        ((7, 5), (16, 10), (2, 3)),
+    ]:
+        input_array = np.random.rand(*shape)
+        expected_output = local_sum_fn(input_array)
+        output_array = block_process(input_array, block, olap, local_sum_batch_fn)
+        assert output_array.shape == input_array.shape
+        assert np.allclose(output_array, expected_output)
+
+
+def test_block_process_tuple():
+    a = np.random.rand(23, 17)
+    b = np.random.rand(23, 17)
+    output_array = block_process((a, b), (5, 4), (2, 2), lambda x, y: x * y)
+    assert np.allclose(output_array, a * b)
+
+
+def test_block_process_in_place():
+    def clip_fn(block, threshold):
+        block[block < threshold] = 0
+        return block
+
+    input_array = np.random.rand(23, 17, 2)
+    input_copy = input_array.copy()
+    expected_output = np.where(input_array < 0.5, 0, input_array)
+    for n_workers in [1, 3]:
+        output_array = block_process(
+            input_array, (5, 4), (2, 2), clip_fn, 0.5, n_workers=n_workers
+        )
+        assert np.array_equal(output_array, expected_output)
+        assert np.array_equal(input_array, input_copy)
+
+    with pytest.raises(ValueError):
+        block_process(input_array, (5, 4), (2, 2), clip_fn, 0.5, n_workers=0)
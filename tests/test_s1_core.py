@@ -1,8 +1,13 @@
 import pytest
 import os
-from eo_tools.S1.core import S1IWSwath
-from eo_tools.S1.core import range_doppler
+from eo_tools.S1.core import S1IWSwath, SwathMetadata
+from dateutil.parser import isoparse
+from eo_tools.S1.core import range_doppler, range_doppler_newton
+from eo_tools.S1.core import range_doppler_tie_points, lla_to_ecef
+from eo_tools.S1.core import load_dem, load_dem_coords, dem_coords
 from eo_tools.S1.core import simulate_terrain_backscatter, detect_active_shadow
+from eo_tools.S1.core import coreg_fast, _band_index
+from eo_tools.S1.process import preprocess_slc_iw
 import hashlib
 from shapely.geometry import box
 from unittest.mock import patch
@@ -33,6 +38,193 @@ def test_s1iwswath_init(create_swath):
     assert swath.beta_nought == 2.370000e02
 
 
+def _swath_metadata():
+    # metadata of a swath with 3 bursts of 10 lines and 20 samples
+    calvec = [
+        {
+            "line": str(line),
+            "pixel": {"#text": "0 10 19"},
+            "betaNought": {"#text": "2.370000e+02 2.370000e+02 2.370000e+02"},
+            "sigmaNought": {"#text": f"{line} {line + 1} {line + 2}"},
+        }
+        for line in [0, 15, 29]
+    ]
+    meta = {
+        "product": {
+            "adsHeader": {"startTime": "2023-09-04T06:37:31.072288"},
+            "imageAnnotation": {
+                "imageInformation": {
+                    "numberOfSamples": "20",
+                    "azimuthTimeInterval": "2.055556e-03",
+                    "slantRangeTime": "5.331003e-03",
+                }
+            },
+            "generalAnnotation": {
+                "productInformation": {
+                    "rangeSamplingRate": "6.434523e+07",
+                    "radarFrequency": "5.405000e+09",
+                    "azimuthSteeringRate": "1.590368e+00",
+                },
+                "azimuthFmRateList": {
+                    "azimuthFmRate": [
+                        {
+                            "azimuthTime": "2023-09-04T06:37:31.072288",
+                            "azimuthFmRatePolynomial": {
+                                "#text": "-2.3e+03 4.5e+05 -7.8e+07"
+                            },
+                        },
+                        {
+                            "azimuthTime": "2023-09-04T06:37:33.072288",
+                            "azimuthFmRatePolynomial": {
+                                "#text": "-2.4e+03 4.5e+05 -7.8e+07"
+                            },
+                        },
+                    ]
+                },
+            },
+            "swathTiming": {
+                "linesPerBurst": "10",
+                "samplesPerBurst": "20",
+                "burstList": {
+                    "@count": "3",
+                    "burst": [
+                        {
+                            "azimuthTime": f"2023-09-04T06:37:3{1 + i}.072288",
+                            "firstValidSample": {"#text": " ".join(["2"] * 10)},
+                            "lastValidSample": {"#text": " ".join(["17"] * 10)},
+                        }
+                        for i in range(3)
+                    ],
+                },
+            },
+            "dopplerCentroid": {
+                "dcEstimateList": {
+                    "dcEstimate": {
+                        "azimuthTime": "2023-09-04T06:37:32.072288",
+                        "dataDcPolynomial": {"#text": "-2.1e+01 2.9e+04 -1.2e+07"},
+                    }
+                }
+            },
+        }
+    }
+    state_vectors = {"t0": isoparse("2023-09-04T06:30:00"), "t": np.arange(10.0)}
+    return SwathMetadata.from_annotation(meta, calvec, state_vectors)
+
+
+def test_swath_metadata():
+    import pickle
+
+    model = _swath_metadata()
+
+    assert model.burst_count == 3
+    assert model.lines_per_burst == 10
+    assert model.beta_nought == 237.0
+    np.testing.assert_allclose(model.burst_times, [0.0, 1.0, 2.0])
+    np.testing.assert_allclose(model.fm_rate_times, [0.0, 2.0])
+    np.testing.assert_allclose(model.dc_times, [1.0])
+    assert model.first_valid_sample.shape == (3, 10)
+    assert model.fm_rate_coeffs.shape == (2, 3) and model.dc_coeffs.shape == (1, 3)
+    np.testing.assert_array_equal(model.cal_lines, [0, 15, 29])
+    np.testing.assert_array_equal(model.cal_pixels, [0, 10, 19])
+    np.testing.assert_allclose(model.cal_sigma[1], [15, 16, 17])
+    np.testing.assert_allclose(model.time_offset(model.state_vectors["t0"]), 451.072288)
+
+    model2 = pickle.loads(pickle.dumps(model))
+    np.testing.assert_array_equal(model2.last_valid_sample, model.last_valid_sample)
+    assert model2.t_ref == model.t_ref
+
+
+def _fake_product(tmp_path):
+    # product directory with a manifest only, its parsed metadata and a cache directory
+    safe_dir = (
+        tmp_path
+        / "S1A_IW_SLC__1SDV_20230904T063730_20230904T063757_050174_0609E3_DAA1.SAFE"
+    )
+    safe_dir.mkdir()
+    (safe_dir / "manifest.safe").write_text("<manifest>v1</manifest>")
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+
+    swath_meta = {
+        "pth_tiff": "measurement/s1a-iw1-slc-vh.tiff",
+        "model": _swath_metadata(),
+        "burst_geom": {
+            "subswath": ["IW1"],
+            "burst": [1],
+            "geometry": [box(6.0, 45.0, 7.0, 45.2).wkt],
+        },
+        "orbit_type": "POEORB",
+    }
+    return safe_dir, cache_dir, swath_meta
+
+
+def test_s1iwswath_metadata_cache(tmp_path):
+    safe_dir, cache_dir, swath_meta = _fake_product(tmp_path)
+
+    with patch("eo_tools.S1.core._parse_swath_metadata") as mock_parse:
+        mock_parse.return_value = swath_meta
+        swath = S1IWSwath(str(safe_dir), 1, "vh", cache_dir=str(cache_dir))
+        assert mock_parse.call_count == 1
+        cache_files = list(cache_dir.glob("s1meta-*.npz"))
+        assert len(cache_files) == 1
+        # the cache is read without unpickling
+        with np.load(cache_files[0], allow_pickle=False) as data:
+            assert all(data[name].dtype != object for name in data.files)
+
+        # cache hit
+        swath_cached = S1IWSwath(str(safe_dir), 1, "vh", cache_dir=str(cache_dir))
+        assert mock_parse.call_count == 1
+        assert swath_cached.burst_count == swath.burst_count == 3
+        assert swath_cached.beta_nought == 237.0
+        assert swath_cached.pth_tiff == safe_dir / swath_meta["pth_tiff"]
+        assert swath_cached.gdf_burst_geom.geometry[0].equals(box(6.0, 45.0, 7.0, 45.2))
+        np.testing.assert_array_equal(swath_cached.state_vectors["t"], np.arange(10.0))
+        assert swath_cached.state_vectors["t0"] == swath.state_vectors["t0"]
+        for name in ["first_valid_sample", "fm_rate_coeffs", "cal_sigma"]:
+            np.testing.assert_array_equal(
+                getattr(swath_cached.model, name), getattr(swath.model, name)
+            )
+        assert swath_cached.model.azimuth_steering_rate == (
+            swath.model.azimuth_steering_rate
+        )
+
+        # other polarization or modified product
+        S1IWSwath(str(safe_dir), 1, "vv", cache_dir=str(cache_dir))
+        assert mock_parse.call_count == 2
+        (safe_dir / "manifest.safe").write_text("<manifest>v2</manifest>")
+        S1IWSwath(str(safe_dir), 1, "vh", cache_dir=str(cache_dir))
+        assert mock_parse.call_count == 3
+
+        # no cache
+        S1IWSwath(str(safe_dir), 1, "vh", cache_dir=None)
+        assert mock_parse.call_count == 4
+
+
+def test_preprocess_slc_iw_metadata_cache(tmp_path):
+    safe_dir, cache_dir, swath_meta = _fake_product(tmp_path)
+
+    with patch(
+        "eo_tools.S1.core._parse_swath_metadata", return_value=swath_meta
+    ) as mock_parse, patch("eo_tools.S1.process._child_process") as mock_child:
+        for run in range(2):
+            preprocess_slc_iw(
+                str(safe_dir),
+                str(tmp_path / f"out{run}"),
+                pol=["vh"],
+                max_burst=1,
+                cache_dir=str(cache_dir),
+            )
+        # the second run reads the metadata from the cache
+        assert mock_parse.call_count == 1
+        assert mock_child.call_count == 2
+        assert mock_child.call_args.args[1][0][0].burst_count == 3
+
+        preprocess_slc_iw(
+            str(safe_dir), str(tmp_path / "out2"), pol=["vh"], max_burst=1
+        )
+        assert mock_parse.call_count == 2
+
+
 def test_read_burst_valid_burst(create_swath):
     swath = create_swath
 
@@ -62,39 +254,17 @@ def test_read_burst_remove_invalid(create_swath):
 
     lines_per_burst = 1500
 
-    # Generate firstValidSample and lastValidSample arrays
-    first_valid_sample_array = (
-        "1 " * lines_per_burst
-    )  # First column valid for all lines
-    last_valid_sample_array = (
-        "1999 " * lines_per_burst
-    )  # Last valid sample at column 1999 for all lines
-
-    # Break down the metadata dictionary into manageable parts
-    burst_metadata = [
-        {
-            "firstValidSample": {"#text": first_valid_sample_array.strip()},
-            "lastValidSample": {"#text": last_valid_sample_array.strip()},
-        },
-        {  # Mock burst metadata for burst_idx=2
-            "firstValidSample": {"#text": "2 " * lines_per_burst},
-            "lastValidSample": {"#text": "1998 " * lines_per_burst},
-        },
-    ]
-
-    burst_list = {"burst": burst_metadata}
-
-    swath_timing = {"burstList": burst_list}
-
-    product_metadata = {"swathTiming": swath_timing}
-
-    mock_meta = {"product": product_metadata}
+    # First column valid for all lines, last valid sample at column 1999
+    first_valid_sample = np.array([[1] * lines_per_burst, [2] * lines_per_burst])
+    last_valid_sample = np.array([[1999] * lines_per_burst, [1998] * lines_per_burst])
 
     # Mock the attributes and methods that would normally be populated by metadata
     with patch.object(swath, "burst_count", 3), patch.object(
         swath, "lines_per_burst", lines_per_burst
     ), patch.object(swath, "pth_tiff", "mocked_path.tiff"), patch.object(
-        swath, "meta", mock_meta
+        swath.model, "first_valid_sample", first_valid_sample
+    ), patch.object(
+        swath.model, "last_valid_sample", last_valid_sample
     ), patch(
         "eo_tools.S1.core.read_chunk"
     ) as mock_read_chunk:
@@ -154,21 +324,10 @@ def test_calibration_factor_sigma(create_swath):
     # Mock the necessary attributes
     with patch.object(swath, "lines_per_burst", 2), patch.object(
         swath, "samples_per_burst", 3
+    ), patch.object(swath.model, "cal_lines", np.array([0, 1])), patch.object(
+        swath.model, "cal_pixels", np.array([0, 1, 2])
     ), patch.object(
-        swath,
-        "calvec",
-        [
-            {
-                "line": "0",
-                "pixel": {"#text": "0 1 2"},
-                "sigmaNought": {"#text": "1.0 2.0 3.0"},
-            },
-            {
-                "line": "1",
-                "pixel": {"#text": "0 1 2"},
-                "sigmaNought": {"#text": "4.0 5.0 6.0"},
-            },
-        ],
+        swath.model, "cal_sigma", np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
     ):
         # Act: Call the calibration_factor method with cal_type "sigma"
         result = swath.calibration_factor(cal_type="sigma")
@@ -198,6 +357,192 @@ def test_range_doppler():
     np.testing.assert_allclose(r_zd, expected_r_zd, rtol=1e-5, atol=1e-8)
 
 
+def test_range_doppler_newton():
+    # grid of points below a curved orbit, one point has no solution
+    t = np.linspace(-10, 10, 21)
+    positions = np.vstack((t, 0.1 * t**2, np.full(21, 10.0))).T
+    velocities = np.vstack((np.ones(21), 0.2 * t, np.zeros(21))).T
+
+    gx, gy = np.meshgrid(np.linspace(-8, 8, 7), np.linspace(-3, 3, 5))
+    xx = gx.ravel()
+    yy = gy.ravel()
+    zz = np.zeros_like(xx)
+    xx[3] = 50.0
+    xx[8] = np.nan
+
+    i_ref, r_ref, dx_ref, _, _ = range_doppler(xx, yy, zz, positions, velocities)
+    i_zd, r_zd, dx, _, _, stats = range_doppler_newton(
+        xx, yy, zz, positions, velocities, gx.shape[1]
+    )
+
+    np.testing.assert_allclose(i_zd, i_ref, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(r_zd, r_ref, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(dx, dx_ref, rtol=1e-6, atol=1e-6)
+    assert np.isnan(i_zd[3])
+    # points, evaluations, bisection fallbacks, max evaluations
+    assert stats[0] == xx.size - 1
+    assert stats[2] >= 1
+    assert stats[1] < 10 * stats[0]
+
+
+def test_range_doppler_tie_points():
+    from pyproj import Transformer
+
+    # north-going orbit west of a gently sloping DEM with a nodata corner
+    tf = Transformer.from_crs("EPSG:4979", "EPSG:4978")
+    naz = 200
+    px, py, pz = tf.transform(
+        np.linspace(44.8, 45.4, naz), np.full(naz, 3.5), np.full(naz, 700e3)
+    )
+    positions = np.vstack((px, py, pz)).T
+    velocities = np.gradient(positions, axis=0)
+
+    x, y = np.meshgrid(np.linspace(7.0, 7.1, 90), np.linspace(45.15, 45.05, 70))
+    alt = 500 + 2000 * (x - 7.0) + 50 * np.sin(40 * y)
+    alt[:5, :7] = np.nan
+    # nodata over all the tie points of a tile with valid pixels inside
+    island = alt[18:22, 18:22].copy()
+    alt[14:50, 14:50] = np.nan
+    alt[18:22, 18:22] = island
+    # nodata hole between tie points
+    alt[41, 61] = np.nan
+    r0, dr = 4.5e5, 2.33
+
+    # reference: all points are solved (x and y are passed as in load_dem_coords)
+    dem_x, dem_y, dem_z = lla_to_ecef(x.ravel(), y.ravel(), alt.ravel(), "EPSG:4979")
+    i_zd, r_zd, _, _, _ = range_doppler(
+        dem_x - positions[0, 0],
+        dem_y - positions[0, 1],
+        dem_z - positions[0, 2],
+        positions - positions[0],
+        velocities,
+    )
+    az_ref = i_zd.reshape(alt.shape)
+    rg_ref = ((r_zd - r0) / dr).reshape(alt.shape)
+    az_ref[np.isnan(alt)] = np.nan
+    rg_ref[np.isnan(alt)] = np.nan
+
+    tol = 0.05
+    az, rg = range_doppler_tie_points(
+        x, y, alt, "EPSG:4979", positions, velocities, r0, dr, step=16, tol=tol
+    )
+
+    assert az.shape == alt.shape
+    assert np.array_equal(np.isnan(az), np.isnan(az_ref))
+    assert np.array_equal(np.isnan(rg), np.isnan(rg_ref))
+    assert np.nanmax(np.abs(az - az_ref)) < 2 * tol
+    assert np.nanmax(np.abs(rg - rg_ref)) < 2 * tol
+
+
+def test_lla_to_ecef():
+    from pyproj import Transformer
+
+    x, y = np.meshgrid(np.linspace(6.5, 7.5, 30), np.linspace(46.2, 45.4, 20))
+    alt = 1000 + 500 * np.cos(x) * np.sin(y)
+
+    # ellipsoidal heights
+    dem_x, dem_y, dem_z = lla_to_ecef(x, y, alt, "EPSG:4979")
+    tf = Transformer.from_crs("EPSG:4979", "EPSG:4978", always_xy=True)
+    ref_x, ref_y, ref_z = tf.transform(x, y, alt)
+    assert dem_x.shape == alt.shape
+    np.testing.assert_allclose(dem_x, ref_x, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(dem_y, ref_y, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(dem_z, ref_z, rtol=0, atol=1e-6)
+
+
+def test_lla_to_ecef_geoid_cache(tmp_path):
+    from pyproj import Transformer
+
+    x, y = np.meshgrid(np.linspace(6.5, 7.5, 30), np.linspace(46.2, 45.4, 20))
+    alt = np.full(x.shape, 1000.0)
+
+    # constant geoid undulation of 50 m
+    with patch("eo_tools.S1.core.TransformerGroup") as mock_tg:
+        mock_tg.return_value.best_available = True
+        mock_tg.return_value.transformers[0].transform.side_effect = (
+            lambda xx, yy, zz: (xx, yy, zz + 50.0)
+        )
+        dem_x, dem_y, dem_z = lla_to_ecef(
+            x, y, alt, "EPSG:4326+5773", geoid_dir=str(tmp_path)
+        )
+    assert len(list(tmp_path.glob("geoid-*.npz"))) == 1
+
+    tf = Transformer.from_crs("EPSG:4979", "EPSG:4978", always_xy=True)
+    ref_x, ref_y, ref_z = tf.transform(x, y, alt + 50.0)
+    np.testing.assert_allclose(dem_x, ref_x, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(dem_y, ref_y, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(dem_z, ref_z, rtol=0, atol=1e-6)
+
+
+def test_dem_coords(tmp_path):
+    from rasterio.transform import from_origin
+
+    dem_file = tmp_path / "dem.tif"
+    alt = np.arange(40 * 30, dtype="float32").reshape(40, 30)
+    alt[0, 0] = -32768
+    prof = dict(
+        driver="GTiff",
+        width=30,
+        height=40,
+        count=1,
+        dtype="float32",
+        crs="EPSG:4326",
+        transform=from_origin(7.0, 46.0, 0.001, 0.002),
+        nodata=-32768,
+    )
+    with rasterio.open(dem_file, "w", **prof) as ds:
+        ds.write(alt, 1)
+        ds.update_tags(COMPOSITE_CRS="EPSG:4326+5773")
+
+    lat, lon, alt_dem, dem_prof, composite_crs = load_dem_coords(dem_file)
+    assert composite_crs == "EPSG:4326+5773"
+    assert np.isnan(alt_dem[0, 0]) and alt_dem[0, 1] == 1
+    assert lat.shape == lon.shape == alt_dem.shape
+    np.testing.assert_allclose(lat[5, 7], 7.007)
+    np.testing.assert_allclose(lon[5, 7], 45.99)
+
+    # coordinates of blocks of rows match the full grid
+    alt_dem, dem_prof, _ = load_dem(dem_file)
+    for row_start in range(0, 40, 16):
+        row_stop = min(row_start + 16, 40)
+        x, y = dem_coords(dem_prof["transform"], row_start, row_stop, 30)
+        np.testing.assert_array_equal(x, lat[row_start:row_stop])
+        np.testing.assert_array_equal(y, lon[row_start:row_stop])
+
+
+def test_coreg_fast():
+    # affine lookup tables on a rotated DEM grid, the mapping is linear
+    ii, jj = np.mgrid[0:40, 0:30].astype(float)
+    azp = 0.8 * ii + 0.3 * jj - 5
+    rgp = -0.2 * ii + 1.1 * jj + 2
+    azs = 2 * azp + 1.5
+    rgs = rgp - 0.25 * azp
+    azp[10, 10] = np.nan
+    arr_p = np.zeros((25, 30))
+
+    az_s2p, rg_s2p = coreg_fast(arr_p, azp, rgp, azs, rgs)
+
+    a, r = np.mgrid[0:25, 0:30].astype(float)
+    valid = np.isfinite(az_s2p)
+    assert np.array_equal(valid, np.isfinite(rg_s2p))
+    np.testing.assert_allclose(az_s2p[valid], 2 * a[valid] + 1.5)
+    np.testing.assert_allclose(rg_s2p[valid], r[valid] - 0.25 * a[valid], atol=1e-12)
+    # the grid is covered except near the masked DEM cell and out of the DEM footprint
+    assert valid[5:20, 10:25].sum() > 0.95 * 15 * 15
+    assert not valid[0, 0]
+
+
+def test_band_index():
+    first_row = np.array([[0, 3, 5], [9, 2, 0]])
+    last_row = np.array([[1, 4, 8], [9, 1, 9]])
+
+    offsets, items = _band_index(first_row, last_row, 4, 3)
+
+    # item 4 is empty, items spanning several bands are listed in each of them
+    bands = [list(items[offsets[b] : offsets[b + 1]]) for b in range(3)]
+    assert bands == [[0, 1, 5], [1, 2, 5], [2, 3, 5]]
+
+
 def test_fetch_dem_filename_uniqueness(create_swath):
     swath = create_swath
 
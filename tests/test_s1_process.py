@@ -3,23 +3,30 @@ import tempfile
 import os
 import numpy as np
 import xarray as xr
-from eo_tools.S1.process import coherence, process_insar
+from eo_tools.S1.process import coherence, process_insar, insar_products
 import geopandas as gpd
 import multiprocessing
 import rasterio as rio
 import rioxarray
 from affine import Affine
 from tempfile import NamedTemporaryFile
-from eo_tools.S1.process import multilook
+from eo_tools.S1.process import multilook, amplitude, apply_by_strips
 from eo_tools.S1.process import goldstein
+from eo_tools.S1.process import sar2geo, geocode_and_merge_iw, _stream_stages, _run_jobs
+from eo_tools.S1.process import process_stack_pairs, _stack_pairs
+from eo_tools.S1.process import prepare_insar, prepare_insar_stack
+from eo_tools.S1.process import stack_to_zarr, open_stack
+from eo_tools.S1.util import remap, presum, boxcar
 import tempfile
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 multiprocessing.set_start_method("forkserver", force=True)
 import warnings
 import rasterio
 
 from glob import glob
+import shutil
+from shapely.geometry import box
 
 
 # TODO create dataArrays instead of datasets
@@ -51,6 +58,60 @@ def test_coherence(create_test_data):
     assert os.path.exists(out_file)
 
 
+def test_insar_products(tmp_path):
+    rng = np.random.default_rng(0)
+    slc = {}
+    for name in ["prm", "sec"]:
+        slc[name] = (rng.random((60, 90)) + 1j * rng.random((60, 90))).astype(
+            np.complex64
+        )
+        slc[name][20:26, 30:42] = np.nan
+        with rio.open(
+            tmp_path / f"{name}.tif",
+            "w",
+            driver="GTiff",
+            width=90,
+            height=60,
+            count=1,
+            dtype="complex64",
+        ) as dst:
+            dst.write(slc[name], 1)
+
+    names = ["coh", "ifg", "amp_prm", "amp_sec"]
+    results = []
+    for block_size in [512, 4]:
+        files = [str(tmp_path / f"{name}_{block_size}.tif") for name in names]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            insar_products(
+                str(tmp_path / "prm.tif"),
+                str(tmp_path / "sec.tif"),
+                *files,
+                box_size=[3, 5],
+                multilook=[2, 2],
+                block_size=block_size,
+            )
+        arrs = {}
+        for name, file in zip(names, files):
+            with rio.open(file) as src:
+                assert src.shape == (30, 45)
+                assert src.transform == Affine.scale(2, 2)
+                arrs[name] = src.read(1)
+        results.append(arrs)
+
+    # processing by strips gives the same result as the whole image
+    for name in names:
+        np.testing.assert_array_equal(results[0][name], results[1][name])
+    coh = results[0]["coh"]
+    assert np.nanmin(coh) >= 0 and np.nanmax(coh) <= 1 + 1e-6
+    # invalid pixels are eroded by the boxcar window
+    assert np.isnan(coh[9:14, 14:22]).all()
+    assert not np.isnan(coh[:5, :5]).any()
+    np.testing.assert_allclose(
+        results[0]["amp_prm"], presum(np.abs(slc["prm"]), 2, 2), rtol=1e-6
+    )
+
+
 # def test_process_insar(tmp_path):
 
 #     data_dir = "./data/S1"
@@ -148,6 +209,370 @@ def test_multilook_transform_and_dimensions():
         assert src.crs is None
 
 
+def test_multilook_strips(tmp_path):
+    rng = np.random.default_rng(0)
+    data = rng.random((2, 101, 83)).astype(np.float32)
+    input_file = tmp_path / "in.tif"
+    with rio.open(
+        input_file,
+        "w",
+        driver="GTiff",
+        width=83,
+        height=101,
+        count=2,
+        dtype="float32",
+    ) as dst:
+        dst.write(data)
+
+    for mlt in [[1, 1], [2, 3], [4, 1]]:
+        multilook(input_file, tmp_path / "out.tif", mlt=mlt, block_size=8)
+        with rio.open(tmp_path / "out.tif") as src:
+            arr = src.read()
+        expected = np.stack([presum(band, *mlt) for band in data])
+        np.testing.assert_array_equal(arr, expected)
+
+
+def test_amplitude_and_apply_by_strips(tmp_path):
+    rng = np.random.default_rng(0)
+    slc = (rng.random((101, 83)) + 1j * rng.random((101, 83))).astype(np.complex64)
+    slc_file = tmp_path / "slc.tif"
+    with rio.open(
+        slc_file,
+        "w",
+        driver="GTiff",
+        width=83,
+        height=101,
+        count=1,
+        dtype="complex64",
+    ) as dst:
+        dst.write(slc, 1)
+
+    amplitude(slc_file, tmp_path / "amp.tif", multilook=[2, 4], block_size=8)
+    with rio.open(tmp_path / "amp.tif") as src:
+        assert src.dtypes[0] == "float32"
+        np.testing.assert_array_equal(src.read(1), presum(np.abs(slc), 2, 4))
+
+    # chained operations with neighbouring lines give the same result as the whole image
+    def smooth_amplitude(arr):
+        return boxcar(presum(np.abs(arr), 2, 4), 5, 5)
+
+    apply_by_strips(
+        slc_file,
+        tmp_path / "smooth.tif",
+        smooth_amplitude,
+        multilook=[2, 4],
+        margin=5,
+        dtype="float32",
+        block_size=8,
+    )
+    with rio.open(tmp_path / "smooth.tif") as src:
+        np.testing.assert_allclose(src.read(1), smooth_amplitude(slc), rtol=1e-6)
+
+
+@pytest.fixture
+def create_sar_and_lut(tmp_path):
+    # 2x4 multilooked interferogram and a lookup table on a small geographic grid
+    rng = np.random.default_rng(0)
+    ifg = (rng.random((50, 60)) * np.exp(1j * rng.random((50, 60)))).astype(
+        np.complex64
+    )
+    sar_file = str(tmp_path / "ifg.tif")
+    with rio.open(
+        sar_file,
+        "w",
+        driver="GTiff",
+        width=60,
+        height=50,
+        count=1,
+        dtype="complex64",
+        transform=Affine.scale(4, 2),
+    ) as dst:
+        dst.write(ifg, 1)
+
+    az = rng.random((70, 90)) * 104 - 2
+    rg = np.sort(rng.random((70, 90)) * 244 - 2, axis=1)
+    az[:, :10] = np.nan
+    lut_file = str(tmp_path / "lut.tif")
+    with rio.open(
+        lut_file,
+        "w",
+        driver="GTiff",
+        width=90,
+        height=70,
+        count=2,
+        dtype="float64",
+        crs="EPSG:4326",
+        transform=Affine(0.001, 0, 10, 0, -0.001, 45),
+    ) as dst:
+        dst.write(np.stack((az, rg)))
+    return sar_file, lut_file, ifg, az / 2, rg / 4
+
+
+def test_sar2geo_blocks(create_sar_and_lut, tmp_path):
+    sar_file, lut_file, ifg, rr, cc = create_sar_and_lut
+    expected = remap(ifg, rr, cc, "bicubic", single_precision=True)
+
+    for block_size in [512, 16, 25]:
+        out_file = str(tmp_path / f"phi_{block_size}.tif")
+        sar2geo(sar_file, lut_file, out_file, write_phase=True, block_size=block_size)
+        with rio.open(out_file) as src:
+            phi = src.read(1)
+            assert src.nodata == -9999
+            assert src.crs == "EPSG:4326"
+        np.testing.assert_array_equal(phi[np.isnan(expected)], -9999)
+        np.testing.assert_array_equal(
+            phi[~np.isnan(expected)], np.angle(expected[~np.isnan(expected)])
+        )
+        assert not os.path.exists(str(tmp_path / f"phi_{block_size}_tmp.tif"))
+
+    out_file = str(tmp_path / "ifg_geo.tif")
+    sar2geo(sar_file, lut_file, out_file, block_size=32, io_threads=2)
+    with rio.open(out_file) as src:
+        np.testing.assert_array_equal(src.read(1), expected)
+
+
+def test_sar2geo_multiple_files(create_sar_and_lut, tmp_path):
+    sar_file, lut_file, ifg, rr, cc = create_sar_and_lut
+    # a real-valued raster on the same grid and one on a full resolution grid
+    rng = np.random.default_rng(1)
+    extra = {
+        "coh": (rng.random((50, 60)).astype(np.float32), Affine.scale(4, 2)),
+        "amp": (rng.random((100, 240)).astype(np.float32), Affine.scale(1, 1)),
+    }
+    sar_files = [sar_file]
+    for name, (arr, transform) in extra.items():
+        sar_files.append(str(tmp_path / f"{name}.tif"))
+        with rio.open(
+            sar_files[-1],
+            "w",
+            driver="GTiff",
+            width=arr.shape[1],
+            height=arr.shape[0],
+            count=1,
+            dtype="float32",
+            transform=transform,
+        ) as dst:
+            dst.write(arr, 1)
+
+    out_files = [str(tmp_path / f"{name}_geo.tif") for name in ["phi", "coh", "amp"]]
+    sar2geo(
+        sar_files, lut_file, out_files, write_phase=[True, False, False], block_size=32
+    )
+    for sar, out, phase in zip(sar_files, out_files, [True, False, False]):
+        ref_file = str(tmp_path / "ref.tif")
+        sar2geo(sar, lut_file, ref_file, write_phase=phase, block_size=32)
+        with rio.open(out) as src, rio.open(ref_file) as ref:
+            assert src.profile == ref.profile
+            np.testing.assert_array_equal(src.read(1), ref.read(1))
+        os.remove(ref_file)
+
+    with pytest.raises(ValueError):
+        sar2geo(sar_files, lut_file, out_files[:2])
+
+
+def test_geocode_and_merge_iw(create_sar_and_lut, tmp_path):
+    sar_file, lut_file, _, _, _ = create_sar_and_lut
+    input_dir = tmp_path / "prod"
+    os.makedirs(input_dir / "sar")
+    with rio.open(lut_file) as src:
+        lut = src.read()
+        prof = src.profile
+    prof.pop("blockxsize")
+    prof.pop("blockysize")
+    # second subswath 40 columns to the right and 5 rows above the first one
+    trans = prof["transform"]
+    for iw, shift, arr in ((1, (0, 0), lut), (2, (40, -5), lut[:, ::-1])):
+        prof.update(transform=trans * Affine.translation(*shift))
+        with rio.open(input_dir / f"sar/lut_vv_iw{iw}.tif", "w", **prof) as dst:
+            dst.write(arr)
+        shutil.copy(sar_file, input_dir / f"sar/ifg_vv_iw{iw}.tif")
+
+    phi = []
+    for iw in [1, 2]:
+        out_file = str(tmp_path / f"phi_iw{iw}.tif")
+        sar2geo(
+            str(input_dir / f"sar/ifg_vv_iw{iw}.tif"),
+            str(input_dir / f"sar/lut_vv_iw{iw}.tif"),
+            out_file,
+            write_phase=True,
+        )
+        with rio.open(out_file) as src:
+            phi.append(src.read(1))
+    # the first subswath has priority
+    expected = np.full((75, 130), -9999, dtype=np.float32)
+    expected[:70, 40:] = phi[1]
+    region = expected[5:, :90]
+    region[phi[0] != -9999] = phi[0][phi[0] != -9999]
+
+    geocode_and_merge_iw(
+        str(input_dir), ["ifg"], pol="vv", subswaths=["IW1", "IW2"], clip_to_shape=False
+    )
+    with rio.open(input_dir / "phi_vv.tif") as src:
+        np.testing.assert_array_equal(src.read(1), expected)
+        assert src.transform.almost_equals(trans * Affine.translation(0, -5))
+        assert src.nodata == -9999
+    assert glob(str(input_dir / "sar/*geo*")) == []
+
+    # L-shaped area of interest, pixel edges fall in the middle of pixels
+    shp = box(10.0205, 44.9905, 10.0505, 45.0005).union(
+        box(10.0205, 44.9805, 10.0305, 45.0005)
+    )
+    geocode_and_merge_iw(
+        str(input_dir), ["ifg"], shp=shp, pol="vv", subswaths=["IW1", "IW2"]
+    )
+    expected = expected[4:25, 20:51]
+    expected[11:, 11:] = -9999
+    with rio.open(input_dir / "phi_vv.tif") as src:
+        np.testing.assert_array_equal(src.read(1), expected)
+        assert src.transform.almost_equals(trans * Affine.translation(20, -1))
+
+
+def test_geocode_and_merge_iw_shared_lut(create_sar_and_lut, tmp_path):
+    sar_file, lut_file, _, _, _ = create_sar_and_lut
+    input_dir = tmp_path / "prod"
+    os.makedirs(input_dir / "sar")
+    # one LUT for both polarizations, it has priority over a per-polarization LUT
+    shutil.copy(lut_file, input_dir / "sar/lut_iw1.tif")
+    with rio.open(lut_file) as src:
+        lut = src.read()
+        prof = src.profile
+    with rio.open(input_dir / "sar/lut_vh_iw1.tif", "w", **prof) as dst:
+        dst.write(lut[:, ::-1])
+    for p in ["vv", "vh"]:
+        shutil.copy(sar_file, input_dir / f"sar/ifg_{p}_iw1.tif")
+
+    out_file = str(tmp_path / "phi.tif")
+    sar2geo(sar_file, lut_file, out_file, write_phase=True)
+    geocode_and_merge_iw(str(input_dir), ["ifg"], pol="full", subswaths=["IW1"])
+    with rio.open(out_file) as src:
+        expected = src.read(1)
+    for p in ["vv", "vh"]:
+        with rio.open(input_dir / f"phi_{p}.tif") as src:
+            np.testing.assert_array_equal(src.read(1), expected)
+
+
+def test_process_stack_pairs(create_sar_and_lut, tmp_path):
+    _, lut_file, _, _, _ = create_sar_and_lut
+    ids = ["2023-09-04-063730", "2023-09-16-063731", "2023-10-10-063730"]
+    assert _stack_pairs(ids[::-1]) == [(ids[0], ids[1]), (ids[1], ids[2])]
+    assert len(_stack_pairs(ids, "all")) == 3
+    assert _stack_pairs(ids, "sbas", max_temporal_baseline=20) == [(ids[0], ids[1])]
+    assert _stack_pairs(ids, [(ids[2], ids[0])]) == [(ids[0], ids[2])]
+    with pytest.raises(ValueError):
+        _stack_pairs(ids, [(ids[0], "2023-09-28-063730")])
+    with pytest.raises(ValueError):
+        _stack_pairs(ids, "star")
+
+    # coregistered stack sharing one LUT
+    stack_dir = tmp_path / "S1_InSAR_stack" / "sar"
+    os.makedirs(stack_dir)
+    shutil.copy(lut_file, stack_dir / "lut_iw1.tif")
+    rng = np.random.default_rng(1)
+    for it in ids:
+        slc = rng.random((100, 240)) + 1j * rng.random((100, 240))
+        with rio.open(
+            stack_dir / f"slc_{it}_vv_iw1.tif",
+            "w",
+            driver="GTiff",
+            width=240,
+            height=100,
+            count=1,
+            dtype="complex64",
+        ) as dst:
+            dst.write(slc.astype(np.complex64), 1)
+
+    pair_dirs = process_stack_pairs(
+        str(stack_dir), pairs="sbas", max_temporal_baseline=20, multilook=[2, 4]
+    )
+    pair_dir = tmp_path / "S1_InSAR_stack" / f"S1_InSAR_{ids[0]}__{ids[1]}"
+    assert pair_dirs == [str(pair_dir)]
+    assert sorted(os.listdir(pair_dir / "sar")) == [
+        "amp_prm_vv_iw1.tif",
+        "coh_vv_iw1.tif",
+        "ifg_vv_iw1.tif",
+    ]
+
+    # same outputs as a pair processed on its own
+    insar_products(
+        str(stack_dir / f"slc_{ids[0]}_vv_iw1.tif"),
+        str(stack_dir / f"slc_{ids[1]}_vv_iw1.tif"),
+        coh_file=str(tmp_path / "coh.tif"),
+        ifg_file=str(tmp_path / "ifg.tif"),
+        box_size=[3, 3],
+        multilook=[2, 4],
+    )
+    sar2geo(
+        str(tmp_path / "ifg.tif"), lut_file, str(tmp_path / "phi.tif"), write_phase=True
+    )
+    for f, ref in [("sar/coh_vv_iw1.tif", "coh.tif"), ("phi_vv.tif", "phi.tif")]:
+        with rio.open(pair_dir / f) as src, rio.open(tmp_path / ref) as src_ref:
+            np.testing.assert_array_equal(src.read(), src_ref.read())
+
+
+def test_stack_to_zarr(create_sar_and_lut, tmp_path):
+    pytest.importorskip("zarr")
+    _, lut_file, _, _, _ = create_sar_and_lut
+    ids = ["2023-09-04-063730", "2023-09-16-063731", "2023-10-10-063730"]
+    stack_dir = tmp_path / "S1_InSAR_stack" / "sar"
+    os.makedirs(stack_dir)
+    shutil.copy(lut_file, stack_dir / "lut_iw1.tif")
+    rng = np.random.default_rng(2)
+    slcs = []
+    for it in ids:
+        slc = (rng.random((100, 240)) + 1j * rng.random((100, 240))).astype(
+            np.complex64
+        )
+        slc[10:20, 30:50] = np.nan
+        with rio.open(
+            stack_dir / f"slc_{it}_vv_iw1.tif",
+            "w",
+            driver="GTiff",
+            width=240,
+            height=100,
+            count=1,
+            dtype="complex64",
+            nodata=np.nan,
+        ) as dst:
+            dst.write(slc, 1)
+        slcs.append(slc)
+
+    pair_dirs = process_stack_pairs(str(stack_dir), multilook=[2, 4])
+    refs = {}
+    for pair_dir in pair_dirs:
+        for var in ["coh", "ifg", "amp_prm"]:
+            with rio.open(f"{pair_dir}/sar/{var}_vv_iw1.tif") as src:
+                refs[pair_dir, var] = src.read()
+
+    store = stack_to_zarr(str(stack_dir), chunks=[1, 32, 64])
+    assert store == f"{stack_dir}/slc.zarr"
+    assert sorted(os.listdir(stack_dir)) == ["lut_iw1.tif", "slc.zarr"]
+
+    # lazy reads of the stored SLCs
+    stack = open_stack(str(stack_dir), "VV", 1)
+    assert stack.dims == ("date", "azimuth", "range")
+    assert list(stack.date.values) == ids
+    assert stack.data.chunksize == (1, 32, 64)
+    np.testing.assert_array_equal(stack.values, np.stack(slcs))
+    with pytest.raises(RuntimeError):
+        open_stack(str(stack_dir), "vh", 1)
+
+    # pairs are processed from the store with the same outputs
+    assert process_stack_pairs(str(stack_dir), multilook=[2, 4]) == pair_dirs
+    for (pair_dir, var), ref in refs.items():
+        with rio.open(f"{pair_dir}/sar/{var}_vv_iw1.tif") as src:
+            np.testing.assert_array_equal(src.read(), ref)
+
+    ifg_file = f"{pair_dirs[0]}/sar/ifg_vv_iw1.tif"
+    goldstein(ifg_file, str(tmp_path / "gold.tif"), block_size=36)
+    goldstein(
+        refs[pair_dirs[0], "ifg"][0], str(tmp_path / "gold_arr.tif"), block_size=36
+    )
+    with rio.open(tmp_path / "gold.tif") as src, rio.open(
+        tmp_path / "gold_arr.tif"
+    ) as src_arr:
+        np.testing.assert_array_equal(src.read(), src_arr.read())
+
+
 @pytest.fixture
 def create_dummy_ifg():
     """
@@ -204,3 +629,108 @@ def test_goldstein(create_dummy_ifg, create_dummy_output):
         # Check if the output is a valid raster
         da_out = rioxarray.open_rasterio(output_file)
         assert da_out.shape == (1, 2048, 2048), "Output shape is incorrect."
+
+
+def test_stream_stages():
+    written = []
+
+    def read_item(i):
+        return i, np.full(3, i)
+
+    def compute_item(i, arr):
+        if i == 7:
+            raise RuntimeError("compute failed")
+        return i, arr * 2
+
+    def write_item(i, arr):
+        written.append((i, arr.sum()))
+
+    for queue_depth in [1, 3]:
+        written.clear()
+        _stream_stages(range(5), read_item, compute_item, write_item, queue_depth)
+        # items are written in their order
+        assert written == [(i, 6 * i) for i in range(5)]
+
+    with pytest.raises(RuntimeError, match="compute failed"):
+        _stream_stages(range(10), read_item, compute_item, write_item, 2)
+    with pytest.raises(ValueError):
+        _stream_stages(range(5), read_item, compute_item, write_item, 0)
+
+
+def test_run_jobs(tmp_path):
+    order = []
+
+    def job(i):
+        order.append(i)
+
+    jobs = [(job, dict(i=i), 1) for i in range(4)]
+    _run_jobs(jobs, n_workers=1, mem_budget=0.5)
+    assert order == list(range(4))
+
+    # jobs larger than the budget still run one at a time
+    for i in range(3):
+        (tmp_path / f"in{i}.txt").write_text(str(i))
+    jobs = [
+        (
+            shutil.copyfile,
+            dict(src=tmp_path / f"in{i}.txt", dst=tmp_path / f"out{i}.txt"),
+            mem,
+        )
+        for i, mem in enumerate([2, 1, 1])
+    ]
+    _run_jobs(jobs, n_workers=2, mem_budget=1.5)
+    assert [(tmp_path / f"out{i}.txt").read_text() for i in range(3)] == ["0", "1", "2"]
+
+    with pytest.raises(FileNotFoundError):
+        _run_jobs(
+            [(shutil.copyfile, dict(src=tmp_path / "none", dst=tmp_path / "x"), 1)], 2
+        )
+    with pytest.raises(ValueError):
+        _run_jobs(jobs, n_workers=0)
+
+
+def test_prepare_insar_workers(tmp_path):
+    gdf = gpd.GeoDataFrame(
+        dict(subswath=["IW1", "IW1", "IW2"], burst=[3, 4, 2]),
+        geometry=[box(0, 0, 1, 1)] * 3,
+    )
+    dates = {"prm": "20230904T063730", "sec": "20230916T063730"}
+
+    def identify(path):
+        info = MagicMock(polarizations=["VV", "VH"])
+        info.scanMetadata.return_value = dict(
+            orbitNumber_rel=1, start=dates[os.path.basename(path)]
+        )
+        return info
+
+    with patch("eo_tools.S1.process.get_burst_geometry", return_value=gdf), patch(
+        "eo_tools.S1.process.identify", side_effect=identify
+    ), patch(
+        "eo_tools.S1.process._prefetch_iw", autospec=True, return_value=100.0
+    ) as prefetch, patch(
+        "eo_tools.S1.process._run_jobs"
+    ) as run_jobs:
+        prepare_insar(
+            "prm",
+            "sec",
+            str(tmp_path),
+            tie_point_step=8,
+            cache_dir=str(tmp_path),
+            n_workers=2,
+            mem_budget=500,
+        )
+        jobs = run_jobs.call_args.args[0]
+        assert prefetch.call_args.kwargs["cache_dir"] == str(tmp_path)
+        assert [job[1]["cache_dir"] for job in jobs] == [str(tmp_path)] * 2
+        assert [job[1]["iw"] for job in jobs] == [1, 2]
+        assert [job[1]["tie_point_step"] for job in jobs] == [8, 8]
+        assert [job[2] for job in jobs] == [100.0, 100.0]
+        assert not any(job[1]["dem_force_download"] for job in jobs)
+        assert prefetch.call_count == 2
+
+        prepare_insar_stack(
+            "prm", ["sec"], str(tmp_path), tie_point_step=8, n_workers=2
+        )
+        jobs = run_jobs.call_args.args[0]
+        assert [job[1]["tie_point_step"] for job in jobs] == [8, 8]
+        assert prefetch.call_count == 4
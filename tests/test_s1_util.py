@@ -4,7 +4,15 @@ import os
 import time
 import signal
 import numpy as np
-from eo_tools.S1.util import remap
+from scipy.ndimage import convolve
+from eo_tools.S1.util import (
+    remap,
+    ResamplingPlan,
+    presum,
+    insar_looks,
+    boxcar,
+    goldstein_filter,
+)
 
 
 def test_remap():
@@ -20,3 +28,167 @@ def test_remap():
     assert img_out.shape == rr.shape
     assert img_out.dtype == img.dtype
     assert np.all(~np.isnan(img_out))
+
+
+def test_remap_complex():
+    shape_in = (64, 32)
+    img = (np.random.rand(*shape_in) + 1j * np.random.rand(*shape_in)).astype(
+        np.complex64
+    )
+
+    shape_out = (40, 50)
+    rr = np.random.rand(*shape_out) * (shape_in[0] + 2) - 1
+    cc = np.random.rand(*shape_out) * (shape_in[1] + 2) - 1
+    rr[0, 0] = np.nan
+
+    for kernel in ["nearest", "bilinear", "bicubic", "bicubic6", "sinc"]:
+        img_out = remap(img, rr, cc, kernel=kernel)
+        img_re = remap(img.real, rr, cc, kernel=kernel)
+        img_im = remap(img.imag, rr, cc, kernel=kernel)
+        assert img_out.dtype == np.complex64
+        np.testing.assert_array_equal(img_out.real, img_re)
+        np.testing.assert_array_equal(img_out.imag, img_im)
+
+        img_single = remap(img, rr, cc, kernel=kernel, single_precision=True)
+        assert img_single.dtype == np.complex64
+        np.testing.assert_allclose(img_single, img_out, rtol=1e-5, atol=1e-6)
+
+        # kernels preserve constant images
+        ones = remap(np.ones(shape_in), rr, cc, kernel=kernel)
+        np.testing.assert_allclose(ones[~np.isnan(ones)], 1.0)
+
+    with pytest.raises(ValueError, match="Unknown interpolation type."):
+        remap(img, rr, cc, kernel="lanczos")
+
+
+def test_resampling_plan():
+    shape_in = (64, 32)
+    img = (np.random.rand(*shape_in) + 1j * np.random.rand(*shape_in)).astype(
+        np.complex64
+    )
+    pha = np.random.rand(*shape_in)
+
+    shape_out = (40, 50)
+    rr = np.random.rand(*shape_out) * (shape_in[0] + 2) - 1
+    cc = np.random.rand(*shape_out) * (shape_in[1] + 2) - 1
+    rr[0, 0] = np.nan
+    rr[1, 1], cc[1, 1] = 3.0, 5.0
+
+    for kernel in ["nearest", "bilinear", "bicubic", "bicubic6", "sinc"]:
+        plan = ResamplingPlan(rr, cc, shape_in, kernel=kernel, single_precision=False)
+        assert plan.weights_r.dtype == np.float64
+        np.testing.assert_array_equal(plan.apply(img), remap(img, rr, cc, kernel))
+        np.testing.assert_array_equal(plan.apply(pha), remap(pha, rr, cc, kernel))
+
+        stack = plan.apply(np.stack([img, 2 * img]))
+        assert stack.shape == (2, *shape_out)
+        np.testing.assert_array_equal(stack[1], plan.apply(2 * img))
+
+    plan = ResamplingPlan(rr, cc, shape_in)
+    assert plan.weights_r.dtype == np.float32
+    np.testing.assert_array_equal(
+        plan.apply(img), remap(img, rr, cc, single_precision=True)
+    )
+    np.testing.assert_allclose(plan.apply(pha), remap(pha, rr, cc), atol=1e-6)
+    with pytest.raises(ValueError, match="does not match the plan shape"):
+        plan.apply(img.T)
+
+
+def test_presum():
+    img = np.random.rand(31, 45, 2).astype(np.float32)
+    img[3, 5, 0] = np.nan
+    img[:2, :3, 1] = np.nan
+
+    for m, n in [(2, 3), (4, 1), (1, 5)]:
+        M, N = 31 // m, 45 // n
+        expected = img[: M * m, : N * n].reshape(M, m, N, n, 2).mean(axis=(1, 3))
+        img_out = presum(img, m, n)
+        assert img_out.dtype == np.float32
+        np.testing.assert_allclose(img_out, expected, rtol=1e-5)
+
+    # invalid pixels are excluded from the averages
+    img_out = presum(img, 2, 3, ignore_nan=True)
+    np.testing.assert_allclose(
+        img_out[1, 1, 0], np.nanmean(img[2:4, 3:6, 0]), rtol=1e-5
+    )
+    assert np.isnan(img_out[0, 0, 1]) and not np.isnan(img_out[0, 1, 1])
+    assert np.isnan(img_out).sum() == 1
+
+    # dask chunks are aligned to the looks
+    da = pytest.importorskip("dask.array")
+    img_da = da.from_array(img, chunks=(10, 20, 2))
+    img_out = presum(img_da, 4, 3, ignore_nan=True)
+    assert img_out.chunks[:2] == ((2, 2, 2, 1), (6, 6, 3))
+    np.testing.assert_allclose(
+        img_out.compute(), presum(img, 4, 3, ignore_nan=True), rtol=1e-6
+    )
+    assert presum(img, 1, 1) is img
+
+
+def test_insar_looks():
+    shape = (31, 45)
+    prm = (np.random.rand(*shape) + 1j * np.random.rand(*shape)).astype(np.complex64)
+    sec = (np.random.rand(*shape) + 1j * np.random.rand(*shape)).astype(np.complex64)
+    prm[3, 5] = np.nan
+
+    for m, n in [(1, 1), (2, 4), (3, 5)]:
+        ifg, pow_prm, pow_sec, amp_prm, amp_sec = insar_looks(prm, sec, m, n)
+        expected = [
+            (ifg, presum(prm * sec.conj(), m, n)),
+            (pow_prm, presum(np.nan_to_num(np.abs(prm) ** 2), m, n)),
+            (pow_sec, presum(np.nan_to_num(np.abs(sec) ** 2), m, n)),
+            (amp_prm, presum(np.abs(prm), m, n)),
+            (amp_sec, presum(np.abs(sec), m, n)),
+        ]
+        for arr, ref in expected:
+            assert arr.dtype == ref.dtype
+            np.testing.assert_allclose(arr, ref, rtol=1e-5)
+        assert np.isnan(ifg[3 // m, 5 // n]) and np.isnan(amp_prm[3 // m, 5 // n])
+
+    with pytest.raises(ValueError):
+        insar_looks(prm, sec[1:], 2, 4)
+    with pytest.raises(ValueError):
+        insar_looks(prm, sec, 32, 4)
+
+
+def test_boxcar():
+    img = (np.random.rand(40, 70) + 1j * np.random.rand(40, 70)).astype(np.complex64)
+
+    for dimaz, dimrg in [(3, 3), (2, 4), (5, 1), (10, 40), (50, 3)]:
+        ker = np.ones((dimaz, dimrg)) / (dimaz * dimrg)
+        expected = convolve(img.real, ker) + 1j * convolve(img.imag, ker)
+        img_out = boxcar(img, dimaz, dimrg)
+        assert img_out.dtype == np.complex64
+        np.testing.assert_allclose(img_out, expected, rtol=1e-5)
+
+    # invalid pixels are excluded from the averages
+    ones = np.ones((40, 70), dtype=np.float32)
+    ones[10:15, 20:30] = np.nan
+    img_out = boxcar(ones, 5, 9)
+    assert img_out.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(img_out), np.isnan(ones))
+    np.testing.assert_allclose(img_out[~np.isnan(ones)], 1.0)
+    assert boxcar(ones, 1, 1) is ones
+
+
+def test_goldstein_filter():
+    y, x = np.mgrid[:150, :200]
+    phi = 2 * np.pi * (x / 23 + y / 41)
+    noise = np.random.randn(150, 200) + 1j * np.random.randn(150, 200)
+    ifg = (np.exp(1j * phi) + 0.5 * noise).astype(np.complex64)
+    ifg[40:50, 60:80] = np.nan
+
+    ifg_out = goldstein_filter(ifg, alpha=0.8)
+    assert ifg_out.dtype == np.complex64
+    np.testing.assert_array_equal(np.isnan(ifg_out), np.isnan(ifg))
+    err_in = np.nanstd(np.angle(ifg * np.exp(-1j * phi)))
+    err_out = np.nanstd(np.angle(ifg_out * np.exp(-1j * phi)))
+    assert err_out < 0.5 * err_in
+
+    # cutting at a multiple of the step with a margin gives the same result
+    step = 32 - 14
+    part = goldstein_filter(ifg[5 * step - 2 * step :], alpha=0.8)
+    np.testing.assert_allclose(part[2 * step :], ifg_out[5 * step :], rtol=1e-5)
+
+    with pytest.raises(ValueError):
+        goldstein_filter(ifg, overlap=32)